@@ -0,0 +1,102 @@
+"""
+Масштабирование split-режима: один и тот же прогон replay с 1, 2, 3 и 4
+воркерами чата и, для сравнения, с single_loop.
+
+    python -m benchmarks.cluster --rate 50000 --duration 10
+    python -m benchmarks.cluster --max-workers 8 --json cluster.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from .profiles import PROFILES
+
+
+def run(args: argparse.Namespace, extra: list[str]) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "result.json")
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.replay",
+            "--profile",
+            args.profile,
+            "--rate",
+            str(args.rate),
+            "--duration",
+            str(args.duration),
+            "--settle",
+            str(args.settle),
+            "--json",
+            path,
+            *extra,
+        ]
+        if args.log:
+            command += ["--log", args.log]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+
+def row(name: str, result: dict) -> dict:
+    sent = result["messages_sent"]
+    return {
+        "mode": name,
+        "rate_actual": result["rate_actual"],
+        "messages_sent": sent,
+        "messages_read": result["messages_read"],
+        "read_share": round(result["messages_read"] / sent, 3) if sent else None,
+        "commands_per_second": result["commands_per_second"],
+        "probes_seen": f"{result['probes_seen']}/{result['probes_sent']}",
+        "p50_ms": result["latency_ms"]["p50"],
+        "p99_ms": result["latency_ms"]["p99"],
+        "loop_lag_p99_ms": result["stages_ms"]["loop_lag"]["p99"],
+    }
+
+
+def print_table(rows: list[dict]):
+    columns = list(rows[0])
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths, strict=True)))
+    for r in rows:
+        print(
+            "  ".join(str(r[c]).ljust(w) for c, w in zip(columns, widths, strict=True))
+        )
+
+
+def save(path: str, args: argparse.Namespace, rows: list[dict]):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(
+            {"profile": args.profile, "rate": args.rate, "runs": rows},
+            file,
+            indent=2,
+            ensure_ascii=False,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="gtav")
+    parser.add_argument("--rate", type=int, default=50_000, help="сообщений в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд")
+    parser.add_argument("--log", help="записанный чат вместо синтетического")
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=2.0)
+    parser.add_argument("--json", help="куда сохранить результат")
+    args = parser.parse_args()
+
+    rows = [row("single_loop", run(args, ["--single-loop"]))]
+    for workers in range(1, args.max_workers + 1):
+        rows.append(row(f"workers={workers}", run(args, ["--workers", str(workers)])))
+
+    print_table(rows)
+    if args.json:
+        save(args.json, args, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Бенчмарки горячих путей Controller и регистрации команд на NullBackend.
+
+    python -m benchmarks.hotpaths --json results.json
+    python -m benchmarks.hotpaths --only vote --compare results.json
+
+Для каждого бенчмарка пишутся операции в секунду, память на операцию
+(tracemalloc, отдельным прогоном) и задержка event loop'а во время прогона.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+import warnings
+from typing import Callable
+
+from bot import Bot, Curves, NullBackend, RUSSIAN_KEYBOARD
+from bot.actions import Action
+from bot.controller import Controller
+
+PROCESS = "game.exe"
+
+
+class LagMonitor:
+    """
+    Меряет, на сколько позже положенного просыпается asyncio.sleep(interval).
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.lags: list[float] = []
+        self.__task: asyncio.Task | None = None
+
+    def start(self):
+        self.lags = []
+        self.__task = asyncio.get_running_loop().create_task(self.__run())
+
+    def stop(self) -> dict[str, float | None]:
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        lags = sorted(self.lags)
+        if not lags:
+            return {"p50": None, "p99": None, "max": None}
+        return {
+            "p50": round(lags[len(lags) // 2] * 1000, 3),
+            "p99": round(lags[min(len(lags) - 1, len(lags) * 99 // 100)] * 1000, 3),
+            "max": round(lags[-1] * 1000, 3),
+        }
+
+    async def __run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+
+
+class Benchmark:
+    """
+    ``setup()`` готовит состояние и возвращает операцию ``op(i)``.
+    Операция вызывается ``count`` раз, каждые ``chunk`` вызовов управление
+    отдаётся event loop'у, чтобы успели отработать InputPipeline и таймеры.
+    После каждого прогона созданные Controller'ы останавливаются
+    (``close_controllers``), чтобы их задачи не мешали следующему.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        setup: Callable[[], Callable[[int], object]],
+        count: int = 100_000,
+        chunk: int = 1000,
+        ops_per_call: int = 1,
+        params: dict | None = None,
+    ):
+        self.name = name
+        self.setup = setup
+        self.count = count
+        self.chunk = chunk
+        self.ops_per_call = ops_per_call
+        self.params = params or {}
+
+    async def run(self, repeat: int) -> dict:
+        timings = []
+        monitor = LagMonitor()
+        for _ in range(repeat):
+            op = self.setup()
+            monitor.start()
+            start = time.perf_counter()
+            await self.__drive(op)
+            timings.append(time.perf_counter() - start)
+            lag = monitor.stop()
+            await close_controllers()
+
+        op = self.setup()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await self.__drive(op)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await close_controllers()
+
+        ops = self.count * self.ops_per_call
+        best = min(timings)
+        return {
+            "name": self.name,
+            "params": self.params,
+            "ops": ops,
+            "seconds": round(best, 6),
+            "ops_per_second": round(ops / best, 1),
+            "median_ops_per_second": round(ops / statistics.median(timings), 1),
+            "retained_bytes_per_op": round((current - before) / ops, 2),
+            "peak_bytes_per_op": round((peak - before) / ops, 2),
+            "loop_lag_ms": lag,
+        }
+
+    async def __drive(self, op: Callable[[int], object]):
+        chunk = self.chunk
+        for i in range(self.count):
+            op(i)
+            if i % chunk == chunk - 1:
+                await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+
+# Controller'ы текущего прогона, их останавливает close_controllers
+CONTROLLERS: list[Controller] = []
+
+
+def make_controller(**kwargs) -> Controller:
+    loop = asyncio.get_running_loop()
+    controller = Controller(
+        loop, asyncio.Event(), backend=NullBackend(PROCESS), **kwargs
+    )
+    controller.output.start()
+    CONTROLLERS.append(controller)
+    return controller
+
+
+async def close_controllers():
+    """
+    Отпускает клавиши и останавливает InputPipeline, таймеры отпускания
+    и цикл мыши всех созданных Controller'ов.
+    """
+    while CONTROLLERS:
+        await CONTROLLERS.pop().shutdown()
+
+
+def press_tap():
+    controller = make_controller()
+    keys = [chr(ord("a") + i) for i in range(26)]
+    return lambda i: controller.press_key(keys[i % 26], 0)
+
+
+def press_hold():
+    controller = make_controller()
+    return lambda i: controller.press_key(f"k{i}", 60)
+
+
+def press_extend():
+    controller = make_controller()
+    return lambda i: controller.press_key("w", 0.3)
+
+
+def press_extend_capped():
+    controller = make_controller(max_hold=5)
+    return lambda i: controller.press_key("w", 0.3)
+
+
+def vote(window: float, required: int, users: int, unique: bool):
+    def setup():
+        controller = make_controller()
+        names = [f"user{n}" for n in range(users)]
+        return lambda i: controller.vote_for_key(
+            "f", required, window, 0, names[i % users], unique
+        )
+
+    return setup
+
+
+def mouse_add():
+    controller = make_controller(max_mouse_pending=10_000)
+    return lambda i: controller.add_mouse_movement(15, -15)
+
+
+def execute_press():
+    controller = make_controller()
+    actions = [Action.press(chr(ord("a") + i), 0) for i in range(26)]
+    return lambda i: controller.execute(actions[i % 26])
+
+
+def execute_move():
+    controller = make_controller(max_mouse_pending=10_000)
+    action = Action.move(15, -15)
+    return lambda i: controller.execute(action)
+
+
+async def run_mouse_loop(tick_rate: int, seconds: float) -> dict:
+    """
+    Цикл мыши работает по таймеру, поэтому меряется не ops/s вызовов,
+    а сколько тиков он успевает сделать за ``seconds`` и как мешает loop'у.
+    """
+    ticks = 0
+
+    def curve(length: float, speed: float, tick: int) -> float:
+        nonlocal ticks
+        ticks += 1
+        return Curves.LINEAR(length, speed, tick)
+
+    monitor = LagMonitor()
+    tracemalloc.start()
+    controller = make_controller(mouse_tick_rate=tick_rate, mouse_curve=curve)
+    controller.start()
+    controller.add_mouse_movement(10**9, 10**9)
+    before = tracemalloc.get_traced_memory()[0]
+    monitor.start()
+    await asyncio.sleep(seconds)
+    lag = monitor.stop()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    done = ticks
+    await close_controllers()
+
+    return {
+        "name": f"mouse_loop[{tick_rate}hz]",
+        "params": {"tick_rate": tick_rate, "seconds": seconds},
+        "ops": done,
+        "seconds": seconds,
+        "ops_per_second": round(done / seconds, 1),
+        "median_ops_per_second": round(done / seconds, 1),
+        "retained_bytes_per_op": round((current - before) / max(done, 1), 2),
+        "peak_bytes_per_op": round((peak - before) / max(done, 1), 2),
+        "loop_lag_ms": lag,
+    }
+
+
+def register_keyboard():
+    bot = Bot("bench", PROCESS, backend=NullBackend(PROCESS), log_level="WARNING")
+
+    dispatcher = bot.dispatcher
+
+    def op(i):
+        # Каждый раз с пустыми таблицами, иначе все алиасы уже заняты,
+        # а память прошлых регистраций попадает в замер
+        dispatcher.commands.clear()
+        dispatcher.groups.clear()
+        dispatcher.cooldowns.clear()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            bot.register_all_keys(**RUSSIAN_KEYBOARD)
+
+    return op
+
+
+ALIASES = sum(len(commands) for commands in RUSSIAN_KEYBOARD.values())
+
+BENCHMARKS = [
+    Benchmark("press_key.tap", press_tap),
+    Benchmark("press_key.hold", press_hold, count=50_000),
+    Benchmark("press_key.extend", press_extend),
+    Benchmark("press_key.extend_capped", press_extend_capped),
+    Benchmark("add_mouse_movement", mouse_add),
+    Benchmark("execute.press", execute_press),
+    Benchmark("execute.move", execute_move),
+    Benchmark(
+        "register_all_keys[RUSSIAN_KEYBOARD]",
+        register_keyboard,
+        count=2000,
+        chunk=100,
+        ops_per_call=ALIASES,
+        params={"aliases": ALIASES},
+    ),
+]
+for window, required, users, unique in [
+    (1, 10, 100, False),
+    (10, 50, 1000, False),
+    (60, 10**9, 1000, False),
+    (10, 50, 1000, True),
+    (60, 10**9, 100_000, True),
+]:
+    BENCHMARKS.append(
+        Benchmark(
+            f"vote_for_key[w={window},req={required},users={users},"
+            f"unique={unique}]",
+            vote(window, required, users, unique),
+            params={
+                "time_window": window,
+                "required_votes": required,
+                "users": users,
+                "unique_users": unique,
+            },
+        )
+    )
+
+MOUSE_TICK_RATES = [60, 144, 1000]
+
+
+def git_version() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_all(only: str | None, repeat: int, mouse_seconds: float) -> list[dict]:
+    results = []
+    for benchmark in BENCHMARKS:
+        if only and only not in benchmark.name:
+            continue
+        results.append(await benchmark.run(repeat))
+        print(
+            f"{results[-1]['name']:<60} {results[-1]['ops_per_second']:>14,.0f} ops/s"
+        )
+    for tick_rate in MOUSE_TICK_RATES:
+        name = f"mouse_loop[{tick_rate}hz]"
+        if only and only not in name:
+            continue
+        results.append(await run_mouse_loop(tick_rate, mouse_seconds))
+        print(f"{name:<60} {results[-1]['ops_per_second']:>14,.0f} ticks/s")
+    return results
+
+
+def compare(results: list[dict], path: str):
+    with open(path, encoding="utf-8") as file:
+        old = {result["name"]: result for result in json.load(file)["results"]}
+    print(f"\nСравнение с {path}:")
+    for result in results:
+        before = old.get(result["name"])
+        if before is None or not before["ops_per_second"]:
+            continue
+        ratio = result["ops_per_second"] / before["ops_per_second"]
+        print(f"{result['name']:<60} {ratio:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", help="запускать только бенчмарки с этой подстрокой")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mouse-seconds", type=float, default=1.0)
+    parser.add_argument("--json", help="куда сохранить результат")
+    parser.add_argument("--compare", help="JSON предыдущего прогона")
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = loop.run_until_complete(
+        run_all(args.only, args.repeat, args.mouse_seconds)
+    )
+
+    report = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
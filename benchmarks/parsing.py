@@ -0,0 +1,36 @@
+"""
+Разбор чата в event loop'е против пула процессов: один и тот же прогон
+replay с single_loop и с Bot(parse_workers=N) для N от 1 до --max-workers.
+
+    python -m benchmarks.parsing --rate 20000 --duration 10
+"""
+
+import argparse
+
+from .cluster import print_table, row, run, save
+from .profiles import PROFILES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="gtav")
+    parser.add_argument("--rate", type=int, default=20_000, help="сообщений в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд")
+    parser.add_argument("--log", help="записанный чат вместо синтетического")
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=2.0)
+    parser.add_argument("--json", help="куда сохранить результат")
+    args = parser.parse_args()
+
+    rows = [row("in_loop", run(args, ["--single-loop"]))]
+    for workers in range(1, args.max_workers + 1):
+        result = run(args, ["--parse-workers", str(workers)])
+        rows.append(row(f"parse_workers={workers}", result))
+
+    print_table(rows)
+    if args.json:
+        save(args.json, args, rows)
+
+
+if __name__ == "__main__":
+    main()
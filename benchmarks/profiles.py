@@ -0,0 +1,30 @@
+"""
+Профили бота для бенчмарков: те же файлы из profiles/, по которым запускается
+бот (см. bot.profile), чтобы таблицы команд не расходились с примерами.
+"""
+
+import os
+
+from bot.profile import Profile, load_profile
+
+DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profiles"
+)
+
+# name -> файл в profiles/
+PROFILES = {
+    "minecraft": "minecraft.json",
+    "gtav": "gtav.toml",
+}
+
+
+def load(name: str) -> tuple[Profile, str, dict]:
+    """
+    Профиль, процесс игры и остальные настройки Bot из секции ``bot``
+    (без канала: бенчмарк подставляет свой).
+    """
+    profile = load_profile(os.path.join(DIRECTORY, PROFILES[name]))
+    settings = dict(profile.settings)
+    settings.pop("channel", None)
+    process = settings.pop("process")
+    return profile, process, settings
@@ -0,0 +1,375 @@
+"""
+Прогон бота на локальном IRC-сервере: синтетический или записанный чат
+с заданной скоростью, без Twitch и без игры.
+
+    python -m benchmarks.replay --profile gtav --rate 5000 --duration 10
+    python -m benchmarks.replay --log chat.txt --rate 20000 --json result.json
+    python -m benchmarks.replay --workers 4 --rate 50000
+
+Записанный лог — по строке на сообщение: либо сырые строки IRC ("@..."),
+либо "ник: текст".
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import multiprocessing
+from multiprocessing.connection import Connection
+import random
+import statistics
+import time
+import tracemalloc
+import warnings
+
+from bot import Bot, RecordingBackend
+from bot.backends import KEY_PRESS
+from bot.localirc import LocalIRCServer, format_privmsg
+
+from .profiles import PROFILES, load
+
+CHANNEL = "replay"
+PROBE = "probe"
+# Доля заданной скорости, которую генератор обязан выдать
+RATE_TOLERANCE = 0.95
+
+NOISE = [
+    "LUL",
+    "KEKW",
+    "go go go",
+    "what is he doing",
+    "!help",
+    "PogChamp",
+    "ахахах",
+    "chat is this real",
+]
+
+
+def memory_usage() -> int:
+    """
+    RSS процесса в байтах, если есть psutil, иначе размер кучи по tracemalloc.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return tracemalloc.get_traced_memory()[0]
+    return psutil.Process().memory_info().rss
+
+
+def synthetic_chat(
+    commands: list[str], users: int, count: int, command_share: float, prefix: str
+) -> list[str]:
+    rng = random.Random(0)
+    lines = []
+    for i in range(count):
+        user = f"user{rng.randrange(users)}"
+        if rng.random() < command_share:
+            text = prefix + rng.choice(commands)
+        else:
+            text = rng.choice(NOISE)
+        lines.append(format_privmsg(CHANNEL, user, text, msg_id=i, sent_ts=0))
+    return lines
+
+
+def recorded_chat(path: str) -> list[str]:
+    lines = []
+    with open(path, encoding="utf-8") as file:
+        for i, line in enumerate(file):
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if line.startswith("@") or line.startswith(":"):
+                lines.append(line)
+                continue
+            user, _, text = line.partition(": ")
+            user = user.strip().lower() or "user"
+            lines.append(format_privmsg(CHANNEL, user, text, msg_id=i, sent_ts=0))
+    return lines
+
+
+class Replay:
+    """
+    Отправляет строки чата со скоростью ``rate`` сообщений в секунду, пачками
+    раз в ``chunk`` секунд. Каждое ``probe_every``-е сообщение — команда-зонд
+    ``probe<i>``, время её отправки пишется в ``probe_log``, а задержку до
+    нажатия считает ``probe_latencies``.
+    """
+
+    def __init__(
+        self,
+        server: LocalIRCServer,
+        lines: list[str],
+        rate: int,
+        duration: float,
+        probes: int,
+        probe_every: int,
+        prefix: str,
+        chunk: float = 0.01,
+    ):
+        self.server = server
+        self.lines = lines
+        self.rate = rate
+        self.duration = duration
+        self.probes = probes
+        self.probe_every = probe_every
+        self.prefix = prefix
+        self.chunk = chunk
+
+        self.sent = 0
+        self.probes_sent = 0
+        # (номер зонда, time.perf_counter() отправки)
+        self.probe_log: list[tuple[int, float]] = []
+
+    async def run(self):
+        lines = self.lines
+        start = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.duration:
+                break
+            target = int(elapsed * self.rate)
+            batch = []
+            now = time.perf_counter()
+            sent_ts = f"tmi-sent-ts={int(time.time() * 1000)};"
+            while self.sent < target:
+                if self.probe_every and self.sent % self.probe_every == 0:
+                    index = self.probes_sent % self.probes
+                    self.probes_sent += 1
+                    self.probe_log.append((index, now))
+                    batch.append(
+                        format_privmsg(
+                            CHANNEL,
+                            f"probe{index}",
+                            f"{self.prefix}{PROBE}{index}",
+                        )
+                    )
+                else:
+                    batch.append(
+                        lines[self.sent % len(lines)].replace(
+                            "tmi-sent-ts=0;", sent_ts, 1
+                        )
+                    )
+                self.sent += 1
+            await self.server.send_lines(CHANNEL, batch)
+            await asyncio.sleep(self.chunk)
+
+
+def serve(connection: Connection, args: argparse.Namespace):
+    """
+    Точка входа процесса с сервером и генератором чата. Отдельный процесс
+    нужен, чтобы генератор не делил GIL с ботом и выдавал заданную скорость.
+
+    Протокол по ``connection``: отправляет адрес сервера, получает команды
+    и префикс бота, ждёт "go", ждёт входа бота в канал, прогоняет чат,
+    отправляет итог и ждёт "stop".
+    """
+    asyncio.run(_serve(connection, args))
+
+
+async def _serve(connection: Connection, args: argparse.Namespace):
+    loop = asyncio.get_running_loop()
+    server = LocalIRCServer()
+    connection.send(await server.start())
+
+    commands, prefix = connection.recv()
+    if args.log:
+        lines = recorded_chat(args.log)
+    else:
+        lines = synthetic_chat(
+            commands,
+            args.users,
+            max(1, min(args.rate * 2, 100_000)),
+            args.command_share,
+            prefix,
+        )
+    replay = Replay(
+        server,
+        lines,
+        args.rate,
+        args.duration,
+        args.probes,
+        args.probe_every,
+        prefix,
+    )
+
+    # Соединения бота обслуживает этот loop, поэтому ждём, не блокируя его
+    await loop.run_in_executor(None, connection.recv)
+    await server.wait_joined(CHANNEL, timeout=30)
+    started = time.perf_counter()
+    await replay.run()
+    connection.send(
+        {
+            "sent": replay.sent,
+            "elapsed": time.perf_counter() - started,
+            "probes_sent": replay.probes_sent,
+            "probe_log": replay.probe_log,
+        }
+    )
+    await loop.run_in_executor(None, connection.recv)
+    await server.stop()
+
+
+def probe_latencies(
+    sent: list[tuple[int, float]], seen: list[tuple[int, float]]
+) -> list[float]:
+    """
+    Задержки зондов: каждое нажатие ``probe<i>`` сопоставляется с последней
+    отправкой ``probe<i>`` до него, каждая отправка — не больше одного раза.
+    time.perf_counter() монотонный и общий для всех процессов машины,
+    поэтому времена из процесса сервера и бота можно вычитать.
+    """
+    by_index: dict[int, list[float]] = {}
+    for index, at in sent:
+        by_index.setdefault(index, []).append(at)
+    used = set()
+    latencies = []
+    for index, at in seen:
+        times = by_index.get(index)
+        if not times:
+            continue
+        i = bisect.bisect_right(times, at) - 1
+        if i >= 0 and (index, i) not in used:
+            used.add((index, i))
+            latencies.append(at - times[i])
+    return latencies
+
+
+def percentile(values: list[float], q: int) -> float | None:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="gtav")
+    parser.add_argument("--rate", type=int, default=5000, help="сообщений в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд")
+    parser.add_argument("--log", help="записанный чат вместо синтетического")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--command-share", type=float, default=0.7)
+    parser.add_argument("--probes", type=int, default=1000)
+    parser.add_argument("--probe-every", type=int, default=50)
+    parser.add_argument(
+        "--single-loop", action="store_true", help="Bot(single_loop=True)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Bot(workers=N), split-режим"
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="Bot(parse_workers=N), разбор чата в пуле процессов",
+    )
+    parser.add_argument("--settle", type=float, default=1.0)
+    parser.add_argument("--json", help="куда сохранить результат")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    profile, process, bot_kwargs = load(args.profile)
+
+    connection, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(
+        target=serve, args=(child, args), name="replay-server", daemon=True
+    )
+    server.start()
+    url = connection.recv()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    backend = RecordingBackend(active_process=process, maxlen=10_000)
+    bot = Bot(
+        CHANNEL,
+        process,
+        loop=loop,
+        backend=backend,
+        chat_url=url,
+        log_level="WARNING",
+        single_loop=args.single_loop,
+        workers=args.workers,
+        parse_workers=args.parse_workers,
+        **bot_kwargs,
+    )
+    with warnings.catch_warnings():
+        # Профили, как и gtav.py, перекрывают часть команд register_all_keys
+        warnings.simplefilter("ignore", UserWarning)
+        bot.apply_profile(profile)
+    commands = list(bot.dispatcher.commands)
+    for i in range(args.probes):
+        bot.press_key([f"{PROBE}{i}"], f"{PROBE}{i}", duration=0, cooldown=0)
+    connection.send((commands, bot.prefix))
+
+    # (номер зонда, time.perf_counter() нажатия)
+    seen: list[tuple[int, float]] = []
+
+    def on_action(now: float, action: tuple):
+        if action[0] != KEY_PRESS or not isinstance(action[1], str):
+            return
+        if action[1].startswith(PROBE):
+            seen.append((int(action[1][len(PROBE) :]), now))
+
+    backend.on_action = on_action
+
+    loop.run_until_complete(bot.start())
+    connection.send("go")
+    memory_before = memory_usage()
+    # Итог придёт после прогона; loop бота в это время читает чат
+    sent = loop.run_until_complete(loop.run_in_executor(None, connection.recv))
+    loop.run_until_complete(asyncio.sleep(args.settle))
+    memory_after = memory_usage()
+
+    bot.chat.stop()
+    connection.send("stop")
+    server.join(10)
+
+    sent_for = sent["elapsed"]
+    rate_actual = sent["sent"] / sent_for
+    ingress = bot.dispatcher.ingress.stats()
+    latencies = sorted(probe_latencies(sent["probe_log"], seen))
+    result = {
+        "profile": args.profile,
+        "single_loop": args.single_loop,
+        "workers": args.workers,
+        "parse_workers": args.parse_workers,
+        "source": args.log or "synthetic",
+        "rate": args.rate,
+        "rate_actual": round(rate_actual, 1),
+        "duration": round(sent_for, 3),
+        "messages_sent": sent["sent"],
+        "messages_read": bot.chat.messages,
+        "commands": ingress,
+        "commands_per_second": round(ingress["processed"] / sent_for, 1),
+        "actions": backend.actions,
+        "batches": backend.batches,
+        "probes_sent": sent["probes_sent"],
+        "probes_seen": len(latencies),
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+        "memory_growth_bytes": memory_after - memory_before,
+        "stages_ms": bot.stats()["latency"],
+    }
+    for name, value in result["latency_ms"].items():
+        if value is not None:
+            result["latency_ms"][name] = round(value * 1000, 3)
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2, ensure_ascii=False)
+
+    if rate_actual < args.rate * RATE_TOLERANCE:
+        # Иначе результат меряет генератор, а не бота
+        raise SystemExit(
+            f"Генератор не выдал заданную скорость: {rate_actual:.0f} из "
+            f"{args.rate} сообщений в секунду"
+        )
+
+
+if __name__ == "__main__":
+    main()
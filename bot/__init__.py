@@ -1,5 +1,31 @@
+from .backends import AHKBackend, InputBackend, NullBackend, RecordingBackend
 from .bot import Bot
+from .channels import Channel
 from .controller import Keys, Direction
+from .cooldown import Cooldown, Scope
+from .curves import Curves
+from .democracy import Mode
+from .host import BotHost
+from .profile import Profile, ProfileError, load_profile
 from .utils import RUSSIAN_KEYBOARD, RUSSIAN_WASD
 
-__all__ = ["Bot", "Keys", "Direction", "RUSSIAN_KEYBOARD", "RUSSIAN_WASD"]
+__all__ = [
+    "Bot",
+    "BotHost",
+    "Channel",
+    "InputBackend",
+    "AHKBackend",
+    "NullBackend",
+    "RecordingBackend",
+    "Keys",
+    "Direction",
+    "Curves",
+    "Cooldown",
+    "Scope",
+    "Mode",
+    "Profile",
+    "ProfileError",
+    "load_profile",
+    "RUSSIAN_KEYBOARD",
+    "RUSSIAN_WASD",
+]
@@ -0,0 +1,122 @@
+from ahk.keys import Key
+
+PRESS = 0
+"""Нажать или зажать клавишу: ``key``, ``duration``."""
+MOVE = 1
+"""Сдвинуть мышь: ``dx``, ``dy``."""
+VOTE = 2
+"""Голос за клавишу: ``key``, ``duration``, ``required_votes``,
+``time_window``, ``one_vote_per_user``."""
+MODE_VOTE = 3
+"""Голос за режим: ``mode``, ``required_votes``, ``time_window``."""
+
+KINDS = ("press", "move", "vote", "mode_vote")
+
+
+class Action:
+    """
+    Действие команды, в которое компилируется регистрация.
+
+    Хранит только вид действия и его параметры без ссылок на Controller,
+    а выполняет его ``Controller.execute`` (голос за режим — Dispatcher),
+    так что вызов команды ничего не создаёт. Записи сравниваются по значению
+    и пиклятся, поэтому одинаковые команды можно узнать после перезагрузки
+    профиля.
+    """
+
+    __slots__ = (
+        "kind",
+        "key",
+        "duration",
+        "dx",
+        "dy",
+        "required_votes",
+        "time_window",
+        "one_vote_per_user",
+        "mode",
+    )
+
+    def __init__(
+        self,
+        kind: int,
+        key: str | Key | None = None,
+        duration: int | float | None = None,
+        dx: int = 0,
+        dy: int = 0,
+        required_votes: int = 0,
+        time_window: int | float = 0,
+        one_vote_per_user: bool = False,
+        mode: str | None = None,
+    ):
+        self.kind = kind
+        self.key = key
+        self.duration = duration
+        self.dx = dx
+        self.dy = dy
+        self.required_votes = required_votes
+        self.time_window = time_window
+        self.one_vote_per_user = one_vote_per_user
+        self.mode = mode
+
+    @classmethod
+    def press(cls, key: str | Key, duration: int | float | None) -> "Action":
+        return cls(PRESS, key, duration)
+
+    @classmethod
+    def move(cls, dx: int, dy: int) -> "Action":
+        return cls(MOVE, dx=dx, dy=dy)
+
+    @classmethod
+    def vote(
+        cls,
+        key: str | Key,
+        required_votes: int,
+        time_window: int | float,
+        duration: int | float | None = None,
+        one_vote_per_user: bool = False,
+    ) -> "Action":
+        return cls(
+            VOTE,
+            key,
+            duration,
+            required_votes=required_votes,
+            time_window=time_window,
+            one_vote_per_user=one_vote_per_user,
+        )
+
+    @classmethod
+    def mode_vote(
+        cls, mode: str, required_votes: int, time_window: int | float
+    ) -> "Action":
+        return cls(
+            MODE_VOTE,
+            required_votes=required_votes,
+            time_window=time_window,
+            mode=mode,
+        )
+
+    @property
+    def pass_user(self) -> bool:
+        """
+        Нужен ли действию id зрителя.
+        """
+        return self.kind == VOTE or self.kind == MODE_VOTE
+
+    def __values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, Action):
+            return NotImplemented
+        return self.__values() == other.__values()
+
+    def __hash__(self):
+        return hash(self.__values())
+
+    def __repr__(self):
+        values = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in self.__slots__[1:]
+            if getattr(self, name) not in (None, 0, False)
+        )
+        return f"Action({KINDS[self.kind]}{', ' if values else ''}{values})"
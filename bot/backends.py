@@ -0,0 +1,171 @@
+import time
+from collections import deque
+from typing import Callable
+
+from ahk import AsyncAHK
+from ahk.keys import Key
+
+KEY_DOWN = "down"
+KEY_UP = "up"
+KEY_PRESS = "press"
+CLICK = "click"
+MOUSE_MOVE = "move"
+
+Action = tuple
+"""
+Действие ввода: (KEY_DOWN | KEY_UP | KEY_PRESS | CLICK, key) или (MOUSE_MOVE, dx, dy).
+"""
+
+MOUSE_BUTTONS = {"left": "LButton", "right": "RButton"}
+
+
+def key_name(key: str | Key) -> str:
+    if isinstance(key, Key):
+        return key.name
+    return key
+
+
+class InputBackend:
+    """
+    То, через что Controller нажимает клавиши и двигает мышь.
+
+    Обязательны только ``send`` и ``get_active_process``: пачка действий
+    от InputPipeline приходит в ``send`` целиком, остальные методы — удобные
+    обёртки над ним.
+    """
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    async def send(self, actions: list[Action]):
+        raise NotImplementedError
+
+    async def get_active_process(self) -> str | None:
+        raise NotImplementedError
+
+    def add_hotkey(
+        self,
+        hotkey: str,
+        callback: Callable[[], object],
+        ex_handler: Callable[[str, Exception], object] | None = None,
+    ):
+        pass
+
+    async def key_down(self, key: str | Key):
+        await self.send([(KEY_DOWN, key)])
+
+    async def key_up(self, key: str | Key):
+        await self.send([(KEY_UP, key)])
+
+    async def key_press(self, key: str | Key):
+        await self.send([(KEY_PRESS, key)])
+
+    async def click(self, button: str = "left"):
+        await self.send([(CLICK, button)])
+
+    async def mouse_move(self, dx: int, dy: int, speed: int = 0):
+        await self.send([(MOUSE_MOVE, dx, dy)])
+
+
+class AHKBackend(InputBackend):
+    """
+    Ввод через AutoHotkey: каждая пачка действий — одна строка SendInput.
+    """
+
+    def __init__(self, ahk: AsyncAHK | None = None):
+        self.ahk = ahk if ahk is not None else AsyncAHK()
+
+    def start(self):
+        self.ahk.start_hotkeys()
+
+    def stop(self):
+        self.ahk.stop_hotkeys()
+
+    def add_hotkey(
+        self,
+        hotkey: str,
+        callback: Callable[[], object],
+        ex_handler: Callable[[str, Exception], object] | None = None,
+    ):
+        self.ahk.add_hotkey(hotkey, callback, ex_handler)
+
+    async def send(self, actions: list[Action]):
+        script = []
+        for action in actions:
+            kind = action[0]
+            if kind == MOUSE_MOVE:
+                script.append(f"{{Click {action[1]} {action[2]} 0 Rel}}")
+                continue
+            name = key_name(action[1])
+            name = MOUSE_BUTTONS.get(name, name)
+            if kind == KEY_DOWN:
+                script.append("{" + name + " down}")
+            elif kind == KEY_UP:
+                script.append("{" + name + " up}")
+            else:
+                script.append("{" + name + " down}{" + name + " up}")
+        await self.ahk.send_input("".join(script))
+
+    async def get_active_process(self) -> str | None:
+        # Один запрос вместо get_active_window() + get_process_name()
+        return await self.ahk.win_get_process_name(
+            title="A", detect_hidden_windows=False
+        )
+
+    async def mouse_move(self, dx: int, dy: int, speed: int = 0):
+        await self.ahk.mouse_move(
+            x=dx, y=dy, speed=speed, blocking=False, relative=True
+        )
+
+
+class NullBackend(InputBackend):
+    """
+    Ничего не нажимает. Для прогонов бота без игры и без Windows.
+    """
+
+    def __init__(self, active_process: str | None = None):
+        self.active_process = active_process
+        self.actions = 0
+        self.batches = 0
+
+    async def send(self, actions: list[Action]):
+        self.actions += len(actions)
+        self.batches += 1
+
+    async def get_active_process(self) -> str | None:
+        return self.active_process
+
+
+class RecordingBackend(NullBackend):
+    """
+    Запоминает все действия с временем отправки (time.perf_counter()).
+
+    Записи хранятся в ``records`` как (timestamp, *action). Если задан
+    ``maxlen``, хранятся только последние ``maxlen`` действий.
+    ``on_action`` вызывается для каждого действия, например чтобы
+    замерить задержку от сообщения в чате до нажатия.
+    """
+
+    def __init__(
+        self,
+        active_process: str | None = None,
+        maxlen: int | None = None,
+        on_action: Callable[[float, Action], object] | None = None,
+    ):
+        super().__init__(active_process)
+        self.records: deque[tuple] = deque(maxlen=maxlen)
+        self.on_action = on_action
+
+    async def send(self, actions: list[Action]):
+        await super().send(actions)
+        now = time.perf_counter()
+        for action in actions:
+            self.records.append((now, *action))
+            if self.on_action is not None:
+                self.on_action(now, action)
+
+    def clear(self):
+        self.records.clear()
@@ -1,17 +1,32 @@
-from twitchAPI.chat import ChatMessage
 import asyncio
-import functools
-from typing import Callable
+import logging
+import os
+import time
 import warnings
 
 from aiohttp.helpers import sentinel
-from ahk import AsyncAHK
 from ahk.keys import Key
 from twitchAPI.type import ChatEvent
 from twitchAPI.chat import Chat, EventData, ChatCommand
-from twitchAPI.chat.middleware import ChannelUserCommandCooldown, BaseCommandMiddleware
+from twitchAPI.chat.middleware import BaseCommandMiddleware
 
+from .actions import Action
+from .backends import InputBackend
 from .controller import Controller, Direction, Keys
+from .curves import Curves, MouseCurve
+from .democracy import Democracy, Mode
+from .channels import Channel, ChannelsSpec, parse_channels
+from .cluster import ClusterExecutor
+from .cooldown import Cooldown
+from .dispatch import Dispatcher
+from .irc import IRCReader
+from .log import get_logger, setup_logging
+from .metrics import MetricsServer
+from .profile import Profile, ProfileError, load_profile
+from .stats import CHAT, Timings
+
+log = get_logger("bot")
+chat_log = get_logger("chat")
 
 
 class FakeUser:
@@ -32,73 +47,91 @@ class FakeTwitch:
             yield FakeUser
 
 
-class ActiveWindowMiddleware(BaseCommandMiddleware):
-    def __init__(
-        self, loop: asyncio.AbstractEventLoop, ahk: AsyncAHK, process_name: str
-    ):
-        self.loop = loop
-        self.ahk = ahk
-        self.process_name = process_name
-
-    async def can_execute(self, cmd: ChatCommand):
-        # Ёбанный TwitchAPI запускает Middleware в другом потоке и как следствие - в другом EventLoop
-        # Поэтому нужно использовать run_coroutine_threadsafe
-
-        if self.process_name == "*":
-            return True
-        future = asyncio.run_coroutine_threadsafe(
-            self.ahk.get_active_window(), self.loop
-        )
-        active_window = await asyncio.wrap_future(future)
-
-        if not active_window:
-            return False
-
-        future = asyncio.run_coroutine_threadsafe(
-            active_window.get_process_name(), self.loop
-        )
-        process_name = await asyncio.wrap_future(future)
-
-        if process_name == self.process_name:
-            return True
-        return False
+class OnlyModsMiddleware(BaseCommandMiddleware):
+    async def can_execute(self, command: ChatCommand):
+        return command.room.name == command.user.name or command.user.mod
 
     async def was_executed(self, cmd: ChatCommand):
         pass
 
 
-class PausedMiddleware(BaseCommandMiddleware):
-    def __init__(self, paused: asyncio.Event):
-        self.paused = paused
-
-    async def can_execute(self, cmd: ChatCommand):
-        if self.paused.is_set():
-            return False
-        return True
+class BotChat(Chat):
+    """
+    Chat, который отдаёт команды в Dispatcher в обход обработчиков и middleware twitchAPI.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dispatcher = dispatcher
+        self.log_no_registered_command_handler = False
+        self.messages = 0
+
+    async def _handle_msg(self, parsed: dict):
+        received = time.perf_counter()
+        self.messages += 1
+        tags = parsed["tags"]
+        timings = self.dispatcher.timings
+        if timings is not None and tags.get("tmi-sent-ts"):
+            timings.record(CHAT, time.time() - int(tags["tmi-sent-ts"]) / 1000)
+        shared = (
+            self.no_shared_chat_messages
+            and "source-room-id" in tags
+            and tags["source-room-id"] != tags.get("room-id")
+        )
+        if chat_log.isEnabledFor(logging.INFO):
+            chat_log.info(
+                "%s: %s",
+                tags.get("display-name") or parsed["source"]["nick"].lstrip(":"),
+                parsed["parameters"],
+            )
 
-    async def was_executed(self, cmd: ChatCommand):
-        pass
+        if not shared:
+            self.dispatcher.handle(
+                parsed["command"].get("bot_command"),
+                parsed["command"]["channel"],
+                tags.get("user-id") or parsed["source"]["nick"],
+                received,
+            )
 
-
-class OnlyModsMiddleware(BaseCommandMiddleware):
-    async def can_execute(self, command: ChatCommand):
-        return command.room.name == command.user.name or command.user.mod
-
-    async def was_executed(self, cmd: ChatCommand):
-        pass
+        if self._event_handler.get(ChatEvent.MESSAGE):
+            await super()._handle_msg(parsed)
 
 
 class Bot:
     def __init__(
         self,
-        channel: str,
+        channel: ChannelsSpec,
         process: str,
         mouse_speed: int = 15,
         prefix: str = "!",
-        cooldown: int = 0,
+        cooldown: int | float | Cooldown = 0,
         loop: asyncio.AbstractEventLoop | None = None,
+        focus_staleness: int | float = 1.0,
+        mouse_tick_rate: int = 60,
+        mouse_curve: MouseCurve = Curves.LINEAR,
+        mode: str = Mode.ANARCHY,
+        democracy_window: int | float = 2.0,
+        democracy_winners: int = 1,
+        queue_size: int = 1024,
+        max_hold: int | float | None = 5.0,
+        max_mouse_pending: int | float | None = 2000,
+        log_level: int | str = "INFO",
+        log_file: str | None = None,
+        log_sampling: dict[str, int] | None = None,
+        backend: InputBackend | None = None,
+        chat_url: str | None = None,
+        stats_interval: int | float | None = None,
+        metrics_port: int | None = None,
+        metrics_host: str = "127.0.0.1",
+        single_loop: bool = False,
+        workers: int = 0,
+        parse_workers: int = 0,
     ):
-        self.channel = channel
+        setup_logging(log_level, log_file, sampling=log_sampling)
+
+        self.channels = parse_channels(channel)
+        # Первый канал, для совместимости
+        self.channel = next(iter(self.channels.values())).name
         self.process = process
         self.cooldown = cooldown
         self.prefix = prefix
@@ -106,53 +139,257 @@ class Bot:
         if loop is None:
             try:
                 loop = asyncio.get_running_loop()
-                print("Got running event loop")
+                log.debug("Got running event loop")
             except RuntimeError:
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
-                print("Created new event loop")
+                log.debug("Created new event loop")
         self.loop = loop
         self.paused = asyncio.Event()
-        self.controller = Controller(self.loop, self.paused, mouse_speed)
-        self.chat = Chat(FakeTwitch, callback_loop=self.loop)
+        self.timings = Timings(self.loop, report_interval=stats_interval)
+        self.controller = Controller(
+            self.loop,
+            self.paused,
+            mouse_speed,
+            focus_staleness,
+            mouse_tick_rate,
+            mouse_curve,
+            # 0 и None отключают ограничение
+            max_hold or None,
+            max_mouse_pending or None,
+            backend,
+            self.timings,
+        )
+        self.democracy = Democracy(self.loop, democracy_window, democracy_winners, mode)
+        self.dispatcher = Dispatcher(
+            self.loop,
+            self.paused,
+            self.controller.focus,
+            self.process,
+            self.democracy,
+            queue_size,
+            self.timings,
+            threadsafe=not (single_loop or workers or parse_workers),
+            channels=self.channels,
+            controller=self.controller,
+        )
+        if workers:
+            self.chat = ClusterExecutor(
+                self.dispatcher,
+                self.loop,
+                [channel.name for channel in self.channels.values()],
+                self.prefix,
+                chat_url,
+                workers,
+                log_level=log_level,
+                log_sampling=log_sampling,
+            )
+        elif single_loop or parse_workers:
+            self.chat = IRCReader(
+                self.dispatcher,
+                self.loop,
+                [channel.name for channel in self.channels.values()],
+                self.prefix,
+                chat_url,
+                parse_workers=parse_workers,
+            )
+        else:
+            self.chat = BotChat(
+                self.dispatcher,
+                FakeTwitch,
+                connection_url=chat_url,
+                callback_loop=self.loop,
+            )
+            self.chat.set_prefix(self.prefix)
+            self.chat.register_event(ChatEvent.READY, self.__on_ready)
+            self.chat.register_event(ChatEvent.JOINED, self.__on_joined)
 
-        self.chat.set_prefix(self.prefix)
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = MetricsServer(self, metrics_port, metrics_host)
 
-        self.chat.register_command_middleware(
-            ActiveWindowMiddleware(self.loop, self.controller.ahk, self.process)
-        )
-        self.chat.register_command_middleware(PausedMiddleware(self.paused))
+        self.__watcher: asyncio.Task | None = None
+        self.__shut_down = False
+
+    @classmethod
+    def from_profile(cls, path: str, watch: bool = False, **kwargs) -> "Bot":
+        """
+        Создаёт бота по профилю JSON/TOML (см. ``bot.profile``) и регистрирует
+        его команды. ``kwargs`` перекрывают настройки из секции ``bot``.
+        С ``watch`` бот подхватывает изменения файла на лету (``watch_profile``).
+        """
+        profile = load_profile(path)
+        bot = cls(**{**profile.settings, **kwargs})
+        bot.apply_profile(profile)
+        if watch:
+            bot.watch_profile(path)
+        return bot
+
+    def apply_profile(self, profile: Profile | str):
+        """
+        Регистрирует команды из профиля или пути к нему. Настройки из секции
+        ``bot`` не применяются: они нужны только при создании бота.
+        """
+        if isinstance(profile, str):
+            profile = load_profile(profile)
+        for commands, action, cooldown, democratic in profile.entries:
+            self.__register_command(list(commands), action, cooldown, democratic)
+
+    def reload_profile(self, profile: Profile | str):
+        """
+        Заменяет все команды бота командами профиля, не останавливая бота
+        и не переподключаясь к чату. Можно вызывать из любого потока: профиль
+        загружается в вызывающем потоке, а таблица команд подменяется в loop'е
+        бота между сообщениями (``Dispatcher.replace``). У команд, которые не
+        поменялись, сохраняются кулдауны и голоса.
+
+        Настройки из секции ``bot`` не применяются.
+        """
+        if isinstance(profile, str):
+            profile = load_profile(profile)
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.__replace_commands, profile)
+        else:
+            self.__replace_commands(profile)
+
+    def watch_profile(self, path: str, interval: int | float = 1.0):
+        """
+        Раз в ``interval`` секунд проверяет файл профиля и перезагружает
+        команды, если он изменился. Профиль с ошибкой не применяется:
+        бот пишет ошибку в лог и работает со старыми командами.
+        """
+        if self.__watcher is not None:
+            self.__watcher.cancel()
+        self.__watcher = self.loop.create_task(self.__watch(path, interval))
 
-        self.chat.register_event(ChatEvent.READY, self.__on_ready)
-        self.chat.register_event(ChatEvent.JOINED, self.__on_joined)
-        self.chat.register_event(ChatEvent.MESSAGE, self.__on_message)
+    async def __watch(self, path: str, interval: int | float):
+        def stamp():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            return stat.st_mtime_ns, stat.st_size
 
-        self.__commands = []
+        last = stamp()
+        while True:
+            await asyncio.sleep(interval)
+            current = stamp()
+            if current is None or current == last:
+                continue
+            last = current
+            try:
+                # Разбор и проверка — в потоке, чтобы не держать чат
+                profile = await self.loop.run_in_executor(None, load_profile, path)
+            except (ProfileError, OSError) as e:
+                log.error("Профиль %s не применён: %s", path, e)
+                continue
+            self.__replace_commands(profile)
+
+    def __replace_commands(self, profile: Profile):
+        kept, added, removed, taken = self.dispatcher.replace(
+            [
+                (
+                    list(commands),
+                    action,
+                    self.__cooldown(cooldown),
+                    action.pass_user,
+                    democratic,
+                )
+                for commands, action, cooldown, democratic in profile.entries
+            ]
+        )
+        for command in taken:
+            log.warning("Command %s is already registered", command)
+        self.controller.sync_votes(
+            record.action
+            for record in self.dispatcher.groups.values()
+            if type(record.action) is Action
+        )
+        if isinstance(self.chat, ClusterExecutor):
+            self.chat.publish()
+        log.info(
+            "Команды обновлены: без изменений %d, новых %d, удалено %d",
+            kept,
+            added,
+            removed,
+        )
 
     def run(self):
         try:
             self.loop.run_until_complete(self.start())
             self.loop.run_forever()
-        except KeyboardInterrupt:
-            self.loop.run_until_complete(self.stop())
-        except asyncio.CancelledError:
-            self.loop.run_until_complete(self.stop())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
         except Exception:
-            self.loop.run_until_complete(self.stop())
+            log.exception("Бот остановлен из-за ошибки")
+        finally:
+            # И после stop(), и после горячей клавиши остановки
+            self.loop.run_until_complete(self.shutdown())
 
     async def start(self):
+        self.timings.start()
         self.controller.start()
+        if self.process != "*":
+            self.controller.focus.start()
+        if self.metrics is not None:
+            await self.metrics.start()
 
-        await self.chat  # bruh
+        if isinstance(self.chat, BotChat):
+            await self.chat  # bruh
 
         self.chat.start()
 
     async def stop(self):
-        self.chat.stop()
+        await self.shutdown()
         self.loop.stop()
 
+    async def shutdown(self):
+        """
+        Аккуратно останавливает бота, не останавливая loop: отключается от
+        чата, отпускает зажатые клавиши и останавливает backend. Повторный
+        вызов ничего не делает.
+        """
+        if self.__shut_down:
+            return
+        self.__shut_down = True
+        if self.__watcher is not None:
+            self.__watcher.cancel()
+            self.__watcher = None
+        self.chat.stop()
+        if self.metrics is not None:
+            await self.metrics.stop()
+        self.timings.stop()
+        await self.controller.shutdown()
+
+    def set_channel(
+        self,
+        name: str,
+        weight: int | float | None = None,
+        scope: str | None = None,
+        enabled: bool | None = None,
+    ) -> Channel:
+        """
+        Меняет вес, скоуп кулдаунов или включает/выключает канал на лету.
+        """
+        return self.dispatcher.configure_channel(name, weight, scope, enabled)
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Задержки по этапам команды и event loop'а (в миллисекундах)
+        и счётчики очереди команд и отправки ввода.
+        """
+        return {
+            "latency": self.timings.snapshot(),
+            "ingress": self.dispatcher.ingress.stats(),
+            "output": self.controller.output.stats(),
+            "limits": {
+                "capped_holds": self.controller.capped_holds,
+                "capped_mouse": self.controller.capped_mouse,
+            },
+        }
+
     def register_numbers(
-        self, duration: int | float = 0, cooldown: int | float | None = None
+        self, duration: int | float = 0, cooldown: int | float | Cooldown | None = None
     ):
         """
         Registers commands for numbers 0-9
@@ -163,14 +400,14 @@ class Bot:
         for number in range(0, 10):
             self.__register_command(
                 str(number),
-                functools.partial(self.__press_key, str(number), duration),
+                Action.press(str(number), duration),
                 cooldown,
             )
 
     def register_all_keys(
         self,
         duration: int | float = 0.3,
-        cooldown: int | float | None = None,
+        cooldown: int | float | Cooldown | None = None,
         **kwargs: dict[str, list[str]],
     ):
         """
@@ -179,14 +416,14 @@ class Bot:
         for key, commands in kwargs.items():
             self.__register_command(
                 commands,
-                functools.partial(self.__press_key, key, duration),
+                Action.press(key, duration),
                 cooldown,
             )
 
     def register_wasd(
         self,
         duration: int | float = 0.3,
-        cooldown: int | float | None = None,
+        cooldown: int | float | Cooldown | None = None,
         w: list[str] = ["w"],
         a: list[str] = ["a"],
         s: list[str] = ["s"],
@@ -194,22 +431,22 @@ class Bot:
     ):
         self.__register_command(
             w,
-            functools.partial(self.__press_key, "w", duration),
+            Action.press("w", duration),
             cooldown,
         )
         self.__register_command(
             a,
-            functools.partial(self.__press_key, "a", duration),
+            Action.press("a", duration),
             cooldown,
         )
         self.__register_command(
             s,
-            functools.partial(self.__press_key, "s", duration),
+            Action.press("s", duration),
             cooldown,
         )
         self.__register_command(
             d,
-            functools.partial(self.__press_key, "d", duration),
+            Action.press("d", duration),
             cooldown,
         )
 
@@ -218,23 +455,11 @@ class Bot:
         commands: str | list[str],
         direction: Direction,
         amount: int = 100,
-        cooldown: int | float | None = None,
+        cooldown: int | float | Cooldown | None = None,
     ):
-        if direction == Direction.UP:
-            x = 0
-            y = -amount
-        elif direction == Direction.DOWN:
-            x = 0
-            y = amount
-        elif direction == Direction.LEFT:
-            x = -amount
-            y = 0
-        elif direction == Direction.RIGHT:
-            x = amount
-            y = 0
         self.__register_command(
             commands,
-            functools.partial(self.__move_mouse, x, y),
+            Action.move(*Direction.delta(direction, amount)),
             cooldown,
         )
 
@@ -243,30 +468,36 @@ class Bot:
         commands: str | list[str],
         key: Key | str,
         duration: int | float | None = None,
-        cooldown: int | float | None = None,
+        cooldown: int | float | Cooldown | None = None,
     ):
         self.__register_command(
-            commands, functools.partial(self.__press_key, key, duration), cooldown
+            commands,
+            Action.press(key, duration),
+            cooldown,
         )
 
     def left_mouse_button(
         self,
         commands: str | list[str],
         duration: int | float | None = None,
-        cooldown: int | float | None = None,
+        cooldown: int | float | Cooldown | None = None,
     ):
         self.__register_command(
-            commands, functools.partial(self.__press_key, Keys.LMB, duration), cooldown
+            commands,
+            Action.press(Keys.LMB, duration),
+            cooldown,
         )
 
     def right_mouse_button(
         self,
         commands: str | list[str],
         duration: int | float | None = None,
-        cooldown: int | float | None = None,
+        cooldown: int | float | Cooldown | None = None,
     ):
         self.__register_command(
-            commands, functools.partial(self.__press_key, Keys.RMB, duration), cooldown
+            commands,
+            Action.press(Keys.RMB, duration),
+            cooldown,
         )
 
     def key_vote(
@@ -276,48 +507,64 @@ class Bot:
         required_votes: int,
         time_window: int | float,
         duration: int | float | None = None,
-        cooldown: int | float | None = None,
+        cooldown: int | float | Cooldown | None = None,
+        one_vote_per_user: bool = False,
     ):
         self.__register_command(
             commands,
-            functools.partial(
-                self.__key_vote, key, required_votes, time_window, duration
-            ),
+            Action.vote(key, required_votes, time_window, duration, one_vote_per_user),
             cooldown,
         )
 
+    def register_mode_vote(
+        self,
+        anarchy: str | list[str] = ["anarchy"],
+        democracy: str | list[str] = ["democracy"],
+        required_votes: int = 10,
+        time_window: int | float = 30,
+        cooldown: int | float | Cooldown | None = None,
+    ):
+        """
+        Команды для переключения между анархией и демократией голосованием чата.
+        """
+        self.__register_command(
+            anarchy,
+            Action.mode_vote(Mode.ANARCHY, required_votes, time_window),
+            cooldown,
+            democratic=False,
+        )
+        self.__register_command(
+            democracy,
+            Action.mode_vote(Mode.DEMOCRACY, required_votes, time_window),
+            cooldown,
+            democratic=False,
+        )
+
+    def set_mode(self, mode: str):
+        """
+        Переключает режим: Mode.ANARCHY или Mode.DEMOCRACY.
+        """
+        self.loop.call_soon_threadsafe(self.democracy.set_mode, mode)
+
     # twitchAPI callbacks
 
     async def __on_ready(self, event: EventData):
-        print(f"Successfully connected to Twitch")
-        await self.chat.join_room(self.channel)
+        log.info("Successfully connected to Twitch")
+        failed = await self.chat.join_room(
+            [channel.name for channel in self.channels.values()]
+        )
+        for name in failed:
+            log.warning("Не удалось зайти в %s", name)
 
     async def __on_joined(self, event: EventData):
-        print(f"Joined {self.channel}")
-
-    async def __on_message(self, message: ChatMessage):
-        print(f"{message.user.name}: {message.text}")
-
-    async def __key_vote(
-        self,
-        key: str | Key,
-        required_votes: int,
-        time_window: int | float,
-        duration: int | float | None,
-        _: ChatCommand,
-    ):
-        self.controller.vote_for_key(key, required_votes, time_window, duration)
-
-    async def __press_key(
-        self, key: str | Key, duration: int | float | None, _: ChatCommand
-    ):
-        self.controller.press_key(key, duration)
-
-    async def __move_mouse(self, x: int, y: int, _: ChatCommand):
-        self.controller.add_mouse_movement(x, y)
+        log.info("Joined %s", event.room_name)
 
     def __register_command(
-        self, commands: str | list[str], func: Callable, cooldown: int | float | None
+        self,
+        commands: str | list[str],
+        action: Action,
+        cooldown: int | float | Cooldown | None,
+        democratic: bool = True,
     ):
         """
         0 to disable cooldown
@@ -326,12 +573,17 @@ class Bot:
         if isinstance(commands, str):
             commands = [commands]
 
-        middlewares = []
-        if cooldown or (cooldown is None and self.cooldown):
-            middlewares.append(ChannelUserCommandCooldown(cooldown or self.cooldown))
-        for command in commands:
-            registered = self.chat.register_command(
-                command, func, command_middleware=middlewares
-            )
-            if not registered:
-                warnings.warn(f"Command {command} is already registered")
+        taken = self.dispatcher.register(
+            commands, action, self.__cooldown(cooldown), action.pass_user, democratic
+        )
+        for command in taken:
+            # Предупреждение указывает на вызов register_*/press_key в коде
+            # пользователя, а не на этот метод
+            warnings.warn(f"Command {command} is already registered", stacklevel=3)
+
+    def __cooldown(self, cooldown: int | float | Cooldown | None) -> Cooldown | None:
+        if cooldown is None:
+            cooldown = self.cooldown
+        if cooldown and not isinstance(cooldown, Cooldown):
+            cooldown = Cooldown(cooldown)
+        return cooldown or None
@@ -0,0 +1,68 @@
+class Channel:
+    """
+    Настройки канала, из которого бот берёт команды.
+
+    :param name: Название канала на Twitch
+    :param weight: Доля канала при разборе очереди команд. Канал с весом 2
+        выполняет вдвое больше команд, чем канал с весом 1, если оба флудят.
+    :param scope: Скоуп кулдаунов для команд из этого канала (см. ``Scope``)
+        вместо скоупа самой команды
+    :param enabled: Принимать ли команды из канала
+    """
+
+    __slots__ = ("name", "weight", "scope", "enabled")
+
+    def __init__(
+        self,
+        name: str,
+        weight: int | float = 1,
+        scope: str | None = None,
+        enabled: bool = True,
+    ):
+        if weight <= 0:
+            raise ValueError("Channel weight must be positive")
+        self.name = name.lower().lstrip("#")
+        self.weight = weight
+        self.scope = scope
+        self.enabled = enabled
+
+    def __repr__(self):
+        return (
+            f"Channel({self.name!r}, weight={self.weight!r}, "
+            f"scope={self.scope!r}, enabled={self.enabled!r})"
+        )
+
+    @property
+    def key(self) -> str:
+        """
+        Имя канала так, как оно приходит в IRC: ``#name``.
+        """
+        return f"#{self.name}"
+
+
+ChannelsSpec = str | Channel | list[str | Channel] | dict[str, int | float | dict]
+
+
+def parse_channels(channels: ChannelsSpec) -> dict[str, Channel]:
+    """
+    Приводит канал или каналы к словарю ``#name`` -> Channel.
+
+    Принимает строку, Channel, список строк/Channel или словарь
+    имя -> вес или имя -> аргументы Channel.
+    """
+    if isinstance(channels, (str, Channel)):
+        channels = [channels]
+    if isinstance(channels, dict):
+        channels = [
+            Channel(name, **spec) if isinstance(spec, dict) else Channel(name, spec)
+            for name, spec in channels.items()
+        ]
+
+    parsed = {}
+    for channel in channels:
+        if isinstance(channel, str):
+            channel = Channel(channel)
+        parsed[channel.key] = channel
+    if not parsed:
+        raise ValueError("At least one channel is required")
+    return parsed
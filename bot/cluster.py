@@ -0,0 +1,342 @@
+import asyncio
+import multiprocessing
+from multiprocessing.connection import Connection
+import threading
+import time
+import zlib
+
+from .cooldown import Cooldown, CooldownStore
+from .dispatch import COOLDOWN, UNKNOWN, Dispatcher
+from .irc import SHARED, IRCReader, parse_commands
+from .log import get_logger, setup_logging
+
+log = get_logger("bot")
+
+# (алиас -> группа, группа -> (кулдаун, передавать ли зрителя), "#канал" -> скоуп).
+# Всё, что нужно воркеру, чтобы проверить команду без самих действий
+CommandTable = tuple[
+    dict[str, int], dict[int, tuple[Cooldown | None, bool]], dict[str, str | None]
+]
+# (неизвестных команд, отказов по кулдауну,
+#  [(группа, канал, зритель или None, сколько раз)])
+Batch = tuple[int, int, list[list]]
+
+
+def user_of(raw_tags: str, source: str) -> str:
+    """
+    ``user-id`` из сырых тегов без разбора остальных, или ник, если его нет.
+    """
+    if raw_tags.startswith("user-id="):
+        start = 8
+    else:
+        start = raw_tags.find(";user-id=")
+        if start >= 0:
+            start += 9
+    if start >= 0:
+        end = raw_tags.find(";", start)
+        user = raw_tags[start:end] if end >= 0 else raw_tags[start:]
+        if user:
+            return user
+    return source.partition("!")[0]
+
+
+def shard_of(user: str, shards: int) -> int:
+    """
+    Номер воркера для зрителя. В отличие от hash(), одинаков во всех процессах.
+    """
+    return zlib.crc32(user.encode()) % shards
+
+
+class IngestWorker:
+    """
+    Воркер split-режима, живёт в своём процессе.
+
+    Получает от executor'а сырые строки PRIVMSG своих зрителей (``shard_of``),
+    разбирает их (``parse_commands``), проверяет кулдауны со скоупом зрителя
+    и складывает принятые команды в пачку. Одинаковая команда склеивается
+    в запись со счётчиком, только если она идёт сразу за такой же
+    командой в пачке или сразу за предыдущей командой того же зрителя,
+    поэтому команды каждого зрителя остаются в том порядке, в котором он
+    их написал. Раз в ``batch_interval`` пачка уходит executor'у.
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        prefix: str = "!",
+        batch_interval: float = 0.01,
+    ):
+        self.connection = connection
+        self.prefix = prefix
+        self.batch_interval = batch_interval
+        self.no_shared_chat_messages = True
+
+        self.aliases: dict[str, int] = {}
+        self.groups: dict[int, tuple[Cooldown | None, bool]] = {}
+        self.scopes: dict[str, str | None] = {}
+        self.cooldowns = CooldownStore()
+
+        # [группа, канал, зритель или None, сколько раз] в порядке прихода
+        self.__pending: list[list] = []
+        # Зритель -> индекс его последней команды в __pending
+        self.__last: dict[str, int] = {}
+        self.__unknown = 0
+        self.__cooldown = 0
+
+    def handle(self, data: str):
+        """
+        Разбирает пачку строк PRIVMSG, разделённых "\r\n".
+        """
+        _, unknown, commands, *_ = parse_commands(data, self.prefix, self.aliases)
+        self.__unknown += unknown
+        groups = self.groups
+        scopes = self.scopes
+        pending = self.__pending
+        last_of = self.__last
+        skip_shared = self.no_shared_chat_messages
+        for user, group, channel, flags in commands:
+            if skip_shared and flags & SHARED:
+                continue
+            cooldown, pass_user = groups[group]
+            if cooldown is not None:
+                scope = scopes.get(channel)
+                if cooldown.per_user(scope) and not self.cooldowns.try_acquire(
+                    cooldown.key(group, channel, user, scope), cooldown.seconds
+                ):
+                    self.__cooldown += 1
+                    continue
+            owner = user if pass_user else None
+            if pending:
+                item = pending[-1]
+                if item[0] == group and item[2] == owner and item[1] == channel:
+                    item[3] += 1
+                    last_of[user] = len(pending) - 1
+                    continue
+            last = last_of.get(user)
+            if last is not None:
+                item = pending[last]
+                if item[0] == group and item[2] == owner and item[1] == channel:
+                    item[3] += 1
+                    continue
+            last_of[user] = len(pending)
+            pending.append([group, channel, owner, 1])
+
+    def flush(self):
+        if not (self.__pending or self.__unknown or self.__cooldown):
+            return
+        batch: Batch = (self.__unknown, self.__cooldown, self.__pending)
+        self.__pending = []
+        self.__last = {}
+        self.__unknown = self.__cooldown = 0
+        self.connection.send(batch)
+
+    def run(self):
+        """
+        Работает, пока executor не закроет соединение.
+        """
+        connection = self.connection
+        self.set_table(connection.recv())
+        deadline = time.monotonic() + self.batch_interval
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or not connection.poll(timeout):
+                self.flush()
+                deadline = time.monotonic() + self.batch_interval
+                continue
+            message = connection.recv()
+            # Строки чата приходят строкой, новая таблица команд — кортежем
+            if type(message) is str:
+                self.handle(message)
+            else:
+                self.set_table(message)
+
+    def set_table(self, table: CommandTable):
+        self.aliases, self.groups, self.scopes = table
+
+
+def run_worker(
+    connection: Connection,
+    prefix: str,
+    batch_interval: float,
+    log_level: int | str,
+    log_sampling: dict[str, int] | None,
+):
+    """
+    Точка входа процесса-воркера.
+    """
+    setup_logging(log_level, sampling=log_sampling)
+    worker = IngestWorker(connection, prefix, batch_interval)
+    try:
+        worker.run()
+    except (EOFError, OSError, KeyboardInterrupt):
+        pass
+    finally:
+        connection.close()
+
+
+class ClusterExecutor:
+    """
+    Executor split-режима: читает чат одним ``IRCReader``, раздаёт строки
+    ``workers`` процессам ``IngestWorker`` и выполняет их пачки в event
+    loop'е бота.
+
+    Читатель не разбирает сообщения: он только находит зрителя в сырых
+    тегах и отправляет строку воркеру этого зрителя. Строки, пришедшие за
+    одну итерацию loop'а, уходят воркеру одним сообщением по ``Pipe``.
+    Пачки воркеров читаются отдельными потоками, а проверяются и
+    выполняются в loop'е бота: там проверяются канал, пауза, активное окно
+    и кулдауны, общие для всех зрителей. Каждая запись пачки выполняется
+    одним вызовом ``Dispatcher.handle_id`` со счётчиком. Подменяет собой чат
+    бота: ``start``, ``stop`` и ``messages`` такие же, как у ``IRCReader``.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        loop: asyncio.AbstractEventLoop,
+        channels: list[str],
+        prefix: str = "!",
+        url: str | None = None,
+        workers: int = 2,
+        batch_interval: float = 0.01,
+        log_level: int | str = "INFO",
+        log_sampling: dict[str, int] | None = None,
+    ):
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        self.dispatcher = dispatcher
+        self.loop = loop
+        self.prefix = prefix
+        self.workers = workers
+        self.batch_interval = batch_interval
+        self.log_level = log_level
+        self.log_sampling = log_sampling
+
+        self.reader = IRCReader(
+            dispatcher, loop, channels, prefix, url, route=self.__route
+        )
+        self.batches = 0
+        self.processes: list[multiprocessing.Process] = []
+        # Соединение с воркером под номером шарда
+        self.connections: list[Connection] = []
+
+        self.__lines: list[list[str]] = [[] for _ in range(workers)]
+        self.__flush_scheduled = False
+
+    @property
+    def channels(self) -> list[str]:
+        return self.reader.channels
+
+    @property
+    def messages(self) -> int:
+        return self.reader.messages
+
+    def table(self) -> CommandTable:
+        """
+        Таблица команд и скоупы каналов для воркеров.
+        """
+        dispatcher = self.dispatcher
+        groups = {
+            group: (record.cooldown, record.pass_user)
+            for group, record in dispatcher.groups.items()
+        }
+        scopes = {key: c.scope for key, c in dispatcher.channels.items()}
+        return dispatcher.aliases(), groups, scopes
+
+    def start(self):
+        if self.processes:
+            return
+        table = self.table()
+        for shard in range(self.workers):
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(
+                    child,
+                    self.prefix,
+                    self.batch_interval,
+                    self.log_level,
+                    self.log_sampling,
+                ),
+                name=f"twitchplays-ingest-{shard}",
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            connection.send(table)
+            self.processes.append(process)
+            self.connections.append(connection)
+            threading.Thread(
+                target=self.__receive, args=(connection,), daemon=True
+            ).start()
+        self.reader.start()
+
+    def stop(self):
+        if not self.processes:
+            return
+        self.reader.stop()
+        # Воркеры ничего не хранят, поэтому их можно просто остановить
+        processes, self.processes = self.processes, []
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(1)
+        for connection in self.connections:
+            connection.close()
+        self.connections.clear()
+        for lines in self.__lines:
+            lines.clear()
+
+    def publish(self):
+        """
+        Рассылает воркерам текущую таблицу команд. Нужно вызвать, если
+        команды или скоупы каналов поменялись после ``start()``.
+        """
+        table = self.table()
+        for connection in self.connections:
+            try:
+                connection.send(table)
+            except OSError as e:
+                log.warning("Не удалось отправить команды воркеру: %s", e)
+
+    def __route(self, line: str, raw_tags: str, source: str):
+        self.__lines[shard_of(user_of(raw_tags, source), self.workers)].append(line)
+        if not self.__flush_scheduled:
+            self.__flush_scheduled = True
+            self.loop.call_soon(self.__flush)
+
+    def __flush(self):
+        self.__flush_scheduled = False
+        connections = self.connections
+        for shard, lines in enumerate(self.__lines):
+            if not lines or shard >= len(connections):
+                continue
+            data = "\r\n".join(lines)
+            lines.clear()
+            try:
+                connections[shard].send(data)
+            except OSError as e:
+                log.warning("Не удалось отправить строки воркеру: %s", e)
+
+    def __receive(self, connection: Connection):
+        while True:
+            try:
+                batch = connection.recv()
+            except (EOFError, OSError):
+                if self.processes:
+                    log.warning("Воркер чата отключился")
+                return
+            self.loop.call_soon_threadsafe(self.__apply, batch)
+
+    def __apply(self, batch: Batch):
+        unknown, cooldown, items = batch
+        dispatcher = self.dispatcher
+        self.batches += 1
+        dispatcher.rejected[UNKNOWN] += unknown
+        dispatcher.rejected[COOLDOWN] += cooldown
+        dispatcher.cooldowns.hits += cooldown
+
+        received = time.perf_counter()
+        handle_id = dispatcher.handle_id
+        for group, channel, user, count in items:
+            handle_id(group, channel, user, received, False, count)
@@ -1,11 +1,24 @@
 import asyncio
 import time
 import math
-from collections import deque
+from collections import Counter
 
-from ahk import AsyncAHK
 from ahk.keys import KEYS, Key
 
+from .actions import MOVE, PRESS, VOTE, Action
+from .backends import AHKBackend, InputBackend, key_name
+from .curves import Curves, MouseCurve
+from .focus import FocusTracker
+from .log import get_logger
+from .pipeline import InputPipeline
+from .scheduler import ReleaseScheduler
+from .stats import Timings
+from .votes import VoteCounter
+
+log = get_logger("input")
+control_log = get_logger("control")
+votes_log = get_logger("votes")
+
 
 class Keys(KEYS):
     LMB = "left"
@@ -28,6 +41,21 @@ class Direction:
     RIGHT = "right"
     Right = RIGHT
 
+    @staticmethod
+    def delta(direction: str, amount: int) -> tuple[int, int]:
+        """
+        Сдвиг мыши (dx, dy) на ``amount`` пикселей в направлении ``direction``.
+        """
+        if direction == Direction.UP:
+            return 0, -amount
+        if direction == Direction.DOWN:
+            return 0, amount
+        if direction == Direction.LEFT:
+            return -amount, 0
+        if direction == Direction.RIGHT:
+            return amount, 0
+        raise ValueError(f"Unknown direction: {direction}")
+
 
 class Controller:
     def __init__(
@@ -35,77 +63,130 @@ class Controller:
         loop: asyncio.AbstractEventLoop,
         paused: asyncio.Event,
         mouse_speed: int = 10,
+        focus_staleness: int | float = 1.0,
+        mouse_tick_rate: int = 60,
+        mouse_curve: MouseCurve = Curves.LINEAR,
+        max_hold: int | float | None = None,
+        max_mouse_pending: int | float | None = None,
+        backend: InputBackend | None = None,
+        timings: Timings | None = None,
     ):
         self.loop = loop
         self.paused = paused
         self.mouse_speed = mouse_speed
-
-        self.ahk = AsyncAHK()
-
-        self.ahk.add_hotkey("+BACKSPACE", self.stop, lambda x, e: print(x, e))
-        self.ahk.add_hotkey("F12", self.toggle_pause, lambda x, e: print(x, e))
-
-        self.key_end_times: dict[str | Key, float] = {}
+        self.mouse_tick_rate = mouse_tick_rate
+        self.mouse_curve = mouse_curve
+        # Ограничения, чтобы флуд в чате не зажимал клавиши на минуты
+        # и не копил бесконечный сдвиг мыши
+        self.max_hold = max_hold
+        self.max_mouse_pending = max_mouse_pending
+        self.capped_holds = 0
+        self.capped_mouse = 0
+
+        self.backend = backend if backend is not None else AHKBackend()
+        self.focus = FocusTracker(self.loop, self.backend, focus_staleness)
+        self.output = InputPipeline(self.loop, self.backend, timings)
+
+        self.backend.add_hotkey("+BACKSPACE", self.stop, self.__on_hotkey_error)
+        self.backend.add_hotkey("F12", self.toggle_pause, self.__on_hotkey_error)
+
+        self.releases = ReleaseScheduler(self.loop, self.__release_key)
+        self.key_end_times: dict[str | Key, float] = self.releases.deadlines
         self.pressed: dict[str | Key, bool] = {}
 
         self.pending_x = 0.0
         self.pending_y = 0.0
+        self.__mouse_wakeup = asyncio.Event()
 
-        self.consensus_trackers: dict[str, deque] = {}
+        self.consensus_trackers: dict[str | Key, VoteCounter] = {}
+        self.vote_totals: Counter = Counter()
+        self.__mouse_task: asyncio.Task | None = None
 
     def start(self):
-        self.ahk.start_hotkeys()
-        self.loop.create_task(self.__mouse_movement_loop())
+        self.backend.start()
+        self.output.start()
+        self.__mouse_task = self.loop.create_task(self.__mouse_movement_loop())
+
+    async def shutdown(self):
+        """
+        Отпускает все зажатые клавиши, отправляет оставшийся ввод
+        и останавливает backend. Ввод, который ещё не ушёл, не теряется,
+        а незавершённый сдвиг мыши отбрасывается.
+        """
+        if self.__mouse_task is not None:
+            self.__mouse_task.cancel()
+            self.__mouse_task = None
+        self.pending_x = self.pending_y = 0.0
+        held = [key for key, pressed in self.pressed.items() if pressed]
+        self.releases.release_all()
+        # На случай клавиши, которая зажата без срока отпускания
+        for key in held:
+            if self.pressed.get(key):
+                self.__release_key(key)
+        await self.output.close()
+        self.focus.stop()
+        self.backend.stop()
+        if held:
+            control_log.info("Отпущены клавиши: %s", ", ".join(map(key_name, held)))
 
     def stop(self):
-        print("stop")
+        control_log.info("Остановка по горячей клавише")
         self.loop.stop()
 
     def toggle_pause(self):
         if self.paused.is_set():
             self.paused.clear()
-            print("unpaused")
+            control_log.info("Пауза снята")
         else:
             self.paused.set()
-            print("paused")
+            control_log.info("Пауза")
 
     async def move_mouse(self, x: int, y: int, speed: int):
-        await self.ahk.mouse_move(
-            x=x,
-            y=y,
-            speed=speed,
-            blocking=False,
-            relative=True,
-        )
+        await self.backend.mouse_move(x, y, speed)
 
     def press_key(self, key: str | Key, duration: int | float | None):
         if not duration:
-            self.loop.create_task(self.__click_key(key))
+            self.__click_key(key)
             return
 
         now = time.time()
 
         if key in self.key_end_times and self.key_end_times[key] > now:
-            self.key_end_times[key] += duration
-            print(
-                f"Продлеваем {key}. Осталось держать: {self.key_end_times[key] - now:.1f} сек."
-            )
+            end_time = self.key_end_times[key] + duration
+            if self.max_hold is not None and end_time - now > self.max_hold:
+                end_time = max(now + self.max_hold, self.key_end_times[key])
+                self.capped_holds += 1
+            self.releases.schedule(key, end_time)
+            log.debug("Продлеваем %s. Осталось держать: %.1f сек.", key, end_time - now)
         else:
-            self.key_end_times[key] = now + duration
-            print(f"Зажимаем {key} на {duration} сек.")
+            self.releases.schedule(key, now + duration)
+            log.debug("Зажимаем %s на %s сек.", key, duration)
 
-            self.loop.create_task(self.__key_release_loop(key))
+            self.output.key_down(key)
+            self.pressed[key] = True
 
     def add_mouse_movement(self, dx: int, dy: int):
         self.pending_x += dx
         self.pending_y += dy
 
+        limit = self.max_mouse_pending
+        if limit is not None and (
+            abs(self.pending_x) > limit or abs(self.pending_y) > limit
+        ):
+            self.pending_x = max(-limit, min(limit, self.pending_x))
+            self.pending_y = max(-limit, min(limit, self.pending_y))
+            self.capped_mouse += 1
+        self.__mouse_wakeup.set()
+
     def vote_for_key(
         self,
         key: str | Key,
         required_votes: int,
         time_window: int | float,
         duration: int | float | None,
+        user: str | None = None,
+        unique_users: bool = False,
+        votes: int = 1,
     ):
         """
         Добавляет голос за действие. Если голосов достаточно за указанное время — нажимает кнопку.
@@ -114,23 +195,27 @@ class Controller:
         :param required_votes: Сколько команд нужно для срабатывания (например, 10)
         :param time_window: За какое время (в секундах) (например, 5.0)
         :param duration: Сколько держать кнопку (None или 0 = просто клик)
+        :param user: Кто голосует (нужен для unique_users)
+        :param unique_users: Учитывать только один голос от зрителя за окно
+        :param votes: Сколько голосов сразу (пачка одинаковых команд)
         """
-        now = time.time()
-
-        if key not in self.consensus_trackers:
-            self.consensus_trackers[key] = deque()
-
-        tracker = self.consensus_trackers[key]
-
-        tracker.append(now)
+        tracker = self.consensus_trackers.get(key)
+        if tracker is None:
+            tracker = VoteCounter(
+                time_window, required_votes, unique_users=unique_users
+            )
+            self.consensus_trackers[key] = tracker
 
-        while tracker and tracker[0] < now - time_window:
-            tracker.popleft()
+        votes = tracker.add(user, votes=votes)
+        if not votes:
+            return False
+        self.vote_totals[key] += votes
 
-        print(f"Голоса за {key}: {len(tracker)} / {required_votes}")
+        votes = tracker.count()
+        votes_log.debug("Голоса за %s: %d / %d", key, votes, required_votes)
 
-        if len(tracker) >= required_votes:
-            print(f"Консенсус достигнут! Выполняем {key}.")
+        if votes >= required_votes:
+            votes_log.info("Консенсус достигнут! Выполняем %s.", key)
             tracker.clear()
 
             self.press_key(key, duration)
@@ -138,66 +223,116 @@ class Controller:
 
         return False
 
-    async def __click_key(self, key: str | Key):
-        # Чтобы не отпускать зажатую клавишу
-        if not self.pressed.get(key, False):
-            if key in Keys._MOUSE_BUTTONS:
-                await self.ahk.click(button=key)
-            else:
-                await self.ahk.key_press(key, release=True)
-
-    async def __key_release_loop(self, key: str | Key):
-        if key in Keys._MOUSE_BUTTONS:
-            await self.ahk.click(button=key, direction="D")
+    def execute(self, action: Action, user: str | None = None, count: int = 1):
+        """
+        Выполняет скомпилированное действие команды сразу, без корутин и задач.
+        ``count`` одинаковых команд дают то же, что ``count`` вызовов подряд:
+        зажатие продлевается ``count`` раз (не дольше ``max_hold``), сдвиг
+        мыши умножается, голоса складываются. Клик выполняется один раз.
+        """
+        kind = action.kind
+        if kind == PRESS:
+            self.press_key(action.key, action.duration)
+            if count > 1 and action.duration:
+                self.press_key(action.key, action.duration * (count - 1))
+        elif kind == MOVE:
+            self.add_mouse_movement(action.dx * count, action.dy * count)
+        elif kind == VOTE:
+            self.vote_for_key(
+                action.key,
+                action.required_votes,
+                action.time_window,
+                action.duration,
+                user,
+                action.one_vote_per_user,
+                count,
+            )
         else:
-            await self.ahk.key_down(key)
-        self.pressed[key] = True
+            raise ValueError(f"Controller can't execute {action!r}")
 
-        while True:
-            now = time.time()
-            remaining_time = self.key_end_times[key] - now
+    def sync_votes(self, actions):
+        """
+        Сбрасывает голоса за клавиши, которые больше не голосуются или
+        голосуются с другим окном, порогом или дедупликацией. Вызывается при
+        замене таблицы команд, иначе счётчик сохранил бы старые настройки.
+        """
+        votes = {action.key: action for action in actions if action.kind == VOTE}
+        for key, tracker in list(self.consensus_trackers.items()):
+            action = votes.get(key)
+            if (
+                action is None
+                or tracker.time_window != action.time_window
+                or tracker.required_votes != action.required_votes
+                or tracker.unique_users != action.one_vote_per_user
+            ):
+                del self.consensus_trackers[key]
+
+    def vote_tallies(self) -> dict[str | Key, tuple[int, int]]:
+        """
+        Текущие голоса для оверлеев: key -> (голосов, нужно голосов).
+        """
+        return {
+            key: (tracker.count(), tracker.required_votes)
+            for key, tracker in self.consensus_trackers.items()
+        }
 
-            if remaining_time <= 0:
-                break
+    def __on_hotkey_error(self, hotkey: str, error: Exception):
+        control_log.error("Ошибка горячей клавиши %s: %s", hotkey, error)
 
-            await asyncio.sleep(remaining_time)
-        print(f"Отпускаем {key}.")
-        if key in Keys._MOUSE_BUTTONS:
-            await self.ahk.click(button=key, direction="U")
-        else:
-            await self.ahk.key_up(key)
-        self.pressed[key] = False
+    def __click_key(self, key: str | Key):
+        # Чтобы не отпускать зажатую клавишу
+        if not self.pressed.get(key, False):
+            self.output.key_press(key)
 
-        if key in self.key_end_times:
-            del self.key_end_times[key]
+    def __release_key(self, key: str | Key):
+        log.debug("Отпускаем %s.", key)
+        self.output.key_up(key)
+        self.pressed[key] = False
 
     async def __mouse_movement_loop(self):
         """
         Фоновый цикл, который плавно поворачивает камеру.
+        Пока двигать нечего — спит на событии и не просыпается по таймеру.
         """
-        # tick_rate - задержка цикла. 0.016 ~ это 60 FPS
-        tick_rate = 0.016
+        interval = 1 / self.mouse_tick_rate
+        # mouse_speed задаётся в пикселях за тик при 60 FPS
+        speed = self.mouse_speed * 60 / self.mouse_tick_rate
+        # Дробные остатки, которые не влезли в целый пиксель
+        carry_x = 0.0
+        carry_y = 0.0
+        tick = 0
 
         while True:
-            if abs(self.pending_x) > 0 or abs(self.pending_y) > 0:
-
-                length = math.hypot(self.pending_x, self.pending_y)
-
-                if length <= self.mouse_speed:
-                    step_x = int(self.pending_x)
-                    step_y = int(self.pending_y)
-                    self.pending_x = 0.0
-                    self.pending_y = 0.0
-                else:
-                    ratio = self.mouse_speed / length
-                    step_x = int(self.pending_x * ratio)
-                    step_y = int(self.pending_y * ratio)
-
-                    self.pending_x -= step_x
-                    self.pending_y -= step_y
-
-                await self.ahk.mouse_move(
-                    x=step_x, y=step_y, speed=0, blocking=False, relative=True
-                )
-
-            await asyncio.sleep(tick_rate)
+            if not self.pending_x and not self.pending_y:
+                self.__mouse_wakeup.clear()
+                await self.__mouse_wakeup.wait()
+                carry_x = carry_y = 0.0
+                tick = 0
+                continue
+
+            length = math.hypot(self.pending_x, self.pending_y)
+            step = self.mouse_curve(length, speed, tick)
+
+            if length <= step:
+                move_x = self.pending_x
+                move_y = self.pending_y
+                self.pending_x = 0.0
+                self.pending_y = 0.0
+            else:
+                ratio = step / length
+                move_x = self.pending_x * ratio
+                move_y = self.pending_y * ratio
+                self.pending_x -= move_x
+                self.pending_y -= move_y
+
+            carry_x += move_x
+            carry_y += move_y
+            step_x = round(carry_x)
+            step_y = round(carry_y)
+            carry_x -= step_x
+            carry_y -= step_y
+
+            self.output.mouse_move(step_x, step_y)
+            tick += 1
+
+            await asyncio.sleep(interval)
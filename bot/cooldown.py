@@ -0,0 +1,146 @@
+import heapq
+import time
+from typing import Hashable
+
+
+class Scope:
+    USER_COMMAND = "user_command"
+    """Один зритель, одна команда, один канал (по умолчанию)."""
+    UserCommand = USER_COMMAND
+    USER = "user"
+    """Один зритель на все команды с этим скоупом в канале."""
+    User = USER
+    COMMAND = "command"
+    """Команда на весь канал, кто бы её ни написал."""
+    Command = COMMAND
+    CHANNEL = "channel"
+    """Все команды с этим скоупом в канале."""
+    Channel = CHANNEL
+    GLOBAL = "global"
+    """Команда во всех каналах."""
+    Global = GLOBAL
+
+
+class Cooldown:
+    """
+    Кулдаун команды. Можно передать в ``cooldown=`` любого метода регистрации
+    вместо числа секунд, чтобы выбрать скоуп.
+    """
+
+    __slots__ = ("seconds", "scope")
+
+    def __init__(self, seconds: int | float, scope: str = Scope.USER_COMMAND):
+        self.seconds = seconds
+        self.scope = scope
+
+    def __repr__(self):
+        return f"Cooldown({self.seconds!r}, scope={self.scope!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Cooldown):
+            return NotImplemented
+        return self.seconds == other.seconds and self.scope == other.scope
+
+    def __hash__(self):
+        return hash((self.seconds, self.scope))
+
+    def per_user(self, scope: str | None = None) -> bool:
+        """
+        Зависит ли кулдаун от зрителя. ``scope`` заменяет скоуп кулдауна.
+        """
+        return (scope or self.scope) in (Scope.USER_COMMAND, Scope.USER)
+
+    def key(
+        self, group: int, channel: str, user: str, scope: str | None = None
+    ) -> tuple:
+        """
+        Ключ в CooldownStore. ``scope`` заменяет скоуп кулдауна, если задан.
+        """
+        scope = scope or self.scope
+        if scope == Scope.USER_COMMAND:
+            return (scope, group, channel, user)
+        if scope == Scope.USER:
+            return (scope, None, channel, user)
+        if scope == Scope.COMMAND:
+            return (scope, group, channel, None)
+        if scope == Scope.CHANNEL:
+            return (scope, None, channel, None)
+        if scope == Scope.GLOBAL:
+            return (scope, group, None, None)
+        raise ValueError(f"Unknown cooldown scope: {scope}")
+
+
+class CooldownStore:
+    """
+    Общее хранилище кулдаунов всех команд.
+
+    Хранит только ещё не истёкшие записи: словарь key -> время окончания и
+    min-heap по времени окончания. Каждая проверка попутно выкидывает
+    не больше ``sweep_batch`` истёкших записей, так что память не растёт
+    со временем стрима, а стоимость очистки размазана по запросам.
+    """
+
+    def __init__(self, sweep_batch: int = 16):
+        self.sweep_batch = sweep_batch
+
+        self.__expiries: dict[Hashable, float] = {}
+        self.__heap: list[tuple[float, int, Hashable]] = []
+        self.__counter = 0
+
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.__expiries)
+
+    @property
+    def size(self) -> int:
+        return len(self.__expiries)
+
+    def try_acquire(
+        self, key: Hashable, seconds: int | float, now: float | None = None
+    ) -> bool:
+        """
+        Возвращает True и запускает кулдаун, если ключ свободен.
+        Иначе возвращает False.
+        """
+        if now is None:
+            now = time.monotonic()
+        self.sweep(now, self.sweep_batch)
+
+        expiry = self.__expiries.get(key)
+        if expiry is not None and expiry > now:
+            self.hits += 1
+            return False
+
+        expiry = now + seconds
+        self.__expiries[key] = expiry
+        self.__counter += 1
+        heapq.heappush(self.__heap, (expiry, self.__counter, key))
+        return True
+
+    def remaining(self, key: Hashable, now: float | None = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self.__expiries.get(key, now) - now)
+
+    def sweep(self, now: float | None = None, limit: int | None = None) -> int:
+        """
+        Удаляет истёкшие записи. Возвращает сколько удалено.
+        """
+        if now is None:
+            now = time.monotonic()
+        heap = self.__heap
+        expiries = self.__expiries
+        removed = 0
+        while heap and heap[0][0] <= now:
+            if limit is not None and removed >= limit:
+                break
+            expiry, _, key = heapq.heappop(heap)
+            if expiries.get(key) == expiry:
+                del expiries[key]
+            removed += 1
+        return removed
+
+    def clear(self):
+        self.__expiries.clear()
+        self.__heap.clear()
@@ -0,0 +1,48 @@
+from typing import Callable
+
+
+MouseCurve = Callable[[float, float, int], float]
+"""
+Кривая движения мыши: (оставшееся расстояние, базовая скорость за тик, номер тика) -> на сколько пикселей сдвинуть в этом тике.
+"""
+
+
+def linear(remaining: float, speed: float, tick: int) -> float:
+    """Постоянная скорость."""
+    return speed
+
+
+def ease_in(remaining: float, speed: float, tick: int, ramp_ticks: int = 10) -> float:
+    """Плавный разгон до базовой скорости за ``ramp_ticks`` тиков."""
+    return speed * min(1.0, (tick + 1) / ramp_ticks)
+
+
+def ease_out(
+    remaining: float,
+    speed: float,
+    tick: int,
+    factor: float = 0.15,
+    min_step: float = 1.0,
+) -> float:
+    """
+    Базовая скорость вдали от цели, а ближе ``speed / factor`` пикселей
+    шаг уменьшается вместе с оставшимся расстоянием, но не меньше
+    ``min_step``, чтобы мышь всё-таки доехала.
+    """
+    return min(speed, max(remaining * factor, min_step))
+
+
+def ease_in_out(remaining: float, speed: float, tick: int) -> float:
+    """Разгон в начале и торможение у цели."""
+    return ease_out(remaining, speed, tick) * min(1.0, (tick + 1) / 10)
+
+
+class Curves:
+    LINEAR = staticmethod(linear)
+    Linear = LINEAR
+    EASE_IN = staticmethod(ease_in)
+    EaseIn = EASE_IN
+    EASE_OUT = staticmethod(ease_out)
+    EaseOut = EASE_OUT
+    EASE_IN_OUT = staticmethod(ease_in_out)
+    EaseInOut = EASE_IN_OUT
@@ -0,0 +1,117 @@
+import asyncio
+from collections import Counter
+from typing import Callable, Hashable
+
+from .log import get_logger
+from .votes import VoteCounter
+
+log = get_logger("control")
+
+
+class Mode:
+    ANARCHY = "anarchy"
+    Anarchy = ANARCHY
+    DEMOCRACY = "democracy"
+    Democracy = DEMOCRACY
+
+
+class Democracy:
+    """
+    Режим демократии в духе Twitch Plays Pokémon.
+
+    Пока режим включен, команды не выполняются сразу, а копятся в счётчике.
+    Раз в ``window`` секунд побеждают ``winners`` самых популярных команд,
+    выполняются только они, и счётчик обнуляется. Так за окно выполняется
+    не больше ``winners`` действий, сколько бы сообщений ни пришло.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        window: int | float = 2.0,
+        winners: int = 1,
+        mode: str = Mode.ANARCHY,
+    ):
+        self.loop = loop
+        self.window = window
+        self.winners = winners
+
+        self.tally: Counter = Counter()
+        self.last_tally: Counter = Counter()
+        self.__actions: dict[Hashable, tuple[Callable, tuple]] = {}
+        self.__timer: asyncio.TimerHandle | None = None
+
+        self.mode_votes: dict[str, VoteCounter] = {}
+
+        self.mode = Mode.ANARCHY
+        if mode == Mode.DEMOCRACY:
+            self.set_mode(mode)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == Mode.DEMOCRACY
+
+    def set_mode(self, mode: str):
+        if mode not in (Mode.ANARCHY, Mode.DEMOCRACY):
+            raise ValueError(f"Unknown mode: {mode}")
+        if mode == self.mode:
+            return
+        self.mode = mode
+        log.info("Режим: %s", mode)
+
+        if mode == Mode.DEMOCRACY:
+            self.__timer = self.loop.call_later(self.window, self.__tick)
+        else:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            self.tally.clear()
+            self.__actions.clear()
+
+    def add(self, group: Hashable, action: Callable, *args, votes: int = 1):
+        """
+        Учитывает ``votes`` одинаковых команд в текущем окне.
+        Должен вызываться в self.loop.
+        """
+        if not self.enabled:
+            return
+        self.tally[group] += votes
+        if group not in self.__actions:
+            self.__actions[group] = (action, args)
+
+    def vote_for_mode(
+        self,
+        mode: str,
+        required_votes: int,
+        time_window: int | float,
+        user: Hashable | None = None,
+    ) -> bool:
+        """
+        Голос за переключение режима. Каждый зритель голосует один раз за окно.
+        """
+        counter = self.mode_votes.get(mode)
+        if counter is None:
+            counter = VoteCounter(time_window, required_votes, unique_users=True)
+            self.mode_votes[mode] = counter
+
+        if mode == self.mode or not counter.add(user):
+            return False
+        if counter.count() < required_votes:
+            return False
+
+        for counter in self.mode_votes.values():
+            counter.clear()
+        self.set_mode(mode)
+        return True
+
+    def __tick(self):
+        self.__timer = self.loop.call_later(self.window, self.__tick)
+
+        tally, actions = self.tally, self.__actions
+        self.tally = Counter()
+        self.__actions = {}
+        self.last_tally = tally
+
+        for group, _ in tally.most_common(self.winners):
+            action, args = actions[group]
+            action(*args)
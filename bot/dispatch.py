@@ -0,0 +1,406 @@
+import asyncio
+from collections import Counter
+import itertools
+import time
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+from .actions import MODE_VOTE, Action
+from .channels import Channel
+from .cooldown import Cooldown, CooldownStore
+from .democracy import Democracy
+from .focus import FocusTracker
+from .ingress import IngressQueue
+from .stats import CHECKS, DISPATCH, QUEUE, Timings
+
+if TYPE_CHECKING:
+    from .controller import Controller
+
+UNKNOWN = "unknown"
+DISABLED = "disabled"
+PAUSED = "paused"
+FOCUS = "focus"
+COOLDOWN = "cooldown"
+
+REJECT_REASONS = (UNKNOWN, DISABLED, PAUSED, FOCUS, COOLDOWN)
+
+
+class CommandRecord(NamedTuple):
+    action: Action | Callable[[], object]
+    cooldown: Cooldown | None = None
+    group: int = 0
+    pass_user: bool = False
+    democratic: bool = True
+
+
+class Dispatcher:
+    """
+    Таблица команд: нормализованный текст команды -> CommandRecord.
+
+    Все алиасы разворачиваются в отдельные ключи одного словаря при регистрации,
+    поэтому поиск команды — один lookup. Дешёвые проверки (пауза, активное окно)
+    делаются до того, как будет создан хоть один объект команды или корутина,
+    кулдауны проверяются в общем CooldownStore.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        paused: asyncio.Event,
+        focus: FocusTracker,
+        process: str,
+        democracy: Democracy,
+        queue_size: int = 1024,
+        timings: Timings | None = None,
+        threadsafe: bool = True,
+        channels: dict[str, Channel] | None = None,
+        controller: "Controller | None" = None,
+    ):
+        self.loop = loop
+        self.paused = paused
+        self.focus = focus
+        self.process = process
+        self.democracy = democracy
+        self.timings = timings
+        self.controller = controller
+
+        self.commands: dict[str, CommandRecord] = {}
+        # id команды (CommandRecord.group) -> запись; растёт при каждом
+        # изменении таблицы, чтобы копии таблицы знали, что устарели
+        self.groups: dict[int, CommandRecord] = {}
+        self.version = 0
+        self.cooldowns = CooldownStore()
+        # "#name" -> Channel, как канал приходит из IRC
+        self.channels: dict[str, Channel] = channels or {}
+        self.ingress = IngressQueue(
+            self.loop,
+            self.__run,
+            queue_size,
+            threadsafe,
+            weights={key: c.weight for key, c in self.channels.items()},
+        )
+        self.__groups = itertools.count()
+
+        # Счётчики для метрик: принятые команды и отказы по причинам
+        self.accepted = 0
+        self.rejected: dict[str, int] = dict.fromkeys(REJECT_REASONS, 0)
+        # id команды -> сколько раз выполнена, для дашборда GUI. Меняется
+        # только в self.loop, убранные команды отсюда удаляются
+        self.accepted_groups: Counter = Counter()
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __contains__(self, command: str):
+        return command.lower() in self.commands
+
+    def register(
+        self,
+        commands: list[str],
+        action: Action | Callable[[], object],
+        cooldown: Cooldown | None = None,
+        pass_user: bool = False,
+        democratic: bool = True,
+    ) -> list[str]:
+        """
+        Регистрирует одно действие под несколькими алиасами.
+        Алиасы делят между собой один кулдаун.
+        ``action`` — Action, который выполняет Controller, или функция.
+        Если pass_user включен, функция вызывается с id зрителя.
+        Команды с democratic=False выполняются сразу даже в режиме демократии.
+        Возвращает список уже занятых команд, которые не были зарегистрированы.
+        """
+        record = CommandRecord(
+            action, cooldown, next(self.__groups), pass_user, democratic
+        )
+        taken = []
+        for command in commands:
+            command = command.lower()
+            if command in self.commands:
+                taken.append(command)
+                continue
+            self.commands[command] = record
+            self.groups[record.group] = record
+        self.version += 1
+        return taken
+
+    def unregister(self, command: str) -> bool:
+        record = self.commands.pop(command.lower(), None)
+        if record is None:
+            return False
+        if record not in self.commands.values():
+            del self.groups[record.group]
+            self.accepted_groups.pop(record.group, None)
+        self.version += 1
+        return True
+
+    def replace(
+        self,
+        entries: list[
+            tuple[list[str], Action | Callable[[], object], Cooldown | None, bool, bool]
+        ],
+    ) -> tuple[int, int, int, list[str]]:
+        """
+        Заменяет всю таблицу команд разом. ``entries`` — аргументы ``register``
+        по порядку: (алиасы, действие, кулдаун, pass_user, democratic).
+
+        Новая таблица собирается отдельно и подставляется одним присваиванием,
+        так что сообщение видит либо старую таблицу, либо новую. Команда с тем же
+        действием, кулдауном и флагами сохраняет свой id, а с ним кулдауны и
+        голоса демократии, даже если поменялись её алиасы. Команды, которые уже
+        стоят в очереди, выполнятся в старом виде. Команда, все алиасы которой
+        уже заняты, в таблицу не попадает и не считается.
+
+        Возвращает (сохранено, добавлено, удалено, занятые алиасы).
+        """
+        old = {}
+        for record in self.groups.values():
+            key = (record.action, record.cooldown, record.pass_user, record.democratic)
+            old.setdefault(key, []).append(record)
+
+        commands: dict[str, CommandRecord] = {}
+        groups: dict[int, CommandRecord] = {}
+        taken = []
+        kept = added = 0
+        for aliases, action, cooldown, pass_user, democratic in entries:
+            free = []
+            for command in aliases:
+                command = command.lower()
+                if command in commands or command in free:
+                    taken.append(command)
+                else:
+                    free.append(command)
+            if not free:
+                # Все алиасы заняты: команды нет в таблице, id ей не нужен
+                continue
+            same = old.get((action, cooldown, pass_user, democratic))
+            if same:
+                record = same.pop(0)
+                kept += 1
+            else:
+                record = CommandRecord(
+                    action, cooldown, next(self.__groups), pass_user, democratic
+                )
+                added += 1
+            for command in free:
+                commands[command] = record
+            groups[record.group] = record
+
+        removed = len(self.groups) - kept
+        self.commands, self.groups = commands, groups
+        for group in dict(self.accepted_groups):
+            if group not in groups:
+                self.accepted_groups.pop(group, None)
+        self.version += 1
+        return kept, added, removed, taken
+
+    def aliases(self) -> dict[str, int]:
+        """
+        Алиас -> id команды, для разбора чата вне event loop'а.
+        """
+        return {command: record.group for command, record in self.commands.items()}
+
+    def match(
+        self, command: str | None, channel: str, user: str
+    ) -> CommandRecord | None:
+        """
+        Возвращает запись команды, если её можно выполнить прямо сейчас.
+        """
+        if command is None:
+            return None
+        record = self.commands.get(command.lower())
+        if record is None:
+            self.rejected[UNKNOWN] += 1
+            return None
+        return record if self.check(record, channel, user) else None
+
+    def check(
+        self,
+        record: CommandRecord,
+        channel: str,
+        user: str | None,
+        per_user: bool = True,
+        count: int = 1,
+    ) -> int:
+        """
+        Проверяет канал, паузу, активное окно и кулдаун уже найденной команды.
+        С ``per_user=False`` кулдауны со скоупом зрителя не проверяются:
+        их уже проверили воркеры ``bot.cluster``.
+
+        ``count`` — сколько одинаковых команд проверяется разом. Возвращает,
+        сколько из них принято: из пачки под кулдауном проходит одна.
+        """
+        config = self.channels.get(channel)
+        if config is not None and not config.enabled:
+            self.rejected[DISABLED] += count
+            return 0
+        if self.paused.is_set():
+            self.rejected[PAUSED] += count
+            return 0
+        if self.process != "*" and not self.focus.is_active(self.process):
+            self.rejected[FOCUS] += count
+            return 0
+        cooldown = record.cooldown
+        if cooldown is not None:
+            scope = config.scope if config is not None else None
+            if per_user or not cooldown.per_user(scope):
+                if not self.cooldowns.try_acquire(
+                    cooldown.key(record.group, channel, user, scope),
+                    cooldown.seconds,
+                ):
+                    self.rejected[COOLDOWN] += count
+                    return 0
+                if count > 1 and cooldown.seconds > 0:
+                    # Остальные команды пачки попадают в кулдаун первой
+                    self.rejected[COOLDOWN] += count - 1
+                    self.cooldowns.hits += count - 1
+                    count = 1
+        self.accepted += count
+        return count
+
+    def handle(
+        self,
+        command: str | None,
+        channel: str,
+        user: str,
+        received: float | None = None,
+    ) -> bool:
+        """
+        Проверяет команду из чата и ставит её в очередь.
+        ``received`` — время прихода сообщения (time.perf_counter()).
+        """
+        record = self.match(command, channel, user)
+        if record is None:
+            return False
+        self.__accept(record, user, received, channel)
+        return True
+
+    def handle_id(
+        self,
+        group: int,
+        channel: str,
+        user: str | None,
+        received: float | None = None,
+        per_user: bool = True,
+        count: int = 1,
+    ) -> bool:
+        """
+        Как ``handle``, но команда уже найдена по алиасу вне event loop'а
+        и передаётся id (``CommandRecord.group``). ``count`` одинаковых
+        команд проверяются и ставятся в очередь одной записью.
+        """
+        record = self.groups.get(group)
+        if record is None:
+            # Команду убрали, пока она шла
+            self.rejected[UNKNOWN] += count
+            return False
+        count = self.check(record, channel, user, per_user, count)
+        if not count:
+            return False
+        self.__accept(record, user, received, channel, count)
+        return True
+
+    def __accept(
+        self,
+        record: CommandRecord,
+        user: str | None,
+        received: float | None,
+        channel: str,
+        count: int = 1,
+    ):
+        if self.timings is not None and received is not None:
+            self.timings.record(CHECKS, time.perf_counter() - received)
+        self.execute(record, user, received, channel, count)
+
+    def execute(
+        self,
+        record: CommandRecord,
+        user: str,
+        received: float | None = None,
+        channel: str | None = None,
+        count: int = 1,
+    ):
+        # Контроллер живёт в self.loop, а чат может вызывать нас из своего потока,
+        # поэтому команда уходит в очередь, которую разбирает self.loop
+        self.ingress.push(
+            record,
+            user,
+            mergeable=not record.pass_user and not self.democracy.enabled,
+            received=received,
+            source=channel,
+            count=count,
+        )
+
+    def configure_channel(
+        self,
+        name: str,
+        weight: int | float | None = None,
+        scope: str | None = None,
+        enabled: bool | None = None,
+    ) -> Channel:
+        """
+        Меняет настройки канала на лету. Неизвестный канал добавляется,
+        но чтобы читать из него, в него ещё нужно зайти.
+        """
+        channel = Channel(name)
+        channel = self.channels.setdefault(channel.key, channel)
+        if weight is not None:
+            if weight <= 0:
+                raise ValueError("Channel weight must be positive")
+            channel.weight = weight
+            self.ingress.weights[channel.key] = weight
+        if scope is not None:
+            channel.scope = scope
+        if enabled is not None:
+            channel.enabled = enabled
+        return channel
+
+    def __run(
+        self, record: CommandRecord, user: str, received: float | None, count: int
+    ):
+        # Счётчик меняется только здесь, в self.loop, поэтому replace может
+        # чистить его без гонки с потоком чата
+        self.accepted_groups[record.group] += count
+        timings = self.timings
+        if timings is None or received is None:
+            self.__call(record, user, count)
+            return
+
+        start = time.perf_counter()
+        timings.record(QUEUE, start - received)
+        timings.origin = received
+        try:
+            self.__call(record, user, count)
+        finally:
+            timings.origin = None
+            timings.record(DISPATCH, time.perf_counter() - start)
+
+    def run(self, action: Action, user: str | None = None, count: int = 1):
+        """
+        Выполняет Action: голос за режим — в Democracy, остальное — в Controller.
+        """
+        if action.kind == MODE_VOTE:
+            self.democracy.vote_for_mode(
+                action.mode, action.required_votes, action.time_window, user
+            )
+        else:
+            self.controller.execute(action, user, count)
+
+    def __call(self, record: CommandRecord, user: str, count: int = 1):
+        # count — сколько одинаковых команд склеено в одну запись очереди
+        action = record.action
+        if record.democratic and self.democracy.enabled:
+            if type(action) is Action:
+                self.democracy.add(record.group, self.run, action, user, votes=count)
+            elif record.pass_user:
+                self.democracy.add(record.group, action, user, votes=count)
+            else:
+                self.democracy.add(record.group, action, votes=count)
+        elif type(action) is Action:
+            self.run(action, user, count)
+        else:
+            # Функция может делать что угодно, поэтому вызывается count раз
+            for _ in range(count):
+                if record.pass_user:
+                    action(user)
+                else:
+                    action()
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from .backends import InputBackend
+
+
+class FocusTracker:
+    """
+    Кэширует имя процесса активного окна, чтобы не ходить в backend на каждую команду.
+
+    Кэш обновляется фоновым опросом раз в ``poll_interval`` секунд (или сразу
+    после ``refresh``). Если значение старше ``max_staleness`` секунд, оно
+    считается неизвестным и ``is_active`` возвращает False.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        backend: InputBackend,
+        max_staleness: int | float = 1.0,
+        poll_interval: int | float | None = None,
+    ):
+        self.loop = loop
+        self.backend = backend
+        self.max_staleness = max_staleness
+        if poll_interval is None:
+            poll_interval = min(0.25, max_staleness / 2)
+        self.poll_interval = poll_interval
+
+        self.process_name: str | None = None
+        self.updated_at = 0.0
+
+        self.__wakeup = asyncio.Event()
+        self.__task: asyncio.Task | None = None
+
+    def start(self):
+        if self.__task is None:
+            self.__task = self.loop.create_task(self.__poll_loop())
+
+    def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+    def refresh(self):
+        """
+        Просит обновить кэш вне очереди (например, при смене фокуса).
+        Можно вызывать из любого потока.
+        """
+        self.loop.call_soon_threadsafe(self.__wakeup.set)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.updated_at
+
+    def is_active(self, process_name: str) -> bool:
+        if self.age > self.max_staleness:
+            return False
+        return self.process_name == process_name
+
+    async def update(self):
+        self.process_name = await self.backend.get_active_process()
+        self.updated_at = time.monotonic()
+
+    async def __poll_loop(self):
+        while True:
+            try:
+                await self.update()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Оставляем старое значение, оно само протухнет через max_staleness
+                pass
+
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.__wakeup.clear()
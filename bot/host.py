@@ -0,0 +1,275 @@
+import asyncio
+from collections import deque
+import heapq
+from operator import itemgetter
+import threading
+import time
+from typing import Callable
+
+from .backends import key_name
+from .bot import Bot
+from .log import get_logger
+from .profile import Profile, load_profile
+from .stats import TOTAL, SampleRing
+
+log = get_logger("bot")
+
+PAUSE = "pause"
+RESUME = "resume"
+RELOAD = "reload"
+STOP = "stop"
+
+
+class BotHost:
+    """
+    Бот в своём потоке со своим event loop'ом, которым управляют из другого
+    потока (например, из GUI).
+
+    ``factory`` создаёт бота уже в потоке хоста и получает его loop, так что
+    Bot, Controller и AHK живут в одном потоке. Команды управления
+    (``pause``, ``resume``, ``reload``, ``stop``) кладутся в очередь и
+    выполняются в loop'е бота, вызывающий поток их не ждёт. Раз в
+    ``stats_interval`` секунд loop собирает снимок статистики (``stats``),
+    который можно читать из любого потока с любой частотой: чтение — это
+    просто взять последний готовый словарь. Последние ``history`` снимков
+    лежат в ``history`` (``SampleRing``) для графиков.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[asyncio.AbstractEventLoop], Bot],
+        stats_interval: float = 0.5,
+        history: int = 120,
+        max_commands: int = 16,
+    ):
+        self.factory = factory
+        self.stats_interval = stats_interval
+        # Сколько самых частых команд попадает в снимок, чтобы его размер
+        # не зависел от размера таблицы команд
+        self.max_commands = max_commands
+        self.history = SampleRing(history)
+
+        self.bot: Bot | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.error: BaseException | None = None
+
+        self.__thread: threading.Thread | None = None
+        # deque.append и popleft атомарны, поэтому очереди не нужен лок
+        self.__controls: deque[tuple[str, object]] = deque()
+        self.__stats: dict = {}
+        self.__timer: asyncio.TimerHandle | None = None
+        self.__last: tuple[float, int, int] | None = None
+        self.__last_groups: dict[int, int] = {}
+        self.__last_latency: tuple[int, list[int]] | None = None
+        self.__names: dict[int, str] = {}
+        self.__names_version = -1
+
+    @classmethod
+    def from_profile(
+        cls,
+        path: str,
+        stats_interval: float = 0.5,
+        history: int = 120,
+        **kwargs,
+    ) -> "BotHost":
+        """
+        Хост для ``Bot.from_profile(path, **kwargs)``.
+        """
+        return cls(
+            lambda loop: Bot.from_profile(path, loop=loop, **kwargs),
+            stats_interval,
+            history,
+        )
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        if self.__thread is not None:
+            return
+        self.__thread = threading.Thread(
+            target=self.__run, name="twitchplays-bot", daemon=True
+        )
+        self.__thread.start()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """
+        Ждёт остановки бота. Возвращает False, если не дождались.
+        """
+        if self.__thread is None:
+            return True
+        self.__thread.join(timeout)
+        return not self.__thread.is_alive()
+
+    def pause(self):
+        self.send(PAUSE)
+
+    def resume(self):
+        self.send(RESUME)
+
+    def reload(self, profile: Profile | str):
+        """
+        Перезагружает команды (``Bot.reload_profile``). Профиль загружается
+        и проверяется в вызывающем потоке, так что ``ProfileError`` вылетит
+        здесь, а не в потоке бота.
+        """
+        if isinstance(profile, str):
+            profile = load_profile(profile)
+        self.send(RELOAD, profile)
+
+    def stop(self):
+        """
+        Просит бота остановиться: отпустить клавиши и отключиться от чата.
+        Не ждёт остановки, для этого есть ``join``.
+        """
+        self.send(STOP)
+
+    def send(self, command: str, argument: object = None):
+        self.__controls.append((command, argument))
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self.__drain)
+            except RuntimeError:
+                # loop уже закрыт, бот остановлен
+                pass
+
+    def stats(self) -> dict:
+        """
+        Последний снимок: сообщений и команд в секунду, частота самых
+        частых команд, зажатые клавиши с оставшимся временем, голоса за
+        клавиши, накопленный сдвиг мыши, задержка команды, пауза и режим.
+        Пустой, пока бот не запустился.
+        """
+        return self.__stats
+
+    def __run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self.bot = self.factory(loop)
+        except Exception as e:
+            log.exception("Не удалось создать бота")
+            self.error = e
+            loop.close()
+            return
+
+        self.loop = loop
+        try:
+            loop.run_until_complete(self.bot.start())
+            self.__tick()
+            # Команды, присланные до запуска loop'а
+            self.__drain()
+            loop.run_forever()
+        except Exception as e:
+            log.exception("Бот остановлен из-за ошибки")
+            self.error = e
+        finally:
+            if self.__timer is not None:
+                self.__timer.cancel()
+            try:
+                loop.run_until_complete(self.bot.shutdown())
+                loop.run_until_complete(self.__cancel_tasks())
+            finally:
+                self.loop = None
+                loop.close()
+
+    async def __cancel_tasks(self):
+        tasks = [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __drain(self):
+        bot = self.bot
+        controls = self.__controls
+        while controls:
+            command, argument = controls.popleft()
+            if command == PAUSE:
+                bot.paused.set()
+            elif command == RESUME:
+                bot.paused.clear()
+            elif command == RELOAD:
+                bot.reload_profile(argument)
+            elif command == STOP:
+                controls.clear()
+                self.loop.stop()
+            else:
+                log.warning("Неизвестная команда хосту: %s", command)
+
+    def __tick(self):
+        self.__timer = self.loop.call_later(self.stats_interval, self.__tick)
+        bot = self.bot
+        dispatcher = bot.dispatcher
+        controller = bot.controller
+        now = time.perf_counter()
+        messages = bot.chat.messages
+        accepted = dispatcher.accepted
+        if self.__last is None:
+            elapsed, last_messages, last_accepted = 0.0, messages, accepted
+        else:
+            last_at, last_messages, last_accepted = self.__last
+            elapsed = now - last_at
+        self.__last = (now, messages, accepted)
+
+        groups = dict(dispatcher.accepted_groups)
+        last_groups, self.__last_groups = self.__last_groups, groups
+        rates = {}
+        if elapsed:
+            names = self.__command_names()
+            for group, count in groups.items():
+                delta = count - last_groups.get(group, 0)
+                if delta and group in names:
+                    rates[names[group]] = delta / elapsed
+            if len(rates) > self.max_commands:
+                rates = dict(
+                    heapq.nlargest(self.max_commands, rates.items(), key=itemgetter(1))
+                )
+        wall = time.time()
+
+        # Задержка за последний интервал, а не за всё время работы бота
+        histogram = bot.timings.stages[TOTAL]
+        p50, p99 = histogram.percentiles_since(self.__last_latency, 50, 99)
+        self.__last_latency = histogram.snapshot()
+        # Новый словарь целиком, чтобы читатель не увидел его наполовину
+        self.__stats = {
+            "time": wall,
+            "messages": messages,
+            "messages_per_second": (
+                (messages - last_messages) / elapsed if elapsed else 0.0
+            ),
+            "commands": accepted,
+            "commands_per_second": (
+                (accepted - last_accepted) / elapsed if elapsed else 0.0
+            ),
+            "command_rates": rates,
+            "held_keys": {
+                key_name(key): max(0.0, end - wall)
+                for key, end in controller.key_end_times.items()
+            },
+            "votes": {
+                key_name(key): tally
+                for key, tally in controller.vote_tallies().items()
+                if tally[0]
+            },
+            "mouse": (controller.pending_x, controller.pending_y),
+            "latency_p50_ms": round(p50 * 1000, 3),
+            "latency_p99_ms": round(p99 * 1000, 3),
+            "paused": bot.paused.is_set(),
+            "mode": bot.democracy.mode,
+        }
+        self.history.append(self.__stats)
+
+    def __command_names(self) -> dict[int, str]:
+        # id команды -> первый алиас, пересчитывается только при смене таблицы
+        dispatcher = self.bot.dispatcher
+        if self.__names_version != dispatcher.version:
+            names = {}
+            for command, record in dispatcher.commands.items():
+                names.setdefault(record.group, command)
+            self.__names = names
+            self.__names_version = dispatcher.version
+        return self.__names
@@ -0,0 +1,161 @@
+import asyncio
+from collections import deque
+from typing import Callable, Hashable
+
+from .log import get_logger
+
+log = get_logger("bot")
+
+
+class IngressQueue:
+    """
+    Ограниченная очередь принятых команд между чатом и Controller.
+
+    Чат кладёт команды из своего потока, event loop бота разбирает их пачкой за
+    один вызов. Если очередь переполнена, выкидываются самые старые команды.
+    Одинаковые команды подряд (``mergeable``) склеиваются в одну запись со
+    счётчиком, поэтому флуд одной и той же командой не забивает очередь.
+    Handler получает команду один раз вместе с числом склеенных команд.
+
+    У каждого канала (``source``) своя очередь на ``maxsize`` команд, а
+    разбираются они по кругу с весами из ``weights`` (deficit round-robin):
+    за один вызов канал с весом 2 выполняет вдвое больше команд, чем канал
+    с весом 1, а огромный канал переполняет только свою очередь.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        handler: Callable[[Hashable, object, float | None, int], None],
+        maxsize: int = 1024,
+        threadsafe: bool = True,
+        batch: int = 256,
+        weights: dict[Hashable, int | float] | None = None,
+    ):
+        self.loop = loop
+        self.handler = handler
+        self.maxsize = maxsize
+        self.batch = batch
+        self.weights = weights if weights is not None else {}
+        # Если push вызывается только из self.loop, будить loop через
+        # call_soon_threadsafe не нужно
+        self.__schedule = loop.call_soon_threadsafe if threadsafe else loop.call_soon
+
+        # Записи очереди: [команда, аргумент, время прихода, сколько команд]
+        self.__queues: dict[Hashable, deque[list]] = {}
+        self.__deficits: dict[Hashable, float] = {}
+        self.__scheduled = False
+
+        self.received = 0
+        self.dropped = 0
+        self.merged = 0
+        self.processed = 0
+        self.processed_by: dict[Hashable, int] = {}
+        self.dropped_by: dict[Hashable, int] = {}
+
+    def __len__(self):
+        return sum(len(queue) for queue in list(self.__queues.values()))
+
+    def push(
+        self,
+        item: Hashable,
+        arg: object = None,
+        mergeable: bool = False,
+        received: float | None = None,
+        source: Hashable = None,
+        count: int = 1,
+    ):
+        """
+        Кладёт команду в очередь канала ``source``. Можно вызывать из любого
+        потока, если очередь создана с ``threadsafe=True``.
+        ``received`` — время прихода команды (time.perf_counter()), оно
+        передаётся в handler вместе с командой. ``count`` — сколько
+        одинаковых команд несёт запись.
+        """
+        queue = self.__queues.get(source)
+        if queue is None:
+            queue = self.__queues.setdefault(source, deque(maxlen=self.maxsize))
+        self.received += count
+
+        if mergeable and queue:
+            try:
+                last = queue[-1]
+            except IndexError:
+                last = None
+            if last is not None and last[0] is item:
+                # Запись — список, поэтому счётчик меняется на месте. Если
+                # loop как раз её забрал, теряется только этот повтор
+                last[3] += count
+                self.merged += count
+                return
+
+        if len(queue) >= self.maxsize:
+            dropped = queue[0][3]
+            self.dropped += dropped
+            self.dropped_by[source] = self.dropped_by.get(source, 0) + dropped
+        queue.append([item, arg, received, count])
+
+        if not self.__scheduled:
+            self.__scheduled = True
+            self.__schedule(self.__drain)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": len(self),
+            "received": self.received,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "processed": self.processed,
+        }
+
+    def __drain(self):
+        self.__scheduled = False
+        queues = list(self.__queues.items())
+        if len(queues) == 1:
+            source, queue = queues[0]
+            self.__run(source, queue, min(len(queue), self.batch))
+        else:
+            self.__drain_fair(queues)
+
+        # Не успели всё — доразберём на следующей итерации event loop'а,
+        # чтобы не держать loop дольше одной пачки
+        if not self.__scheduled and any(queue for _, queue in queues):
+            self.__scheduled = True
+            self.loop.call_soon(self.__drain)
+
+    def __drain_fair(self, queues: list[tuple[Hashable, deque]]):
+        budget = self.batch
+        deficits = self.__deficits
+        weights = self.weights
+        while budget > 0:
+            active = False
+            for source, queue in queues:
+                if not queue:
+                    deficits[source] = 0
+                    continue
+                active = True
+                deficit = deficits.get(source, 0) + weights.get(source, 1)
+                count = min(int(deficit), len(queue), budget)
+                self.__run(source, queue, count)
+                budget -= count
+                deficits[source] = deficit - count if queue else 0
+                if budget <= 0:
+                    break
+            if not active:
+                break
+
+    def __run(self, source: Hashable, queue: deque, count: int):
+        handler = self.handler
+        done = 0
+        for _ in range(count):
+            try:
+                item, arg, received, commands = queue.popleft()
+            except IndexError:
+                break
+            done += commands
+            try:
+                handler(item, arg, received, commands)
+            except Exception:
+                log.exception("Ошибка при выполнении команды")
+        self.processed += done
+        self.processed_by[source] = self.processed_by.get(source, 0) + done
@@ -0,0 +1,442 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import time
+from typing import Callable
+
+import aiohttp
+
+from .dispatch import UNKNOWN, Dispatcher
+from .log import get_logger
+from .stats import CHAT
+
+log = get_logger("bot")
+chat_log = get_logger("chat")
+
+TWITCH_CHAT_URL = "wss://irc-ws.chat.twitch.tv:443"
+ANONYMOUS_NICK = "justinfan1337"
+
+SHARED = 1
+"""Флаг команды: сообщение пришло из совместного чата другого канала."""
+
+# (сообщений, неизвестных команд, [(зритель, id команды, канал, флаги)],
+#  строки IRC кроме PRIVMSG, tmi-sent-ts сообщений в мс, [(ник, текст)])
+ParsedBatch = tuple[
+    int,
+    int,
+    list[tuple[str, int, str, int]],
+    list[str],
+    list[int],
+    list[tuple[str, str]],
+]
+
+_SENT_TAG = "tmi-sent-ts="
+
+
+def parse_tags(raw: str) -> dict[str, str]:
+    tags = {}
+    for tag in raw.split(";"):
+        name, _, value = tag.partition("=")
+        tags[name] = value
+    return tags
+
+
+def parse_line(line: str) -> tuple[str, str, str, str]:
+    """
+    Разбирает строку IRC на (теги, источник, команда, параметры).
+    Теги не разбираются, это делает ``parse_tags`` только там, где они нужны.
+    """
+    tags = source = ""
+    if line.startswith("@"):
+        tags, _, line = line[1:].partition(" ")
+    if line.startswith(":"):
+        source, _, line = line[1:].partition(" ")
+    command, _, params = line.partition(" ")
+    return tags, source, command, params
+
+
+def parse_commands(
+    data: str, prefix: str, aliases: dict[str, int], chat: bool = False
+) -> ParsedBatch:
+    """
+    Разбирает пачку строк IRC в процессе из пула ``IRCReader``.
+
+    Возвращает только то, что нужно event loop'у бота: команды в виде
+    (зритель, id команды, канал, флаги), строки, которые не PRIVMSG, и
+    tmi-sent-ts сообщений для стадии CHAT. Теги целиком разбираются только
+    у сообщений с известной командой, а при ``chat`` — у всех, чтобы вернуть
+    (ник, текст) для лога чата.
+    """
+    messages = unknown = 0
+    commands = []
+    control = []
+    sent = []
+    lines = []
+    for line in data.split("\r\n"):
+        if not line:
+            continue
+        raw_tags, source, command, params = parse_line(line)
+        if command != "PRIVMSG":
+            control.append(line)
+            continue
+        messages += 1
+        channel, _, text = params.partition(" :")
+        start = raw_tags.find(_SENT_TAG)
+        if start != -1:
+            start += len(_SENT_TAG)
+            end = raw_tags.find(";", start)
+            value = raw_tags[start:] if end == -1 else raw_tags[start:end]
+            if value.isdigit():
+                sent.append(int(value))
+        if chat:
+            tags = parse_tags(raw_tags) if raw_tags else {}
+            lines.append((tags.get("display-name") or source.partition("!")[0], text))
+        if not text.startswith(prefix):
+            continue
+        group = aliases.get(text[len(prefix) :].strip().partition(" ")[0].lower())
+        if group is None:
+            unknown += 1
+            continue
+        tags = parse_tags(raw_tags) if raw_tags else {}
+        flags = 0
+        if tags.get("source-room-id") and tags["source-room-id"] != tags.get("room-id"):
+            flags |= SHARED
+        user = tags.get("user-id") or source.partition("!")[0]
+        commands.append((user, group, channel, flags))
+    return messages, unknown, commands, control, sent, lines
+
+
+# Таблица алиасов процесса из пула IRCReader и версия Dispatcher'а, из которой
+# она взята. Ставится один раз при запуске процесса и заново только после
+# смены таблицы команд, а не передаётся с каждой пачкой
+_aliases: dict[str, int] = {}
+_version = -1
+
+
+def install_aliases(version: int, aliases: dict[str, int]):
+    """
+    Ставит таблицу алиасов в процессе пула (``initializer`` пула).
+    """
+    global _aliases, _version
+    _aliases, _version = aliases, version
+
+
+def parse_pooled(
+    data: str,
+    prefix: str,
+    version: int,
+    aliases: dict[str, int] | None = None,
+    chat: bool = False,
+) -> ParsedBatch | None:
+    """
+    ``parse_commands`` по таблице процесса. Возвращает None, если таблица
+    процесса старше ``version``: тогда пачку надо прислать ещё раз вместе
+    с ``aliases``.
+    """
+    if aliases is not None:
+        install_aliases(version, aliases)
+    elif version != _version:
+        return None
+    return parse_commands(data, prefix, _aliases, chat)
+
+
+class IRCReader:
+    """
+    Минимальный клиент чата Twitch, который работает прямо в event loop'е бота.
+
+    В отличие от twitchAPI.Chat, не заводит свой поток и свой loop: сообщения
+    читаются, разбираются и проверяются там же, где работает Controller,
+    поэтому команда не прыгает между потоками. Умеет только то, что нужно боту:
+    анонимный вход, JOIN, PING/PONG, RECONNECT и PRIVMSG.
+
+    С ``parse_workers`` строки разбираются не в loop'е, а пачками в пуле из
+    стольких процессов (``parse_pooled``). Пока все процессы заняты,
+    новые строки копятся и уходят следующей пачкой, а результаты
+    применяются строго в порядке прихода строк. Таблица алиасов ставится
+    в процесс пула при его запуске и пересылается только после смены
+    ``Dispatcher.version``.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        loop: asyncio.AbstractEventLoop,
+        channels: list[str],
+        prefix: str = "!",
+        url: str | None = None,
+        reconnect_delays: tuple[int | float, ...] = (1, 2, 4, 8, 16, 32),
+        route: Callable[[str, str, str], None] | None = None,
+        parse_workers: int = 0,
+    ):
+        self.dispatcher = dispatcher
+        self.loop = loop
+        self.channels = [channel.lower().lstrip("#") for channel in channels]
+        self.prefix = prefix
+        self.url = url or TWITCH_CHAT_URL
+        self.reconnect_delays = reconnect_delays
+        # Если задан, строки PRIVMSG не разбираются, а целиком отдаются ему
+        # вместе с сырыми тегами и источником: так bot.cluster раздаёт
+        # их воркерам
+        self.route = route
+        self.parse_workers = parse_workers
+        self.no_shared_chat_messages = True
+
+        self.messages = 0
+        self.ready = False
+        self.__task: asyncio.Task | None = None
+
+        self.__pool: ProcessPoolExecutor | None = None
+        self.__aliases: dict[str, int] = {}
+        self.__version = -1
+        self.__buffered: list[str] = []
+        self.__buffered_at = 0.0
+        self.__running = 0
+        self.__parsed: asyncio.Queue | None = None
+
+    def start(self):
+        if self.__task is None:
+            if self.parse_workers and self.__pool is None:
+                self.__update_aliases()
+                self.__pool = ProcessPoolExecutor(
+                    self.parse_workers,
+                    initializer=install_aliases,
+                    initargs=(self.__version, self.__aliases),
+                )
+            self.__task = self.loop.create_task(self.__run())
+
+    def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=False, cancel_futures=True)
+            self.__pool = None
+        self.ready = False
+
+    async def __run(self):
+        attempt = 0
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    async with session.ws_connect(self.url) as ws:
+                        attempt = 0
+                        await self.__login(ws)
+                        if self.__pool is not None:
+                            await self.__read_pooled(ws)
+                        else:
+                            await self.__read(ws)
+                except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                    log.warning("Ошибка соединения с чатом: %s", e)
+                self.ready = False
+
+                delay = self.reconnect_delays[
+                    min(attempt, len(self.reconnect_delays) - 1)
+                ]
+                attempt += 1
+                log.warning("Переподключение к чату через %s сек.", delay)
+                await asyncio.sleep(delay)
+
+    async def __login(self, ws: aiohttp.ClientWebSocketResponse):
+        await ws.send_str(
+            "CAP REQ :twitch.tv/membership twitch.tv/tags twitch.tv/commands"
+        )
+        await ws.send_str("PASS oauth:kappa")
+        await ws.send_str(f"NICK {ANONYMOUS_NICK}")
+
+    async def __read(self, ws: aiohttp.ClientWebSocketResponse):
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                if message.type == aiohttp.WSMsgType.ERROR:
+                    log.warning("Ошибка websocket: %s", ws.exception())
+                    return
+                continue
+            for line in message.data.split("\r\n"):
+                if not line:
+                    continue
+                tags, source, command, params = parse_line(line)
+                if command == "PRIVMSG":
+                    if self.route is not None:
+                        self.messages += 1
+                        self.route(line, tags, source)
+                    else:
+                        self.__handle_msg(tags, source, params)
+                elif not await self.__handle_control(ws, source, command, params):
+                    return
+
+    async def __handle_control(
+        self,
+        ws: aiohttp.ClientWebSocketResponse,
+        source: str,
+        command: str,
+        params: str,
+    ) -> bool:
+        """
+        Всё, кроме PRIVMSG. Возвращает False, если надо переподключиться.
+        """
+        if command == "PING":
+            await ws.send_str(f"PONG {params}")
+        elif command == "001":
+            self.ready = True
+            log.info("Successfully connected to Twitch")
+            await ws.send_str("JOIN " + ",".join(f"#{name}" for name in self.channels))
+        elif command == "JOIN" and source.startswith(ANONYMOUS_NICK + "!"):
+            log.info("Joined %s", params.lstrip("#"))
+        elif command == "RECONNECT":
+            log.info("Twitch попросил переподключиться")
+            return False
+        return True
+
+    def __handle_msg(self, raw_tags: str, source: str, params: str):
+        received = time.perf_counter()
+        self.messages += 1
+        tags = parse_tags(raw_tags) if raw_tags else {}
+        channel, _, text = params.partition(" :")
+        nick = source.partition("!")[0]
+
+        timings = self.dispatcher.timings
+        if timings is not None and tags.get("tmi-sent-ts"):
+            timings.record(CHAT, time.time() - int(tags["tmi-sent-ts"]) / 1000)
+        if chat_log.isEnabledFor(logging.INFO):
+            chat_log.info("%s: %s", tags.get("display-name") or nick, text)
+
+        if (
+            self.no_shared_chat_messages
+            and tags.get("source-room-id")
+            and tags["source-room-id"] != tags.get("room-id")
+        ):
+            return
+        if not text.startswith(self.prefix):
+            return
+        command = text[len(self.prefix) :].strip().partition(" ")[0]
+        user = tags.get("user-id") or nick
+        self.dispatcher.handle(command, channel, user, received)
+
+    async def __read_pooled(self, ws: aiohttp.ClientWebSocketResponse):
+        self.__buffered = []
+        self.__running = 0
+        self.__parsed = asyncio.Queue()
+        consumer = self.loop.create_task(self.__consume(ws))
+        try:
+            async for message in ws:
+                if consumer.done():
+                    return
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    if message.type == aiohttp.WSMsgType.ERROR:
+                        log.warning("Ошибка websocket: %s", ws.exception())
+                        return
+                    continue
+                if not self.__buffered:
+                    self.__buffered_at = time.perf_counter()
+                self.__buffered.append(message.data)
+                self.__submit()
+        finally:
+            consumer.cancel()
+
+    def __submit(self):
+        """
+        Отдаёт накопленные строки в пул, если в нём есть свободный процесс.
+        """
+        if not self.__buffered or self.__running >= self.parse_workers:
+            return
+        self.__update_aliases()
+        data = "\r\n".join(self.__buffered)
+        self.__buffered = []
+        chat = chat_log.isEnabledFor(logging.INFO)
+        if self.__pool is None:
+            future = self.loop.create_future()
+            try:
+                future.set_result(
+                    parse_commands(data, self.prefix, self.__aliases, chat)
+                )
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            # Процессу уходит только версия таблицы, сама таблица у него уже есть
+            future = self.loop.run_in_executor(
+                self.__pool, parse_pooled, data, self.prefix, self.__version, None, chat
+            )
+        self.__running += 1
+        self.__parsed.put_nowait((future, data, self.__buffered_at, chat))
+
+    def __update_aliases(self):
+        dispatcher = self.dispatcher
+        if dispatcher.version != self.__version:
+            self.__aliases = dispatcher.aliases()
+            self.__version = dispatcher.version
+
+    async def __consume(self, ws: aiohttp.ClientWebSocketResponse):
+        parsed = self.__parsed
+        while True:
+            # Пачки лежат в очереди в порядке отправки в пул
+            future, data, received, chat = await parsed.get()
+            try:
+                result = await self.__result(future, data, chat)
+            except Exception:
+                # Пачка теряется, но чтение чата продолжается
+                log.exception("Не удалось разобрать пачку чата")
+                result = None
+            self.__running -= 1
+            self.__submit()
+            if result is None:
+                continue
+
+            messages, unknown, commands, control, sent, lines = result
+            try:
+                self.__apply(messages, unknown, commands, sent, lines, received)
+            except Exception:
+                log.exception("Ошибка при обработке пачки чата")
+            for line in control:
+                _, source, command, params = parse_line(line)
+                if not await self.__handle_control(ws, source, command, params):
+                    await ws.close()
+                    return
+
+    async def __result(self, future: asyncio.Future, data: str, chat: bool):
+        try:
+            result = await future
+            if result is None:
+                # Таблица процесса устарела: шлём пачку ещё раз с новой
+                result = await self.loop.run_in_executor(
+                    self.__pool,
+                    parse_pooled,
+                    data,
+                    self.prefix,
+                    self.__version,
+                    self.__aliases,
+                    chat,
+                )
+        except BrokenProcessPool:
+            log.exception("Пул разбора чата упал, разбираем в event loop'е")
+            self.__pool = None
+            result = parse_commands(data, self.prefix, self.__aliases, chat)
+        return result
+
+    def __apply(
+        self,
+        messages: int,
+        unknown: int,
+        commands: list[tuple[str, int, str, int]],
+        sent: list[int],
+        lines: list[tuple[str, str]],
+        received: float,
+    ):
+        dispatcher = self.dispatcher
+        self.messages += messages
+        dispatcher.rejected[UNKNOWN] += unknown
+
+        # Стадия CHAT считается от времени, когда пачка начала копиться, как
+        # и в режиме без пула, где она пишется сразу при получении
+        timings = dispatcher.timings
+        if timings is not None and sent:
+            arrived = time.time() - (time.perf_counter() - received)
+            for ts in sent:
+                timings.record(CHAT, arrived - ts / 1000)
+        for nick, text in lines:
+            chat_log.info("%s: %s", nick, text)
+
+        skip_shared = self.no_shared_chat_messages
+        for user, group, channel, flags in commands:
+            if skip_shared and flags & SHARED:
+                continue
+            dispatcher.handle_id(group, channel, user, received)
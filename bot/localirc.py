@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+import time
+
+from aiohttp import WSMsgType, web
+
+from .log import get_logger
+
+log = get_logger("localirc")
+
+HOST = "tmi.twitch.tv"
+
+
+def format_privmsg(
+    channel: str,
+    user: str,
+    text: str,
+    user_id: str | int | None = None,
+    msg_id: str | int | None = None,
+    sent_ts: int | None = None,
+    room_id: str | int = 1,
+) -> str:
+    """
+    Собирает строку PRIVMSG с тегами в формате Twitch IRC.
+    """
+    if sent_ts is None:
+        sent_ts = int(time.time() * 1000)
+    return (
+        f"@badge-info=;badges=;color=;display-name={user};emotes=;first-msg=0;"
+        f"id={msg_id if msg_id is not None else sent_ts};mod=0;room-id={room_id};"
+        f"subscriber=0;tmi-sent-ts={sent_ts};turbo=0;"
+        f"user-id={user_id if user_id is not None else user};user-type= "
+        f":{user}!{user}@{user}.{HOST} PRIVMSG #{channel} :{text}"
+    )
+
+
+class LocalIRCServer:
+    """
+    Локальная замена чата Twitch для тестов и бенчмарков.
+
+    Websocket-сервер, который понимает ровно столько Twitch IRC, сколько нужно
+    twitchAPI.Chat: CAP, PASS/NICK (отвечает 001), JOIN/PART, PING/PONG, и
+    рассылает PRIVMSG с тегами всем, кто зашёл в канал. Адрес для
+    ``Bot(chat_url=...)`` — ``server.url`` после ``start()``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, max_frame: int = 500):
+        self.host = host
+        self.port = port
+        # Больше строк в одном фрейме не шлём: у aiohttp лимит 4 МБ на сообщение
+        self.max_frame = max_frame
+
+        self.clients: dict[web.WebSocketResponse, set[str]] = {}
+        self.__joined: dict[str, asyncio.Event] = {}
+        self.__runner: web.AppRunner | None = None
+        self.__ids = itertools.count()
+
+        self.sent = 0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/", self.__handle)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self.__runner.addresses[0][1]
+        log.info("Local IRC server on %s", self.url)
+        return self.url
+
+    async def stop(self):
+        for ws in list(self.clients):
+            await ws.close()
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+    async def wait_joined(
+        self, channel: str, timeout: float | None = 10, clients: int = 1
+    ):
+        """
+        Ждёт, пока в канал зайдут хотя бы ``clients`` клиентов.
+        """
+        channel = channel.lower().lstrip("#")
+        event = self.__joined.setdefault(channel, asyncio.Event())
+
+        async def wait():
+            while sum(channel in joined for joined in self.clients.values()) < clients:
+                event.clear()
+                await event.wait()
+
+        await asyncio.wait_for(wait(), timeout)
+
+    async def send_lines(self, channel: str, lines: list[str]):
+        """
+        Отправляет готовые строки IRC всем в канале, по ``max_frame`` строк
+        в одном websocket-фрейме.
+        """
+        if not lines:
+            return
+        channel = channel.lower().lstrip("#")
+        for start in range(0, len(lines), self.max_frame):
+            data = "\r\n".join(lines[start : start + self.max_frame])
+            for ws, channels in list(self.clients.items()):
+                if channel not in channels or ws.closed:
+                    continue
+                try:
+                    await ws.send_str(data)
+                except ConnectionError as e:
+                    log.warning("Клиент отключился: %s", e)
+                    self.clients.pop(ws, None)
+        self.sent += len(lines)
+
+    async def send_privmsg(self, channel: str, user: str, text: str, **tags):
+        channel = channel.lower().lstrip("#")
+        line = format_privmsg(channel, user, text, msg_id=next(self.__ids), **tags)
+        await self.send_lines(channel, [line])
+
+    async def __handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients[ws] = set()
+        nick = "justinfan"
+
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                for line in message.data.split("\r\n"):
+                    if line:
+                        nick = await self.__handle_line(ws, line, nick)
+        finally:
+            self.clients.pop(ws, None)
+        return ws
+
+    async def __handle_line(
+        self, ws: web.WebSocketResponse, line: str, nick: str
+    ) -> str:
+        command, _, params = line.partition(" ")
+        if command == "CAP":
+            await ws.send_str(f":{HOST} CAP * ACK :{params.split(':', 1)[-1]}")
+        elif command == "NICK":
+            nick = params.strip()
+            await ws.send_str(f":{HOST} 001 {nick} :Welcome, GLHF!")
+        elif command == "PING":
+            await ws.send_str(f":{HOST} PONG {HOST} {params}")
+        elif command == "JOIN":
+            for channel in params.split(","):
+                channel = channel.strip().lstrip("#").lower()
+                self.clients[ws].add(channel)
+                await ws.send_str(
+                    f":{nick}!{nick}@{nick}.{HOST} JOIN #{channel}\r\n"
+                    f"@emote-only=0;followers-only=-1;r9k=0;room-id=1;slow=0;"
+                    f"subs-only=0 :{HOST} ROOMSTATE #{channel}"
+                )
+                self.__joined.setdefault(channel, asyncio.Event()).set()
+        elif command == "PART":
+            for channel in params.split(","):
+                channel = channel.strip().lstrip("#").lower()
+                self.clients[ws].discard(channel)
+                await ws.send_str(f":{nick}!{nick}@{nick}.{HOST} PART #{channel}")
+        return nick
@@ -0,0 +1,107 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+import sys
+
+ROOT = "twitchplays"
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def get_logger(category: str) -> logging.Logger:
+    """
+    Логгер категории: "bot", "chat", "input", "votes", "control" и т.д.
+    """
+    return logging.getLogger(f"{ROOT}.{category}")
+
+
+class SampleFilter(logging.Filter):
+    """
+    Пропускает только каждую ``every``-ю запись. Предупреждения и ошибки
+    пропускаются всегда.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self.__counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        return next(self.__counter) % self.every == 0
+
+
+def setup_logging(
+    level: int | str = logging.INFO,
+    file: str | None = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 3,
+    sampling: dict[str, int] | None = None,
+) -> logging.handlers.QueueListener:
+    """
+    Настраивает логирование бота.
+
+    Записи только кладутся в очередь, а в консоль и файл их пишет отдельный
+    поток, поэтому медленная консоль Windows не тормозит event loop.
+
+    :param level: Уровень логирования
+    :param file: Путь к файлу лога (с ротацией) или None
+    :param max_bytes: Размер файла, после которого начинается новый
+    :param backup_count: Сколько старых файлов хранить
+    :param sampling: Категория -> N, писать только каждую N-ю запись категории
+        (например, {"chat": 10})
+    """
+    global _listener
+
+    root = logging.getLogger(ROOT)
+    if _listener is not None:
+        _listener.stop()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+    formatter = logging.Formatter(
+        "%(asctime)s %(levelname)s [%(name)s] %(message)s", "%H:%M:%S"
+    )
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if file is not None:
+        handlers.append(
+            logging.handlers.RotatingFileHandler(
+                file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+        )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    root.propagate = False
+
+    for category, every in (sampling or {}).items():
+        logger = get_logger(category)
+        for old in [f for f in logger.filters if isinstance(f, SampleFilter)]:
+            logger.removeFilter(old)
+        if every > 1:
+            logger.addFilter(SampleFilter(every))
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """
+    Дописывает всё, что осталось в очереди, и останавливает поток логирования.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
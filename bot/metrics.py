@@ -0,0 +1,254 @@
+from typing import TYPE_CHECKING
+
+from aiohttp import web
+
+from .backends import key_name
+from .log import get_logger
+from .stats import Histogram
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+log = get_logger("bot")
+
+PREFIX = "twitchplays"
+OTHER = "other"
+QUANTILES = (0.5, 0.9, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsWriter:
+    """
+    Собирает текст в формате Prometheus exposition.
+
+    Значения с метками обрезаются до ``max_label_values`` самых больших,
+    остальные складываются в метку ``other``, чтобы число рядов не зависело
+    от того, что пишут в чат.
+    """
+
+    def __init__(self, max_label_values: int = 64):
+        self.max_label_values = max_label_values
+        self.lines: list[str] = []
+
+    def header(self, name: str, kind: str, help: str):
+        self.lines.append(f"# HELP {PREFIX}_{name} {help}")
+        self.lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    def value(self, name: str, value: float, labels: dict[str, str] | None = None):
+        if labels:
+            text = ",".join(f'{k}="{escape(str(v))}"' for k, v in labels.items())
+            self.lines.append(f"{PREFIX}_{name}{{{text}}} {value}")
+        else:
+            self.lines.append(f"{PREFIX}_{name} {value}")
+
+    def metric(self, name: str, kind: str, help: str, value: float):
+        self.header(name, kind, help)
+        self.value(name, value)
+
+    def labeled(
+        self, name: str, kind: str, help: str, label: str, values: dict[str, float]
+    ):
+        self.header(name, kind, help)
+        items = sorted(values.items(), key=lambda item: item[1], reverse=True)
+        rest = items[self.max_label_values :]
+        for key, value in items[: self.max_label_values]:
+            self.value(name, value, {label: key})
+        if rest:
+            self.value(name, sum(value for _, value in rest), {label: OTHER})
+
+    def summary(self, name: str, histogram: Histogram, labels: dict[str, str]):
+        """
+        Гистограмма как summary в секундах. Заголовок пишется отдельно.
+        """
+        for q in QUANTILES:
+            self.value(name, histogram.percentile(q * 100), {**labels, "quantile": q})
+        self.value(f"{name}_sum", histogram.total, labels or None)
+        self.value(f"{name}_count", histogram.count, labels or None)
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def collect(bot: "Bot", max_label_values: int = 64) -> str:
+    """
+    Снимает метрики бота. Только читает счётчики, поэтому быстро и без await.
+    """
+    dispatcher = bot.dispatcher
+    controller = bot.controller
+    ingress = dispatcher.ingress
+    out = MetricsWriter(max_label_values)
+
+    out.metric(
+        "messages_received_total",
+        "counter",
+        "Сообщения из чата",
+        bot.chat.messages,
+    )
+    out.metric(
+        "commands_accepted_total",
+        "counter",
+        "Команды, прошедшие проверки",
+        dispatcher.accepted,
+    )
+    out.labeled(
+        "commands_rejected_total",
+        "counter",
+        "Отклонённые команды по причинам",
+        "reason",
+        dispatcher.rejected,
+    )
+    out.metric(
+        "cooldown_hits_total",
+        "counter",
+        "Команды, попавшие в кулдаун",
+        dispatcher.cooldowns.hits,
+    )
+    out.metric(
+        "cooldowns_active",
+        "gauge",
+        "Активные кулдауны",
+        dispatcher.cooldowns.size,
+    )
+
+    out.metric("ingress_queued", "gauge", "Команды в очереди", len(ingress))
+    out.metric(
+        "ingress_dropped_total",
+        "counter",
+        "Команды, выброшенные из переполненной очереди",
+        ingress.dropped,
+    )
+    out.metric(
+        "ingress_merged_total",
+        "counter",
+        "Одинаковые команды, склеенные в очереди",
+        ingress.merged,
+    )
+    out.metric(
+        "ingress_processed_total",
+        "counter",
+        "Выполненные команды",
+        ingress.processed,
+    )
+    out.labeled(
+        "channel_processed_total",
+        "counter",
+        "Выполненные команды по каналам",
+        "channel",
+        {str(k).lstrip("#"): v for k, v in list(ingress.processed_by.items())},
+    )
+    out.labeled(
+        "channel_dropped_total",
+        "counter",
+        "Выброшенные из очереди команды по каналам",
+        "channel",
+        {str(k).lstrip("#"): v for k, v in list(ingress.dropped_by.items())},
+    )
+
+    out.labeled(
+        "votes_total",
+        "counter",
+        "Голоса за клавиши",
+        "key",
+        {key_name(k): v for k, v in controller.vote_totals.items()},
+    )
+    out.labeled(
+        "votes_current",
+        "gauge",
+        "Голоса за клавиши в текущем окне",
+        "key",
+        {key_name(k): v[0] for k, v in controller.vote_tallies().items()},
+    )
+
+    held = [key_name(k) for k, pressed in controller.pressed.items() if pressed]
+    out.metric("keys_held", "gauge", "Сколько клавиш зажато", len(held))
+    out.labeled(
+        "key_held",
+        "gauge",
+        "Зажатые клавиши",
+        "key",
+        dict.fromkeys(held, 1),
+    )
+    out.header("mouse_pending_pixels", "gauge", "Накопленный сдвиг мыши")
+    out.value("mouse_pending_pixels", controller.pending_x, {"axis": "x"})
+    out.value("mouse_pending_pixels", controller.pending_y, {"axis": "y"})
+    out.metric(
+        "holds_capped_total",
+        "counter",
+        "Продления зажатия, обрезанные по max_hold",
+        controller.capped_holds,
+    )
+    out.metric(
+        "mouse_capped_total",
+        "counter",
+        "Сдвиги мыши, обрезанные по max_mouse_pending",
+        controller.capped_mouse,
+    )
+
+    out.metric(
+        "input_actions_total",
+        "counter",
+        "Действия ввода, отправленные в backend",
+        controller.output.actions,
+    )
+    out.metric(
+        "input_errors_total",
+        "counter",
+        "Ошибки отправки ввода",
+        controller.output.errors,
+    )
+
+    timings = bot.timings
+    out.header("loop_lag_seconds", "summary", "Задержка event loop'а")
+    out.summary("loop_lag_seconds", timings.loop_lag, {})
+    out.header("stage_latency_seconds", "summary", "Задержка этапов команды")
+    for stage, histogram in timings.stages.items():
+        out.summary("stage_latency_seconds", histogram, {"stage": stage})
+
+    return out.text()
+
+
+class MetricsServer:
+    """
+    HTTP-сервер с метриками в формате Prometheus на event loop'е бота.
+
+    Отдаёт ``/metrics``. Ответ собирается из уже посчитанных счётчиков
+    синхронно, так что запрос не ждёт ни чат, ни AHK.
+    """
+
+    def __init__(
+        self,
+        bot: "Bot",
+        port: int,
+        host: str = "127.0.0.1",
+        max_label_values: int = 64,
+    ):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.max_label_values = max_label_values
+        self.__runner: web.AppRunner | None = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handle)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, self.host, self.port).start()
+        if self.port == 0:
+            self.port = self.__runner.addresses[0][1]
+        log.info("Метрики на http://%s:%d/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=collect(self.bot, self.max_label_values).encode("utf-8"),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+from ahk.keys import Key
+
+from .backends import KEY_DOWN, KEY_PRESS, KEY_UP, MOUSE_MOVE, Action, InputBackend
+from .log import get_logger
+from .stats import BACKEND, TOTAL, Timings
+
+
+log = get_logger("input")
+
+
+class InputPipeline:
+    """
+    Очередь действий ввода между Controller и InputBackend.
+
+    Все нажатия, отпускания и сдвиги мыши, накопившиеся за один тик event loop'а,
+    уходят в backend одной пачкой (для AHK — одной строкой SendInput).
+    Относительные сдвиги мыши внутри пачки суммируются в один.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        backend: InputBackend,
+        timings: Timings | None = None,
+    ):
+        self.loop = loop
+        self.backend = backend
+        self.timings = timings
+
+        self.__pending: list[Action] = []
+        self.__mouse_x = 0
+        self.__mouse_y = 0
+        self.__first_queued_at = 0.0
+        # Время прихода самой старой команды из чата в текущей пачке
+        self.__origin: float | None = None
+        self.__ready = asyncio.Event()
+        self.__task: asyncio.Task | None = None
+        self.__closing = False
+
+        # Счётчики
+        self.actions = 0
+        self.mouse_moves = 0
+        self.flushes = 0
+        self.max_batch = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.errors = 0
+
+    def start(self):
+        if self.__task is None:
+            self.__task = self.loop.create_task(self.__sender_loop())
+
+    def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+    async def close(self, timeout: float = 1.0):
+        """
+        Отправляет всё, что уже в очереди, и останавливает отправку.
+        В отличие от ``stop``, не теряет последнюю пачку (например,
+        отпускания клавиш при выключении бота).
+        """
+        task, self.__task = self.__task, None
+        if task is None:
+            return
+        self.__closing = True
+        self.__ready.set()
+        try:
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            log.warning("Не успели отправить ввод до остановки")
+
+    def key_down(self, key: str | Key):
+        self.__push((KEY_DOWN, key))
+
+    def key_up(self, key: str | Key):
+        self.__push((KEY_UP, key))
+
+    def key_press(self, key: str | Key):
+        self.__push((KEY_PRESS, key))
+
+    def mouse_move(self, dx: int, dy: int):
+        if not dx and not dy:
+            return
+        self.__mark_queued()
+        self.__mouse_x += dx
+        self.__mouse_y += dy
+        self.mouse_moves += 1
+        self.actions += 1
+
+    def stats(self) -> dict[str, float]:
+        flushes = self.flushes or 1
+        return {
+            "actions": self.actions,
+            "mouse_moves": self.mouse_moves,
+            "flushes": self.flushes,
+            "actions_per_flush": self.actions / flushes,
+            "max_batch": self.max_batch,
+            "avg_latency": self.total_latency / flushes,
+            "max_latency": self.max_latency,
+            "errors": self.errors,
+        }
+
+    def __push(self, action: Action):
+        self.__mark_queued()
+        self.__pending.append(action)
+        self.actions += 1
+
+    def __mark_queued(self):
+        timings = self.timings
+        if timings is not None and timings.origin is not None and self.__origin is None:
+            self.__origin = timings.origin
+        if not self.__ready.is_set():
+            self.__first_queued_at = time.perf_counter()
+            self.__ready.set()
+
+    async def __sender_loop(self):
+        while True:
+            await self.__ready.wait()
+            self.__ready.clear()
+
+            batch, self.__pending = self.__pending, []
+            size = len(batch)
+            if self.__mouse_x or self.__mouse_y:
+                batch.append((MOUSE_MOVE, self.__mouse_x, self.__mouse_y))
+                self.__mouse_x = 0
+                self.__mouse_y = 0
+                size += 1
+            if not batch:
+                if self.__closing:
+                    return
+                continue
+
+            queued_at = self.__first_queued_at
+            origin, self.__origin = self.__origin, None
+            try:
+                await self.backend.send(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                log.error("Не удалось отправить ввод: %s", e)
+
+            done = time.perf_counter()
+            latency = done - queued_at
+            if self.timings is not None:
+                self.timings.record(BACKEND, latency)
+                if origin is not None:
+                    self.timings.record(TOTAL, done - origin)
+            self.flushes += 1
+            self.max_batch = max(self.max_batch, size)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if self.__closing and not self.__pending:
+                return
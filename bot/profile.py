@@ -0,0 +1,498 @@
+import hashlib
+import json
+import os
+import pickle
+import types
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+from ahk.keys import Key
+
+from . import utils
+from .actions import VOTE, Action
+from .controller import Direction, Keys
+from .cooldown import Cooldown, Scope
+from .curves import Curves
+from .democracy import Mode
+from .log import get_logger
+
+log = get_logger("bot")
+
+CACHE_SUFFIX = ".compiled"
+# Меняется вместе с форматом Profile, чтобы старые кэши не подхватывались
+FORMAT = 1
+
+ALIAS_TABLES = {
+    "RUSSIAN_KEYBOARD": utils.RUSSIAN_KEYBOARD,
+    "RUSSIAN_WASD": utils.RUSSIAN_WASD,
+    "ENGLISH_KEYBOARD": utils.ENGLISH_KEYBOARD,
+    "ENGLISH_WASD": utils.ENGLISH_WASD,
+}
+
+NUMBER = (int, float)
+# Настройки Bot, которые можно задать в профиле: имя -> допустимые типы
+SETTINGS = {
+    "channel": (str, list, dict),
+    "process": str,
+    "mouse_speed": NUMBER,
+    "prefix": str,
+    "cooldown": (int, float, dict),
+    "focus_staleness": NUMBER,
+    "mouse_tick_rate": int,
+    "mouse_curve": str,
+    "mode": str,
+    "democracy_window": NUMBER,
+    "democracy_winners": int,
+    "queue_size": int,
+    "max_hold": NUMBER,
+    "max_mouse_pending": NUMBER,
+    "log_level": (str, int),
+    "log_file": str,
+    "log_sampling": dict,
+    "chat_url": str,
+    "stats_interval": NUMBER,
+    "metrics_port": int,
+    "metrics_host": str,
+    "single_loop": bool,
+    "workers": int,
+    "parse_workers": int,
+}
+
+# (алиасы, действие, кулдаун как в методах Bot, участвует ли в демократии)
+Entry = tuple[tuple[str, ...], Action, int | float | Cooldown | None, bool]
+
+
+class ProfileError(ValueError):
+    pass
+
+
+class Profile:
+    """
+    Проверенный и скомпилированный профиль: настройки Bot и таблица команд.
+
+    ``entries`` регистрируются по порядку, как если бы вызывались методы
+    Bot. Профиль пиклится целиком, так что повторный запуск с тем же файлом
+    не разбирает и не проверяет его заново (см. ``load_profile``).
+    """
+
+    __slots__ = ("digest", "settings", "entries")
+
+    def __init__(self, digest: str, settings: dict, entries: list[Entry]):
+        self.digest = digest
+        self.settings = settings
+        self.entries = entries
+
+    def __repr__(self):
+        return f"Profile({self.digest[:12]!r}, {len(self.entries)} entries)"
+
+
+class _Fields:
+    """
+    Чтение полей одной записи профиля с понятными ошибками.
+    """
+
+    def __init__(self, data: object, where: str):
+        if not isinstance(data, dict):
+            raise ProfileError(f"{where}: expected an object")
+        self.data = data
+        self.where = where
+        self.__used = {"type"}
+
+    def get(self, name: str, types, default=None, required: bool = False):
+        self.__used.add(name)
+        if name not in self.data or self.data[name] is None:
+            if required:
+                raise ProfileError(f"{self.where}.{name}: required")
+            return default
+        value = self.data[name]
+        # bool — подкласс int, но True вместо числа почти всегда опечатка
+        if not isinstance(value, types) or (
+            isinstance(value, bool) and bool not in _tuple(types)
+        ):
+            raise ProfileError(f"{self.where}.{name}: unexpected {value!r}")
+        return value
+
+    def number(self, name: str, default=None, required: bool = False):
+        value = self.get(name, NUMBER, default, required)
+        if value is not None and value < 0:
+            raise ProfileError(f"{self.where}.{name}: must not be negative")
+        return value
+
+    def commands(self, name: str = "commands") -> tuple[str, ...]:
+        return _commands(self.get(name, (str, list), required=True), self.where)
+
+    def key(self, name: str = "key") -> str | Key:
+        return _key(self.get(name, str, required=True))
+
+    def cooldown(self) -> int | float | Cooldown | None:
+        return _cooldown(self.get("cooldown", (int, float, dict)), self.where)
+
+    def aliases(self, default: str) -> dict[str, list[str]]:
+        value = self.get("aliases", (str, dict), default)
+        if isinstance(value, str):
+            if value not in ALIAS_TABLES:
+                raise ProfileError(
+                    f"{self.where}.aliases: unknown table {value!r}, "
+                    f"expected one of {', '.join(ALIAS_TABLES)}"
+                )
+            return ALIAS_TABLES[value]
+        return {
+            key: list(_commands(commands, f"{self.where}.aliases.{key}"))
+            for key, commands in value.items()
+        }
+
+    def done(self):
+        unknown = set(self.data) - self.__used
+        if unknown:
+            raise ProfileError(
+                f"{self.where}: unknown fields {', '.join(sorted(unknown))}"
+            )
+
+
+def _tuple(types) -> tuple:
+    return types if isinstance(types, tuple) else (types,)
+
+
+def _commands(value: str | list, where: str) -> tuple[str, ...]:
+    if isinstance(value, str):
+        value = value.split(",")
+    commands = []
+    for command in value:
+        if not isinstance(command, str):
+            raise ProfileError(f"{where}: command {command!r} is not a string")
+        command = command.strip()
+        if command:
+            commands.append(command)
+    if not commands:
+        raise ProfileError(f"{where}: no commands")
+    return tuple(commands)
+
+
+def _key(name: str) -> str | Key:
+    """
+    Имя клавиши из профиля: ``"space"``, ``"F1"`` и другие имена из ``Keys``
+    становятся клавишами AHK, ``"lmb"``/``"rmb"`` — кнопками мыши, всё
+    остальное передаётся как есть.
+    """
+    if not name.isidentifier():
+        return name
+    key = getattr(Keys, name.upper(), name)
+    return key if isinstance(key, (str, Key)) else name
+
+
+def _cooldown(value, where: str) -> int | float | Cooldown | None:
+    if value is None or isinstance(value, (int, float)) and not isinstance(value, bool):
+        if value is not None and value < 0:
+            raise ProfileError(f"{where}.cooldown: must not be negative")
+        return value
+    if isinstance(value, dict):
+        fields = _Fields(value, f"{where}.cooldown")
+        seconds = fields.number("seconds", required=True)
+        scope = fields.get("scope", str, Scope.USER_COMMAND)
+        fields.done()
+        if scope not in (
+            Scope.USER_COMMAND,
+            Scope.USER,
+            Scope.COMMAND,
+            Scope.CHANNEL,
+            Scope.GLOBAL,
+        ):
+            raise ProfileError(f"{where}.cooldown.scope: unknown scope {scope!r}")
+        return Cooldown(seconds, scope)
+    raise ProfileError(f"{where}.cooldown: unexpected {value!r}")
+
+
+def _press(f: _Fields) -> list[Entry]:
+    return [
+        (
+            f.commands(),
+            Action.press(f.key(), f.number("duration")),
+            f.cooldown(),
+            True,
+        )
+    ]
+
+
+def _mouse_button(key: str):
+    def build(f: _Fields) -> list[Entry]:
+        return [
+            (
+                f.commands(),
+                Action.press(key, f.number("duration")),
+                f.cooldown(),
+                True,
+            )
+        ]
+
+    return build
+
+
+def _wasd(f: _Fields) -> list[Entry]:
+    aliases = f.aliases("ENGLISH_WASD")
+    duration = f.number("duration", 0.3)
+    cooldown = f.cooldown()
+    unknown = set(aliases) - set("wasd")
+    if unknown:
+        raise ProfileError(f"{f.where}.aliases: not WASD keys {sorted(unknown)}")
+    return [
+        (tuple(aliases.get(key, [key])), Action.press(key, duration), cooldown, True)
+        for key in "wasd"
+    ]
+
+
+def _numbers(f: _Fields) -> list[Entry]:
+    duration = f.number("duration", 0)
+    cooldown = f.cooldown()
+    return [
+        ((str(number),), Action.press(str(number), duration), cooldown, True)
+        for number in range(10)
+    ]
+
+
+def _all_keys(f: _Fields) -> list[Entry]:
+    aliases = f.aliases("ENGLISH_KEYBOARD")
+    duration = f.number("duration", 0.3)
+    cooldown = f.cooldown()
+    return [
+        (tuple(commands), Action.press(key, duration), cooldown, True)
+        for key, commands in aliases.items()
+    ]
+
+
+def _mouse(f: _Fields) -> list[Entry]:
+    commands = f.commands()
+    direction = f.get("direction", str, required=True)
+    try:
+        dx, dy = Direction.delta(direction.lower(), f.get("amount", int, 100))
+    except ValueError as exc:
+        raise ProfileError(
+            f"{f.where}.direction: unknown direction {direction!r}"
+        ) from exc
+    return [(commands, Action.move(dx, dy), f.cooldown(), True)]
+
+
+def _vote(f: _Fields) -> list[Entry]:
+    action = Action.vote(
+        f.key(),
+        f.get("required_votes", int, required=True),
+        f.number("time_window", required=True),
+        f.number("duration"),
+        f.get("one_vote_per_user", bool, False),
+    )
+    return [(f.commands(), action, f.cooldown(), True)]
+
+
+def _mode_vote(f: _Fields) -> list[Entry]:
+    required_votes = f.get("required_votes", int, 10)
+    time_window = f.number("time_window", 30)
+    cooldown = f.cooldown()
+    return [
+        (
+            _commands(f.get(mode, (str, list), [mode]), f"{f.where}.{mode}"),
+            Action.mode_vote(mode, required_votes, time_window),
+            cooldown,
+            False,
+        )
+        for mode in (Mode.ANARCHY, Mode.DEMOCRACY)
+    ]
+
+
+COMMAND_TYPES = {
+    "press": _press,
+    "left_mouse_button": _mouse_button(Keys.LMB),
+    "right_mouse_button": _mouse_button(Keys.RMB),
+    "wasd": _wasd,
+    "numbers": _numbers,
+    "all_keys": _all_keys,
+    "mouse": _mouse,
+    "vote": _vote,
+    "mode_vote": _mode_vote,
+}
+"""
+Типы команд профиля и соответствующие методы Bot: ``press`` — press_key,
+``wasd`` — register_wasd, ``numbers`` — register_numbers, ``all_keys`` —
+register_all_keys, ``mouse`` — move_mouse, ``vote`` — key_vote,
+``mode_vote`` — register_mode_vote.
+"""
+
+
+def _compile_inputs() -> bytes:
+    """
+    Хэш всего, из чего собирается профиль, кроме самого файла: таблиц
+    алиасов, типов команд и клавиш. Входит в digest кэша, чтобы после
+    обновления бота старый кэш не подхватился.
+    """
+    inputs = hashlib.sha256(FORMAT.to_bytes(4, "little"))
+    for name, table in sorted(ALIAS_TABLES.items()):
+        inputs.update(repr((name, sorted(table.items()))).encode())
+    for name, build in COMMAND_TYPES.items():
+        cells = [cell.cell_contents for cell in build.__closure__ or ()]
+        inputs.update(repr((name, cells)).encode())
+        _hash_code(inputs, build.__code__)
+    keys = sorted(name for name in dir(Keys) if not name.startswith("_"))
+    inputs.update(repr([(name, getattr(Keys, name)) for name in keys]).encode())
+    return inputs.digest()
+
+
+def _hash_code(inputs, code: types.CodeType):
+    # repr вложенных code object'ов содержит адрес, поэтому они обходятся сами
+    inputs.update(code.co_code)
+    inputs.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(inputs, const)
+        elif isinstance(const, frozenset):
+            # Порядок множества зависит от PYTHONHASHSEED
+            inputs.update(repr(sorted(map(repr, const))).encode())
+        else:
+            inputs.update(repr(const).encode())
+
+
+COMPILE_INPUTS = _compile_inputs()
+
+
+def _settings(data: object) -> dict:
+    fields = _Fields(data, "bot")
+    settings = {}
+    for name, types in SETTINGS.items():
+        value = fields.get(name, types)
+        if value is not None:
+            settings[name] = value
+    fields.done()
+
+    if "cooldown" in settings:
+        settings["cooldown"] = _cooldown(settings["cooldown"], "bot")
+    if "mouse_curve" in settings:
+        curve = getattr(Curves, settings["mouse_curve"].upper(), None)
+        if not callable(curve):
+            raise ProfileError(
+                f"bot.mouse_curve: unknown curve {settings['mouse_curve']!r}"
+            )
+        settings["mouse_curve"] = curve
+    if settings.get("mode", Mode.ANARCHY) not in (Mode.ANARCHY, Mode.DEMOCRACY):
+        raise ProfileError(f"bot.mode: unknown mode {settings['mode']!r}")
+    return settings
+
+
+def compile_profile(data: object, digest: str = "") -> Profile:
+    """
+    Проверяет разобранный профиль и компилирует его в ``Profile``.
+    Бросает ``ProfileError`` с путём до ошибочного поля.
+    """
+    if not isinstance(data, dict):
+        raise ProfileError("profile: expected an object")
+    unknown = set(data) - {"bot", "commands"}
+    if unknown:
+        raise ProfileError(f"profile: unknown sections {', '.join(sorted(unknown))}")
+
+    settings = _settings(data.get("bot", {}))
+    commands = data.get("commands", [])
+    if not isinstance(commands, list):
+        raise ProfileError("commands: expected a list")
+
+    entries: list[Entry] = []
+    # Голоса за клавишу считает один счётчик Controller'а, поэтому у всех
+    # голосований за неё должны быть одни и те же окно, порог и дедупликация
+    votes: dict[object, tuple[str, tuple]] = {}
+    for i, item in enumerate(commands):
+        where = f"commands[{i}]"
+        fields = _Fields(item, where)
+        kind = item.get("type")
+        build = COMMAND_TYPES.get(kind)
+        if build is None:
+            raise ProfileError(
+                f"{where}.type: unknown type {kind!r}, "
+                f"expected one of {', '.join(COMMAND_TYPES)}"
+            )
+        built = build(fields)
+        fields.done()
+        for _, action, _, _ in built:
+            if action.kind != VOTE:
+                continue
+            vote = (action.required_votes, action.time_window, action.one_vote_per_user)
+            first, other = votes.setdefault(action.key, (where, vote))
+            if other != vote:
+                raise ProfileError(
+                    f"{where}.key: {item.get('key')!r} is already voted for in "
+                    f"{first} with different required_votes, time_window "
+                    "or one_vote_per_user"
+                )
+        entries.extend(built)
+    return Profile(digest, settings, entries)
+
+
+def parse_profile(raw: bytes, path: str) -> object:
+    """
+    Разбирает JSON или TOML (по расширению файла).
+    """
+    if path.lower().endswith(".toml"):
+        if tomllib is None:
+            raise ProfileError("TOML profiles need Python 3.11+ (tomllib)")
+        try:
+            return tomllib.loads(raw.decode("utf-8"))
+        except tomllib.TOMLDecodeError as e:
+            raise ProfileError(f"{path}: {e}") from None
+    try:
+        return json.loads(raw.decode("utf-8"))
+    except json.JSONDecodeError as e:
+        raise ProfileError(f"{path}: {e}") from None
+
+
+def load_profile(path: str, cache: bool = True) -> Profile:
+    """
+    Загружает профиль из JSON/TOML.
+
+    Скомпилированный профиль кэшируется рядом с файлом (``path + ".compiled"``)
+    вместе с sha256 содержимого. Если хэш совпадает, профиль берётся из кэша
+    без разбора и проверки. В хэш входит и ``COMPILE_INPUTS``, так что кэш
+    сбрасывается, когда меняются таблицы алиасов, типы команд или клавиши.
+    Кэш — обычный pickle, поэтому доверяйте ему так же, как самому профилю.
+    """
+    with open(path, "rb") as file:
+        raw = file.read()
+    digest = hashlib.sha256(COMPILE_INPUTS + raw).hexdigest()
+
+    cache_path = path + CACHE_SUFFIX
+    if cache:
+        profile = _read_cache(cache_path, digest)
+        if profile is not None:
+            return profile
+
+    profile = compile_profile(parse_profile(raw, path), digest)
+    if cache:
+        _write_cache(cache_path, profile)
+    return profile
+
+
+def _read_cache(path: str, digest: str) -> Profile | None:
+    try:
+        with open(path, "rb") as file:
+            profile = pickle.load(file)
+        # Сравнение тоже под try: у Profile из старой версии бота может не
+        # быть нужных полей
+        if not isinstance(profile, Profile) or profile.digest != digest:
+            return None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Любая ошибка кэша — просто промах, профиль соберётся заново
+        log.warning("Не удалось прочитать кэш профиля %s: %s", path, e)
+        return None
+    return profile
+
+
+def _write_cache(path: str, profile: Profile):
+    temp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp, "wb") as file:
+            pickle.dump(profile, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except OSError as e:
+        log.warning("Не удалось сохранить кэш профиля %s: %s", path, e)
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
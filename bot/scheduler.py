@@ -0,0 +1,99 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Callable, Hashable
+
+
+class ReleaseScheduler:
+    """
+    Отпускает зажатые клавиши по таймеру.
+
+    Вместо задачи на каждую клавишу держит min-heap из (end_time, key) и один
+    таймер event loop'а на ближайший дедлайн. Продление — это просто новая запись
+    в куче за O(log n), устаревшие записи пропускаются при извлечении.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        on_release: Callable[[Hashable], None],
+    ):
+        self.loop = loop
+        self.on_release = on_release
+
+        # key -> время отпускания (time.time())
+        self.deadlines: dict[Hashable, float] = {}
+
+        self.__heap: list[tuple[float, int, Hashable]] = []
+        self.__counter = itertools.count()
+        self.__timer: asyncio.TimerHandle | None = None
+        self.__timer_when = 0.0
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key: Hashable):
+        return key in self.deadlines
+
+    def schedule(self, key: Hashable, end_time: float):
+        """
+        Назначает (или переназначает) время отпускания клавиши.
+        """
+        self.deadlines[key] = end_time
+        heapq.heappush(self.__heap, (end_time, next(self.__counter), key))
+        self.__arm()
+
+    def cancel(self, key: Hashable):
+        """
+        Забывает про клавишу, не вызывая on_release.
+        """
+        self.deadlines.pop(key, None)
+
+    def release_all(self):
+        """
+        Немедленно отпускает все клавиши.
+        """
+        keys = list(self.deadlines)
+        self.deadlines.clear()
+        self.__heap.clear()
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        for key in keys:
+            self.on_release(key)
+
+    def __arm(self):
+        heap = self.__heap
+        # Выкидываем устаревшие записи сверху кучи, чтобы не просыпаться зря
+        while heap and self.deadlines.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+
+        if not heap:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            return
+
+        when = heap[0][0]
+        if self.__timer is not None:
+            if self.__timer_when <= when:
+                return
+            self.__timer.cancel()
+
+        self.__timer_when = when
+        self.__timer = self.loop.call_later(max(0.0, when - time.time()), self.__fire)
+
+    def __fire(self):
+        self.__timer = None
+        heap = self.__heap
+        now = time.time()
+
+        while heap and heap[0][0] <= now:
+            end_time, _, key = heapq.heappop(heap)
+            if self.deadlines.get(key) != end_time:
+                continue
+            del self.deadlines[key]
+            self.on_release(key)
+
+        self.__arm()
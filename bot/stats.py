@@ -0,0 +1,293 @@
+import asyncio
+import time
+
+from .log import get_logger
+
+log = get_logger("stats")
+
+CHAT = "chat"
+CHECKS = "checks"
+QUEUE = "queue"
+DISPATCH = "dispatch"
+BACKEND = "backend"
+TOTAL = "total"
+
+STAGES = (CHAT, CHECKS, QUEUE, DISPATCH, BACKEND, TOTAL)
+"""
+Этапы команды:
+
+- ``chat`` — от tmi-sent-ts (время сервера Twitch) до прихода в бота;
+- ``checks`` — разбор команды, пауза, активное окно и кулдаун;
+- ``queue`` — ожидание в очереди до event loop'а бота;
+- ``dispatch`` — выполнение действия команды;
+- ``backend`` — от постановки ввода в очередь до ответа backend'а;
+- ``total`` — от прихода сообщения до ответа backend'а.
+"""
+
+
+class Histogram:
+    """
+    Гистограмма задержек с фиксированной памятью в стиле HDR Histogram.
+
+    Значения хранятся в микросекундах в логарифмических корзинах, каждая
+    степень двойки делится на ``2 ** (precision - 1)`` частей, поэтому
+    относительная ошибка процентилей — не больше ``1 / 2 ** (precision - 1)``
+    (для precision=7 — около 1.6%). Всё, что больше ``max_seconds``,
+    попадает в последнюю корзину.
+    """
+
+    def __init__(self, max_seconds: float = 60.0, precision: int = 7):
+        self.precision = precision
+        self.max_seconds = max_seconds
+        self.__half = 1 << (precision - 1)
+        self.__max_value = int(max_seconds * 1_000_000)
+        self.__counts = [0] * (self.__index(self.__max_value) + 1)
+
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+        # Сколько раз гистограмму сбрасывали, чтобы снимок до сброса
+        # не вычитался из счётчиков после него
+        self.resets = 0
+
+    def __index(self, value: int) -> int:
+        shift = value.bit_length() - self.precision
+        if shift <= 0:
+            return value
+        return shift * self.__half + (value >> shift)
+
+    def __value(self, index: int) -> int:
+        """
+        Середина корзины в микросекундах.
+        """
+        if index < 2 * self.__half:
+            return index
+        shift = index // self.__half - 1
+        mantissa = index - shift * self.__half
+        return (mantissa << shift) + (1 << shift) // 2
+
+    def record(self, seconds: float):
+        seconds = min(max(seconds, 0.0), self.max_seconds)
+        value = int(seconds * 1_000_000)
+        self.__counts[self.__index(value)] += 1
+
+        if not self.count or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Значение ``q``-го процентиля (0..100) в секундах.
+        """
+        if not self.count:
+            return 0.0
+        target = max(1, -(-self.count * q // 100))
+        seen = 0
+        for index, count in enumerate(self.__counts):
+            seen += count
+            if seen >= target:
+                value = self.__value(index) / 1_000_000
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        self.__counts = [0] * len(self.__counts)
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+        self.resets += 1
+
+    def snapshot(self) -> tuple[int, list[int]]:
+        """
+        Копия счётчиков корзин для ``percentiles_since``.
+        """
+        return self.resets, self.__counts.copy()
+
+    def percentiles_since(
+        self, snapshot: tuple[int, list[int]] | None, *qs: float
+    ) -> list[float]:
+        """
+        Процентили ``qs`` (0..100) в секундах только по значениям, записанным
+        после ``snapshot``, или по всем, если снимка нет или гистограмму с
+        тех пор сбросили. Нули, если таких значений нет.
+        """
+        counts = self.__counts
+        if snapshot is not None and snapshot[0] == self.resets:
+            counts = [
+                now - before for now, before in zip(counts, snapshot[1], strict=True)
+            ]
+        total = sum(counts)
+        if not total:
+            return [0.0] * len(qs)
+        result = []
+        for q in qs:
+            target = max(1, -(-total * q // 100))
+            seen = 0
+            for index, count in enumerate(counts):
+                seen += count
+                if seen >= target:
+                    result.append(min(self.__value(index) / 1_000_000, self.max))
+                    break
+        return result
+
+    def summary(self) -> dict[str, float]:
+        """
+        Сводка в миллисекундах.
+        """
+        return {
+            "count": self.count,
+            "mean": round(self.mean * 1000, 3),
+            "p50": round(self.percentile(50) * 1000, 3),
+            "p90": round(self.percentile(90) * 1000, 3),
+            "p99": round(self.percentile(99) * 1000, 3),
+            "max": round(self.max * 1000, 3),
+        }
+
+
+class SampleRing:
+    """
+    Кольцевой буфер последних ``size`` снимков статистики.
+
+    Пишет один поток (loop бота), читать можно из любого без локов: запись —
+    это присвоение в заранее выделенный слот и сдвиг счётчика ``written``,
+    а читатель берёт счётчик и слоты до него. Память и стоимость чтения не
+    зависят от того, сколько снимков уже записано.
+    """
+
+    def __init__(self, size: int = 120):
+        if size < 1:
+            raise ValueError("Ring size must be positive")
+        self.size = size
+        self.written = 0
+        self.__slots: list = [None] * size
+
+    def __len__(self):
+        return min(self.written, self.size)
+
+    def append(self, sample):
+        self.__slots[self.written % self.size] = sample
+        self.written += 1
+
+    def latest(self):
+        written = self.written
+        return self.__slots[(written - 1) % self.size] if written else None
+
+    def last(self, count: int | None = None) -> list:
+        """
+        Последние ``count`` снимков (по умолчанию все), от старых к новым.
+        """
+        written = self.written
+        count = min(written, self.size if count is None else count, self.size)
+        slots = self.__slots
+        return [slots[i % self.size] for i in range(written - count, written)]
+
+
+class LoopLagMonitor:
+    """
+    Раз в ``interval`` секунд засыпает на таймере и записывает, на сколько
+    позже положенного проснулся. Большая задержка значит, что event loop
+    чем-то занят и команды ждут.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        histogram: Histogram,
+        interval: float = 0.1,
+    ):
+        self.loop = loop
+        self.histogram = histogram
+        self.interval = interval
+        self.__task: asyncio.Task | None = None
+
+    def start(self):
+        if self.__task is None:
+            self.__task = self.loop.create_task(self.__run())
+
+    def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+    async def __run(self):
+        interval = self.interval
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.histogram.record(time.perf_counter() - start - interval)
+
+
+class Timings:
+    """
+    Гистограммы задержек по этапам команды (см. ``STAGES``) и задержки
+    event loop'а.
+
+    ``origin`` — время прихода команды, которая выполняется прямо сейчас.
+    Dispatcher ставит его на время выполнения действия, а InputPipeline
+    по нему считает этап ``total``.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        lag_interval: float = 0.1,
+        report_interval: float | None = None,
+    ):
+        self.loop = loop
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.loop_lag = Histogram()
+        self.lag_monitor = LoopLagMonitor(loop, self.loop_lag, lag_interval)
+        self.report_interval = report_interval
+        self.origin: float | None = None
+
+        self.__report_handle: asyncio.TimerHandle | None = None
+
+    def start(self):
+        self.lag_monitor.start()
+        if self.report_interval and self.__report_handle is None:
+            self.__report_handle = self.loop.call_later(
+                self.report_interval, self.__report
+            )
+
+    def stop(self):
+        self.lag_monitor.stop()
+        if self.__report_handle is not None:
+            self.__report_handle.cancel()
+            self.__report_handle = None
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage].record(seconds)
+
+    def reset(self):
+        for histogram in self.stages.values():
+            histogram.reset()
+        self.loop_lag.reset()
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        snapshot = {
+            stage: histogram.summary() for stage, histogram in self.stages.items()
+        }
+        snapshot["loop_lag"] = self.loop_lag.summary()
+        return snapshot
+
+    def __report(self):
+        self.__report_handle = self.loop.call_later(self.report_interval, self.__report)
+        for name, summary in self.snapshot().items():
+            if summary["count"]:
+                log.info(
+                    "%s: n=%d p50=%.1fms p99=%.1fms max=%.1fms",
+                    name,
+                    summary["count"],
+                    summary["p50"],
+                    summary["p99"],
+                    summary["max"],
+                )
@@ -0,0 +1,96 @@
+import time
+from typing import Hashable
+
+
+class VoteCounter:
+    """
+    Скользящее окно голосов на кольце из ``buckets`` счётчиков.
+
+    Окно ``time_window`` делится на равные корзины, память не зависит от того,
+    сколько голосов пришло. Голос выпадает из окна вместе со своей корзиной,
+    поэтому точность окна — ``time_window / buckets``.
+
+    Если ``unique_users`` включен, каждый зритель учитывается не больше
+    одного раза за окно.
+    """
+
+    def __init__(
+        self,
+        time_window: int | float,
+        required_votes: int = 0,
+        buckets: int = 20,
+        unique_users: bool = False,
+    ):
+        self.time_window = time_window
+        self.required_votes = required_votes
+        self.buckets = buckets
+        self.unique_users = unique_users
+
+        self.__width = time_window / buckets
+        self.__counts = [0] * buckets
+        self.__epochs = [0] * buckets
+        self.__total = 0
+        self.__head = 0
+        # Для unique_users: зритель -> номер корзины, в которой он голосовал
+        self.__seen: dict[Hashable, int] = {}
+        self.__voters: list[set] = [set() for _ in range(buckets)]
+
+    def __len__(self):
+        return self.count()
+
+    def add(
+        self, user: Hashable | None = None, now: float | None = None, votes: int = 1
+    ) -> int:
+        """
+        Добавляет ``votes`` голосов зрителя, с ``unique_users`` — один.
+        Возвращает, сколько голосов учтено: 0, если зритель уже голосовал.
+        """
+        index = self.__advance(now)
+        slot = index % self.buckets
+
+        if self.unique_users and user is not None:
+            last = self.__seen.get(user)
+            if last is not None and last > index - self.buckets:
+                return 0
+            self.__seen[user] = index
+            self.__voters[slot].add(user)
+            votes = 1
+
+        self.__counts[slot] += votes
+        self.__total += votes
+        return votes
+
+    def count(self, now: float | None = None) -> int:
+        self.__advance(now)
+        return self.__total
+
+    def clear(self):
+        for slot in range(self.buckets):
+            self.__counts[slot] = 0
+            self.__voters[slot].clear()
+        self.__seen.clear()
+        self.__total = 0
+
+    def __advance(self, now: float | None) -> int:
+        if now is None:
+            now = time.monotonic()
+        index = int(now // self.__width)
+        head = self.__head
+        if index == head:
+            return index
+
+        # Обнуляем корзины, которые выпали из окна, но не больше одного круга
+        for old in range(max(head + 1, index - self.buckets + 1), index + 1):
+            slot = old % self.buckets
+            self.__total -= self.__counts[slot]
+            self.__counts[slot] = 0
+            if self.__voters[slot]:
+                epoch = self.__epochs[slot]
+                for user in self.__voters[slot]:
+                    if self.__seen.get(user) == epoch:
+                        del self.__seen[user]
+                self.__voters[slot].clear()
+            self.__epochs[slot] = old
+
+        self.__head = index
+        return index
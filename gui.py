@@ -1,7 +1,7 @@
 import sys
 import os
 import json
-import threading
+from concurrent.futures import ThreadPoolExecutor
 import psutil
 from PyQt6.QtWidgets import (
     QApplication,
@@ -20,54 +20,174 @@ from PyQt6.QtWidgets import (
     QGroupBox,
     QSpinBox,
     QDoubleSpinBox,
+    QGridLayout,
 )
-from PyQt6.QtCore import pyqtSignal, QObject, Qt
-from PyQt6.QtGui import QFont
+from PyQt6.QtCore import QPointF, Qt, QTimer
+from PyQt6.QtGui import QColor, QFont, QPainter, QPen, QPolygonF
 
 # Add backend dir to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from bot import Bot, Keys
+from bot import BotHost, Keys, ProfileError
 
 CONFIG_FILE = "config.json"
+# Как часто GUI читает статистику бота, мс. Бот собирает снимки с той же
+# частотой, так что перерисовка не зависит от нагрузки в чате
+STATS_POLL_MS = 250
+# Сколько снимков показывают графики (30 секунд) и сколько команд на дашборде
+SPARKLINE_SAMPLES = 120
+DASHBOARD_COMMANDS = 8
+
+
+# Как часто список процессов обновляется сам, мс
+PROCESS_REFRESH_MS = 5000
+
+
+def visible_window_pids():
+    """
+    PID процессов, у которых есть видимое окно с заголовком, или None,
+    если ОС так не умеет (не Windows).
+    """
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    from ctypes import wintypes
+
+    user32 = ctypes.windll.user32
+    pids = set()
+
+    @ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+    def callback(hwnd, _):
+        if user32.IsWindowVisible(hwnd) and user32.GetWindowTextLengthW(hwnd):
+            pid = wintypes.DWORD()
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            pids.add(pid.value)
+        return True
+
+    user32.EnumWindows(callback, 0)
+    return pids
+
+
+class ProcessScanner:
+    """
+    Список процессов для выбора игры. Работает в фоновом потоке GUI.
+
+    Имена кэшируются по PID и времени запуска процесса, так что при
+    обновлении psutil спрашивается только про новые процессы, а PID,
+    который система отдала другому процессу, не покажет старое имя.
+    Завершившиеся процессы выкидываются из кэша.
+    На Windows остаются только процессы с видимыми окнами, иначе — все .exe.
+    """
 
+    def __init__(self):
+        # (pid, время запуска) -> имя или None, если имя узнать не удалось
+        self.names: dict[tuple[int, float | None], str | None] = {}
+
+    def scan(self):
+        current: dict[int, str | None] = {}
+        names = {}
+        for pid in psutil.pids():
+            try:
+                proc = psutil.Process(pid)
+            except psutil.NoSuchProcess:
+                continue
+            try:
+                key = (pid, proc.create_time())
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                key = (pid, None)
+            if key in self.names:
+                name = self.names[key]
+            else:
+                try:
+                    name = proc.name()
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    name = None
+            names[key] = current[pid] = name
+        self.names = names
+
+        windowed = visible_window_pids()
+        if windowed is None:
+            return sorted(
+                {name for name in current.values() if name and name.endswith(".exe")}
+            )
+        return sorted(
+            {current[pid] for pid in windowed & current.keys() if current[pid]}
+        )
 
-class BotWorker(QObject):
-    finished = pyqtSignal()
-    error = pyqtSignal(str)
-
-    def __init__(self, channel, process_name, command_mappings):
-        super().__init__()
-        self.channel = channel
-        self.process_name = process_name
-        self.command_mappings = command_mappings
-        self.bot = None
-
-    def run(self):
-        try:
-            self.bot = Bot(self.channel, self.process_name)
-
-            # Register loaded commands
-            for mapping in self.command_mappings:
-                cmd = mapping["command"].split(",")
-                cmd = [c.strip() for c in cmd]
-                key = mapping["key"]
-                duration = mapping["duration"]
-                cooldown = mapping.get("cooldown", 0)
-
-                # Use basic press_key. Advanced users might want mouse movement etc.,
-                # but we'll map basic keys for now.
-                self.bot.press_key(cmd, key, duration=duration, cooldown=cooldown)
-
-            self.bot.run()
-        except Exception as e:
-            self.error.emit(str(e))
-        finally:
-            self.finished.emit()
 
-    def stop(self):
-        if self.bot and self.bot.loop:
-            self.bot.loop.call_soon_threadsafe(self.bot.loop.stop)
+# Кнопки мыши в таблице хранятся как Keys.LMB/RMB, а в профиле — отдельным типом
+MOUSE_BUTTON_TYPES = {Keys.LMB: "left_mouse_button", Keys.RMB: "right_mouse_button"}
+
+
+def mapping_to_command(mapping):
+    command = {
+        "type": MOUSE_BUTTON_TYPES.get(mapping["key"], "press"),
+        "commands": [c.strip() for c in mapping["command"].split(",") if c.strip()],
+        "duration": mapping["duration"],
+        "cooldown": mapping.get("cooldown", 0),
+    }
+    if command["type"] == "press":
+        command["key"] = mapping["key"]
+    return command
+
+
+def command_to_mapping(command):
+    """
+    Строка таблицы для команды профиля или None, если таблица её не покажет.
+    """
+    kind = command.get("type")
+    keys = {v: k for k, v in MOUSE_BUTTON_TYPES.items()}
+    if kind == "press":
+        key = command.get("key")
+    elif kind in keys:
+        key = keys[kind]
+    else:
+        return None
+    commands = command.get("commands", [])
+    if isinstance(commands, list):
+        commands = ", ".join(commands)
+    cooldown = command.get("cooldown", 0)
+    if not isinstance(key, str) or not isinstance(cooldown, (int, float)):
+        return None
+    return {
+        "command": commands,
+        "key": key,
+        "duration": command.get("duration") or 0.0,
+        "cooldown": cooldown,
+    }
+
+
+class Sparkline(QWidget):
+    """
+    Маленький график частоты команды без осей и подписей.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.values = []
+        self.setMinimumSize(160, 24)
+
+    def set_values(self, values):
+        self.values = values
+        self.update()
+
+    def paintEvent(self, event):
+        if len(self.values) < 2:
+            return
+        width, height = self.width() - 1, self.height() - 2
+        top = max(self.values) or 1
+        step = width / (SPARKLINE_SAMPLES - 1)
+        offset = width - step * (len(self.values) - 1)
+        line = QPolygonF(
+            [
+                QPointF(offset + i * step, 1 + height - value / top * height)
+                for i, value in enumerate(self.values)
+            ]
+        )
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QPen(QColor("#4CAF50"), 1.5))
+        painter.drawPolyline(line)
 
 
 class TwitchPlaysGUI(QMainWindow):
@@ -75,8 +195,16 @@ class TwitchPlaysGUI(QMainWindow):
         super().__init__()
         self.setWindowTitle("TwitchPlays Controller")
         self.setMinimumSize(800, 600)
-        self.bot_thread = None
-        self.bot_worker = None
+        self.host = None
+        self.process_scanner = ProcessScanner()
+        self.process_executor = ThreadPoolExecutor(1)
+        self.process_scan = None
+        self.processes = []
+        # Настройки и команды профиля, которые GUI не показывает, но сохраняет
+        self.extra_settings = {}
+        self.extra_commands = []
+        # Секция bot, с которой запущен бот: перезагрузка её не применяет
+        self.running_settings = {}
 
         # Setup UI
         self.central_widget = QWidget()
@@ -86,8 +214,25 @@ class TwitchPlaysGUI(QMainWindow):
         self._setup_settings_panel()
         self._setup_mappings_panel()
         self._setup_control_panel()
+        self._setup_dashboard_panel()
+
+        # Фоновый список процессов: таймер обновления и проверка результата,
+        # которая работает только пока идёт сканирование
+        self.process_refresh_timer = QTimer(self)
+        self.process_refresh_timer.setInterval(PROCESS_REFRESH_MS)
+        self.process_refresh_timer.timeout.connect(self.populate_processes)
+        self.process_refresh_timer.start()
+        self.process_poll_timer = QTimer(self)
+        self.process_poll_timer.setInterval(50)
+        self.process_poll_timer.timeout.connect(self.poll_processes)
+
+        # Статистика читается по таймеру в потоке GUI, поток бота её не ждёт
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(STATS_POLL_MS)
+        self.stats_timer.timeout.connect(self.poll_bot)
 
         self.load_settings()
+        self.populate_processes()
 
     def _setup_settings_panel(self):
         group_box = QGroupBox("Bot Settings")
@@ -117,7 +262,6 @@ class TwitchPlaysGUI(QMainWindow):
         layout.addLayout(process_layout)
         group_box.setLayout(layout)
         self.main_layout.addWidget(group_box)
-        self.populate_processes()
 
     def _setup_mappings_panel(self):
         group_box = QGroupBox("Command Mappings")
@@ -239,30 +383,142 @@ class TwitchPlaysGUI(QMainWindow):
         self.stop_btn.setEnabled(False)
         self.stop_btn.clicked.connect(self.stop_bot)
 
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setMinimumHeight(40)
+        self.pause_btn.setCheckable(True)
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.toggled.connect(self.toggle_pause)
+
         self.save_btn = QPushButton("Save Settings")
         self.save_btn.setMinimumHeight(40)
         self.save_btn.clicked.connect(self.save_settings)
 
         layout.addWidget(self.start_btn)
         layout.addWidget(self.stop_btn)
+        layout.addWidget(self.pause_btn)
         layout.addWidget(self.save_btn)
 
         self.main_layout.addLayout(layout)
 
-    def populate_processes(self):
-        current_text = self.process_combo.currentText()
-        self.process_combo.clear()
+        self.status_label = QLabel("Bot is not running")
+        self.main_layout.addWidget(self.status_label)
 
-        processes = set()
-        for p in psutil.process_iter(["name"]):
-            name = p.info["name"]
-            if name and name.endswith(".exe"):
-                processes.add(name)
+    def _setup_dashboard_panel(self):
+        group_box = QGroupBox("Live")
+        layout = QVBoxLayout()
 
-        self.process_combo.addItems(sorted(list(processes)))
+        grid = QGridLayout()
+        self.command_rows = []
+        for row in range(DASHBOARD_COMMANDS):
+            name = QLabel()
+            sparkline = Sparkline()
+            rate = QLabel()
+            rate.setMinimumWidth(60)
+            rate.setAlignment(Qt.AlignmentFlag.AlignRight)
+            grid.addWidget(name, row, 0)
+            grid.addWidget(sparkline, row, 1)
+            grid.addWidget(rate, row, 2)
+            self.command_rows.append((name, sparkline, rate))
+        grid.setColumnStretch(1, 1)
+        layout.addLayout(grid)
+
+        self.votes_label = QLabel()
+        self.held_label = QLabel()
+        self.mouse_label = QLabel()
+        for label in (self.votes_label, self.held_label, self.mouse_label):
+            layout.addWidget(label)
 
-        if current_text:
-            self.process_combo.setCurrentText(current_text)
+        group_box.setLayout(layout)
+        self.main_layout.addWidget(group_box)
+        self.clear_dashboard()
+
+    def update_dashboard(self, samples):
+        stats = samples[-1]
+        # Самые частые команды за всё окно графиков, не только за последний снимок
+        totals = {}
+        for sample in samples:
+            for command, rate in sample["command_rates"].items():
+                totals[command] = totals.get(command, 0.0) + rate
+        top = sorted(totals, key=totals.get, reverse=True)[:DASHBOARD_COMMANDS]
+
+        for i, (name, sparkline, rate) in enumerate(self.command_rows):
+            if i < len(top):
+                command = top[i]
+                name.setText(f"!{command}")
+                sparkline.set_values(
+                    [sample["command_rates"].get(command, 0.0) for sample in samples]
+                )
+                rate.setText(f"{stats['command_rates'].get(command, 0.0):.1f}/s")
+            else:
+                name.setText("")
+                sparkline.set_values([])
+                rate.setText("")
+
+        votes = ", ".join(
+            f"{key} {count}/{required}"
+            for key, (count, required) in stats["votes"].items()
+        )
+        self.votes_label.setText(f"Votes: {votes or '-'}")
+        held = ", ".join(
+            f"{key} {remaining:.1f}s" for key, remaining in stats["held_keys"].items()
+        )
+        self.held_label.setText(f"Held keys: {held or '-'}")
+        dx, dy = stats["mouse"]
+        self.mouse_label.setText(f"Mouse pending: {dx:+.0f}, {dy:+.0f}")
+
+    def clear_dashboard(self):
+        for name, sparkline, rate in self.command_rows:
+            name.setText("")
+            sparkline.set_values([])
+            rate.setText("")
+        self.votes_label.setText("Votes: -")
+        self.held_label.setText("Held keys: -")
+        self.mouse_label.setText("Mouse pending: -")
+
+    def populate_processes(self):
+        # Уже сканируем: результат подхватит poll_processes
+        if self.process_scan is not None:
+            return
+        self.process_scan = self.process_executor.submit(self.process_scanner.scan)
+        self.process_poll_timer.start()
+
+    def poll_processes(self):
+        scan = self.process_scan
+        if scan is None or not scan.done():
+            return
+        self.process_scan = None
+        self.process_poll_timer.stop()
+        try:
+            processes = scan.result()
+        except Exception as e:
+            print(f"Failed to list processes: {e}")
+            return
+        if processes == self.processes:
+            return
+        combo = self.process_combo
+        # Пока в поле печатают или открыт список, не трогаем его:
+        # список обновится при следующем сканировании
+        if combo.hasFocus() or combo.view().isVisible():
+            return
+        old_processes, self.processes = self.processes, processes
+
+        # Одним обновлением, без перерисовки и сигналов на каждый элемент
+        current_text = combo.currentText()
+        combo.setUpdatesEnabled(False)
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItems(processes)
+        index = combo.findText(current_text)
+        if index >= 0:
+            combo.setCurrentIndex(index)
+        elif current_text not in old_processes:
+            # Введённое вручную (например, ещё не запущенная игра) оставляем,
+            # а процесс из списка, который закрылся, — нет
+            combo.setEditText(current_text)
+        else:
+            combo.setCurrentIndex(-1)
+        combo.blockSignals(False)
+        combo.setUpdatesEnabled(True)
 
     def add_mapping(self):
         cmds = self.new_cmd_input.text().strip()
@@ -318,18 +574,62 @@ class TwitchPlaysGUI(QMainWindow):
             )
         return mappings
 
-    def save_settings(self):
-        data = {
+    def bot_settings(self) -> dict:
+        return {
+            **self.extra_settings,
             "channel": self.channel_input.text(),
             "process": self.process_combo.currentText(),
-            "mappings": self.get_all_mappings(),
+        }
+
+    def write_settings(self) -> bool:
+        """
+        Пишет настройки в config.json без сообщения об успехе.
+        Возвращает False и показывает ошибку, если записать не удалось.
+        """
+        data = {
+            "bot": self.bot_settings(),
+            "commands": [mapping_to_command(m) for m in self.get_all_mappings()]
+            + self.extra_commands,
         }
         try:
             with open(CONFIG_FILE, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=4, ensure_ascii=False)
-            QMessageBox.information(self, "Success", "Settings saved successfully!")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save settings: {e}")
+            return False
+        return True
+
+    def save_settings(self):
+        if not self.write_settings():
+            return
+        if self.host is None or not self.host.running:
+            QMessageBox.information(self, "Success", "Settings saved successfully!")
+            return
+        # Бот уже работает: команды подменяются на лету, без переподключения
+        # к чату. Секция bot (канал, процесс, бэкенд, воркеры...) меняется
+        # только перезапуском
+        try:
+            self.host.reload(CONFIG_FILE)
+        except ProfileError as e:
+            QMessageBox.critical(self, "Error", f"Commands were not applied: {e}")
+            return
+        settings = self.bot_settings()
+        changed = sorted(
+            name
+            for name in settings.keys() | self.running_settings.keys()
+            if settings.get(name) != self.running_settings.get(name)
+        )
+        if changed:
+            QMessageBox.information(
+                self,
+                "Restart required",
+                "Commands were applied to the running bot, but these settings "
+                f"take effect only after a restart: {', '.join(changed)}.",
+            )
+            return
+        QMessageBox.information(
+            self, "Success", "Settings saved and applied to the running bot!"
+        )
 
     def load_settings(self):
         if not os.path.exists(CONFIG_FILE):
@@ -338,13 +638,25 @@ class TwitchPlaysGUI(QMainWindow):
             with open(CONFIG_FILE, "r", encoding="utf-8") as f:
                 data = json.load(f)
 
-            if "channel" in data:
-                self.channel_input.setText(data["channel"])
-            if "process" in data:
-                self.process_combo.setCurrentText(data["process"])
+            settings = data.get("bot", data)
+            if "channel" in settings:
+                self.channel_input.setText(settings["channel"])
+            if "process" in settings:
+                self.process_combo.setCurrentText(settings["process"])
+            if "bot" in data:
+                self.extra_settings = {
+                    k: v for k, v in settings.items() if k not in ("channel", "process")
+                }
 
-            if "mappings" in data:
-                for item in data["mappings"]:
+            mappings = data.get("mappings", [])
+            for command in data.get("commands", []):
+                mapping = command_to_mapping(command)
+                if mapping is None:
+                    self.extra_commands.append(command)
+                else:
+                    mappings.append(mapping)
+            if mappings:
+                for item in mappings:
                     self._add_mapping_row(
                         item["command"],
                         item["key"],
@@ -378,35 +690,87 @@ class TwitchPlaysGUI(QMainWindow):
             if reply == QMessageBox.StandardButton.No:
                 return
 
+        # Бот читает настройки из config.json, поэтому без сохранения
+        # он запустился бы со старыми
+        if not self.write_settings():
+            return
+        self.running_settings = self.bot_settings()
+
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
-        self.save_settings()
+        self.pause_btn.setEnabled(True)
 
-        self.bot_thread = threading.Thread(
-            target=self._run_bot_thread, args=(channel, process, mappings)
+        # Профиль проверяется и компилируется один раз, дальше берётся
+        # из кэша рядом с config.json, пока файл не изменится
+        self.host = BotHost.from_profile(
+            CONFIG_FILE, stats_interval=STATS_POLL_MS / 1000, history=SPARKLINE_SAMPLES
         )
-        self.bot_thread.daemon = True
-        self.bot_thread.start()
-
-    def _run_bot_thread(self, channel, process, mappings):
-        self.bot_worker = BotWorker(channel, process, mappings)
-        self.bot_worker.error.connect(self.on_bot_error)
-        self.bot_worker.finished.connect(self.on_bot_finished)
-        self.bot_worker.run()
+        self.shown_samples = 0
+        self.host.start()
+        self.stats_timer.start()
 
     def stop_bot(self):
-        if self.bot_worker:
-            self.bot_worker.stop()
+        if self.host is not None:
+            # Бот отпустит клавиши и отключится от чата в своём потоке,
+            # poll_bot заметит, когда он остановится
+            self.host.stop()
         self.stop_btn.setEnabled(False)
+        self.pause_btn.setEnabled(False)
 
-    def on_bot_error(self, err_msg):
-        QMessageBox.critical(self, "Bot Error", f"An error occurred:\n{err_msg}")
+    def toggle_pause(self, paused):
+        if self.host is None:
+            return
+        if paused:
+            self.host.pause()
+        else:
+            self.host.resume()
+
+    def poll_bot(self):
+        host = self.host
+        if host is None:
+            return
+        if not host.running:
+            self.on_bot_finished()
+            return
+        history = host.history
+        if history.written == self.shown_samples:
+            if not history.written:
+                self.status_label.setText("Starting...")
+            return
+        self.shown_samples = history.written
+        samples = history.last()
+        stats = samples[-1]
+        self.status_label.setText(
+            f"{stats['mode'].capitalize()}"
+            f"{' (paused)' if stats['paused'] else ''} | "
+            f"{stats['messages_per_second']:.0f} msg/s | "
+            f"{stats['commands_per_second']:.0f} cmd/s | "
+            f"latency p50 {stats['latency_p50_ms']:.0f} ms, "
+            f"p99 {stats['latency_p99_ms']:.0f} ms | "
+            f"held: {', '.join(stats['held_keys']) or '-'}"
+        )
+        self.update_dashboard(samples)
 
     def on_bot_finished(self):
+        self.stats_timer.stop()
+        error = self.host.error
+        self.host = None
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
-        self.bot_thread = None
-        self.bot_worker = None
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.setChecked(False)
+        self.status_label.setText("Bot is not running")
+        self.clear_dashboard()
+        if error is not None:
+            QMessageBox.critical(self, "Bot Error", f"An error occurred:\n{error}")
+
+    def closeEvent(self, event):
+        self.process_refresh_timer.stop()
+        self.process_executor.shutdown(wait=False, cancel_futures=True)
+        if self.host is not None:
+            self.host.stop()
+            self.host.join(5)
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+import pytest
+
+from bot.cooldown import Cooldown, CooldownStore, Scope
+
+
+def test_scope_keys():
+    assert Cooldown(5).key(1, "#a", "u") == (Scope.USER_COMMAND, 1, "#a", "u")
+    assert Cooldown(5, Scope.USER).key(1, "#a", "u") == (Scope.USER, None, "#a", "u")
+    assert Cooldown(5, Scope.COMMAND).key(1, "#a", "u") == (
+        Scope.COMMAND,
+        1,
+        "#a",
+        None,
+    )
+    assert Cooldown(5, Scope.CHANNEL).key(1, "#a", "u") == (
+        Scope.CHANNEL,
+        None,
+        "#a",
+        None,
+    )
+    assert Cooldown(5, Scope.GLOBAL).key(1, "#a", "u") == (Scope.GLOBAL, 1, None, None)
+    # Скоуп канала заменяет скоуп команды
+    assert Cooldown(5).key(1, "#a", "u", Scope.CHANNEL)[0] == Scope.CHANNEL
+    with pytest.raises(ValueError):
+        Cooldown(5, "team").key(1, "#a", "u")
+
+
+def test_per_user():
+    assert Cooldown(5).per_user()
+    assert Cooldown(5, Scope.USER).per_user()
+    assert not Cooldown(5, Scope.COMMAND).per_user()
+    assert not Cooldown(5).per_user(Scope.GLOBAL)
+
+
+def test_scopes_share_or_split_cooldown():
+    store = CooldownStore()
+    per_user = Cooldown(5)
+    per_command = Cooldown(5, Scope.COMMAND)
+
+    assert store.try_acquire(per_user.key(1, "#a", "alice"), 5, now=0)
+    assert store.try_acquire(per_user.key(1, "#a", "bob"), 5, now=0)
+    assert not store.try_acquire(per_user.key(1, "#a", "alice"), 5, now=1)
+
+    assert store.try_acquire(per_command.key(1, "#a", "alice"), 5, now=0)
+    assert not store.try_acquire(per_command.key(1, "#a", "bob"), 5, now=1)
+    # В другом канале свой кулдаун
+    assert store.try_acquire(per_command.key(1, "#b", "bob"), 5, now=1)
+    assert store.hits == 2
+
+
+def test_expiry_and_remaining():
+    store = CooldownStore()
+    assert store.try_acquire("k", 5, now=0)
+    assert store.remaining("k", now=2) == 3
+    assert not store.try_acquire("k", 5, now=4.9)
+    assert store.try_acquire("k", 5, now=5)
+    assert store.remaining("k", now=20) == 0
+
+
+def test_sweep_drops_expired_entries():
+    store = CooldownStore(sweep_batch=2)
+    for i in range(5):
+        store.try_acquire(i, 1, now=0)
+    assert len(store) == 5
+
+    # Каждая проверка выкидывает не больше sweep_batch истёкших записей
+    store.try_acquire("new", 1, now=2)
+    assert len(store) == 4
+    assert store.sweep(now=2) == 3
+    assert len(store) == 1
+
+    store.clear()
+    assert len(store) == 0
+    assert store.try_acquire("new", 1, now=2)
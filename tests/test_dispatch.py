@@ -0,0 +1,110 @@
+import asyncio
+
+from bot.actions import Action
+from bot.backends import KEY_PRESS, RecordingBackend
+from bot.controller import Controller
+from bot.cooldown import Cooldown, Scope
+from bot.democracy import Democracy
+from bot.dispatch import Dispatcher
+
+
+def _dispatcher():
+    loop = asyncio.get_running_loop()
+    paused = asyncio.Event()
+    backend = RecordingBackend(active_process="*")
+    controller = Controller(loop, paused, backend=backend)
+    dispatcher = Dispatcher(
+        loop,
+        paused,
+        controller.focus,
+        "*",
+        Democracy(loop),
+        threadsafe=False,
+        controller=controller,
+    )
+    return dispatcher, controller, backend
+
+
+async def _chat(dispatcher: Dispatcher, *commands: str):
+    for i, command in enumerate(commands):
+        dispatcher.handle(command, "#c", f"u{i}")
+    while len(dispatcher.ingress):
+        await asyncio.sleep(0)
+
+
+def test_replace_keeps_ids_of_unchanged_commands():
+    async def main():
+        dispatcher, controller, backend = _dispatcher()
+        controller.start()
+        dispatcher.register(["jump"], Action.press("space", None))
+        dispatcher.register(["e"], Action.press("e", None), Cooldown(5, Scope.COMMAND))
+        dispatcher.register(["old"], Action.press("q", None))
+        jump = dispatcher.commands["jump"].group
+        e = dispatcher.commands["e"].group
+        await _chat(dispatcher, "jump", "e", "old")
+        await asyncio.sleep(0.05)
+        assert dispatcher.accepted_groups[jump] == 1
+        version = dispatcher.version
+
+        kept, added, removed, taken = dispatcher.replace(
+            [
+                # Новые алиасы у той же команды
+                (["jump", "прыжок"], Action.press("space", None), None, False, True),
+                (
+                    ["e"],
+                    Action.press("e", None),
+                    Cooldown(5, Scope.COMMAND),
+                    False,
+                    True,
+                ),
+                (["r", "jump"], Action.press("r", None), None, False, True),
+                # Все алиасы заняты — команды нет в таблице
+                (["e"], Action.press("f", None), None, False, True),
+            ]
+        )
+        assert (kept, added, removed) == (2, 1, 1)
+        assert taken == ["jump", "e"]
+        assert dispatcher.version > version
+        assert dispatcher.commands["прыжок"].group == jump
+        assert dispatcher.commands["e"].group == e
+        assert "old" not in dispatcher
+        assert set(dispatcher.groups) == {
+            jump,
+            e,
+            dispatcher.commands["r"].group,
+        }
+        assert dispatcher.aliases() == {
+            "jump": jump,
+            "прыжок": jump,
+            "e": e,
+            "r": dispatcher.commands["r"].group,
+        }
+        # Счётчики убранных команд чистятся, у оставшихся сохраняются
+        assert set(dispatcher.accepted_groups) == {jump, e}
+
+        # Кулдаун оставшейся команды тоже сохранился
+        backend.clear()
+        await _chat(dispatcher, "прыжок", "r", "old")
+        await _chat(dispatcher, "e")
+        await asyncio.sleep(0.05)
+        await controller.shutdown()
+        assert [action[1:] for action in backend.records] == [
+            (KEY_PRESS, "space"),
+            (KEY_PRESS, "r"),
+        ]
+
+    asyncio.run(main())
+
+
+def test_replace_drops_queued_group():
+    async def main():
+        dispatcher, _, _ = _dispatcher()
+        dispatcher.register(["a"], Action.press("a", None))
+        group = dispatcher.commands["a"].group
+        dispatcher.replace([])
+        # Команда пришла из другого процесса уже после замены таблицы
+        assert not dispatcher.handle_id(group, "#c", "u")
+        assert dispatcher.rejected["unknown"] == 1
+        assert len(dispatcher) == 0
+
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import asyncio
+
+from bot.ingress import IngressQueue
+
+
+async def _drain(queue: IngressQueue):
+    while len(queue):
+        await asyncio.sleep(0)
+
+
+def _queue(**kwargs):
+    calls = []
+
+    def handler(item, arg, received, count):
+        calls.append((item, arg, count))
+
+    queue = IngressQueue(
+        asyncio.get_running_loop(), handler, threadsafe=False, **kwargs
+    )
+    return queue, calls
+
+
+def test_drop_oldest_when_full():
+    async def main():
+        queue, calls = _queue(maxsize=2)
+        for item in ("a", "b", "c"):
+            queue.push(item)
+        await _drain(queue)
+
+        assert [item for item, _, _ in calls] == ["b", "c"]
+        assert queue.dropped == 1
+        assert queue.dropped_by == {None: 1}
+        assert queue.processed == 2
+
+    asyncio.run(main())
+
+
+def test_merge_consecutive_commands():
+    async def main():
+        queue, calls = _queue()
+        queue.push("w", "u1", mergeable=True)
+        queue.push("w", "u2", mergeable=True)
+        queue.push("w", "u3", mergeable=True, count=3)
+        queue.push("a", "u4", mergeable=True)
+        queue.push("w", "u5", mergeable=True)
+        await _drain(queue)
+
+        # Склеиваются только команды подряд, аргумент остаётся от первой
+        assert calls == [("w", "u1", 5), ("a", "u4", 1), ("w", "u5", 1)]
+        assert queue.merged == 4
+        assert queue.received == queue.processed == 7
+
+    asyncio.run(main())
+
+
+def test_not_mergeable_commands_stay_apart():
+    async def main():
+        queue, calls = _queue()
+        queue.push("w", "u1")
+        queue.push("w", "u2")
+        await _drain(queue)
+        assert calls == [("w", "u1", 1), ("w", "u2", 1)]
+
+    asyncio.run(main())
+
+
+def test_weighted_round_robin():
+    async def main():
+        queue, calls = _queue(batch=3, weights={"big": 2})
+        sources = {}
+        for i in range(6):
+            for source in ("big", "small"):
+                item = f"{source}{i}"
+                sources[item] = source
+                queue.push(item, source=source)
+        await _drain(queue)
+
+        order = [sources[item] for item, _, _ in calls]
+        # За каждый круг канал с весом 2 выполняет две команды, с весом 1 — одну
+        assert order[:6] == ["big", "big", "small"] * 2
+        assert queue.processed_by == {"big": 6, "small": 6}
+        # Внутри канала порядок сохраняется
+        assert [item for item, _, _ in calls if sources[item] == "small"] == [
+            f"small{i}" for i in range(6)
+        ]
+
+    asyncio.run(main())
+
+
+def test_handler_error_does_not_stop_queue():
+    async def main():
+        calls = []
+
+        def handler(item, arg, received, count):
+            calls.append(item)
+            if item == "bad":
+                raise RuntimeError(item)
+
+        queue = IngressQueue(asyncio.get_running_loop(), handler, threadsafe=False)
+        queue.push("bad")
+        queue.push("good")
+        await _drain(queue)
+        assert calls == ["bad", "good"]
+        assert queue.processed == 2
+
+    asyncio.run(main())
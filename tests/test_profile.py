@@ -0,0 +1,128 @@
+import json
+import pickle
+
+import pytest
+
+from bot.actions import PRESS, VOTE
+from bot.controller import Keys
+from bot.cooldown import Cooldown, Scope
+from bot.profile import CACHE_SUFFIX, ProfileError, compile_profile, load_profile
+
+
+def _vote(commands, **fields):
+    return {
+        "type": "vote",
+        "commands": commands,
+        "key": "tab",
+        "required_votes": 3,
+        "time_window": 5,
+        **fields,
+    }
+
+
+@pytest.mark.parametrize(
+    "data, error",
+    [
+        ([], "profile: expected an object"),
+        ({"process": "x"}, "profile: unknown sections process"),
+        ({"commands": {}}, "commands: expected a list"),
+        ({"commands": [{"type": "jump"}]}, "commands[0].type: unknown type 'jump'"),
+        (
+            {"commands": [{"type": "press", "commands": ["a"], "key": "a", "x": 1}]},
+            "commands[0]: unknown fields x",
+        ),
+        ({"commands": [{"type": "press", "commands": ["a"]}]}, "commands[0].key"),
+        (
+            {"commands": [{"type": "press", "commands": [], "key": "a"}]},
+            "commands[0]: no commands",
+        ),
+        (
+            {
+                "commands": [
+                    {"type": "press", "commands": ["a"], "key": "a", "cooldown": -1}
+                ]
+            },
+            "commands[0].cooldown: must not be negative",
+        ),
+        (
+            {
+                "commands": [
+                    {
+                        "type": "mouse",
+                        "commands": ["u"],
+                        "direction": "upp",
+                        "amount": 1,
+                    }
+                ]
+            },
+            "commands[0].direction: unknown direction 'upp'",
+        ),
+        ({"bot": {"mouse_curve": "zigzag"}}, "bot.mouse_curve: unknown curve"),
+        ({"bot": {"workers": "2"}}, "bot.workers: unexpected '2'"),
+        (
+            {"commands": [_vote(["a"]), _vote(["b"], required_votes=4)]},
+            "commands[1].key: 'tab' is already voted for in commands[0]",
+        ),
+        (
+            {"commands": [_vote(["a"]), _vote(["b"], one_vote_per_user=True)]},
+            "commands[1].key",
+        ),
+    ],
+)
+def test_invalid_profiles(data, error):
+    with pytest.raises(ProfileError) as info:
+        compile_profile(data)
+    assert str(info.value).startswith(error)
+
+
+def test_compile_entries():
+    profile = compile_profile(
+        {
+            "bot": {"channel": "c", "process": "*", "cooldown": 2},
+            "commands": [
+                {
+                    "type": "press",
+                    "commands": ["jump", "прыжок"],
+                    "key": "space",
+                    "duration": 0.1,
+                    "cooldown": {"seconds": 5, "scope": "channel"},
+                },
+                # Тот же ключ с теми же настройками голосования — можно
+                _vote(["a"]),
+                _vote(["b"], duration=1),
+            ],
+        }
+    )
+    assert profile.settings["channel"] == "c"
+    assert profile.settings["cooldown"] == 2
+
+    commands, action, cooldown, democratic = profile.entries[0]
+    assert list(commands) == ["jump", "прыжок"]
+    assert (action.kind, action.key, action.duration) == (PRESS, Keys.SPACE, 0.1)
+    assert cooldown == Cooldown(5, Scope.CHANNEL)
+    assert democratic
+    assert [entry[1].kind for entry in profile.entries[1:]] == [VOTE, VOTE]
+
+
+def test_load_profile_cache(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(
+        json.dumps({"commands": [{"type": "press", "commands": ["a"], "key": "a"}]}),
+        encoding="utf-8",
+    )
+    cache = str(path) + CACHE_SUFFIX
+
+    profile = load_profile(str(path))
+    with open(cache, "rb") as file:
+        assert pickle.load(file).digest == profile.digest
+    assert load_profile(str(path)).digest == profile.digest
+
+    # Битый кэш — промах, профиль собирается заново
+    with open(cache, "wb") as file:
+        file.write(b"garbage")
+    assert load_profile(str(path)).digest == profile.digest
+
+    path.write_text(json.dumps({"commands": []}), encoding="utf-8")
+    changed = load_profile(str(path))
+    assert changed.digest != profile.digest
+    assert changed.entries == []
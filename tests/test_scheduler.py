@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from bot.backends import KEY_DOWN, KEY_UP, RecordingBackend
+from bot.controller import Controller
+from bot.scheduler import ReleaseScheduler
+
+
+def test_release_after_deadline():
+    async def main():
+        released = []
+        scheduler = ReleaseScheduler(asyncio.get_running_loop(), released.append)
+        scheduler.schedule("w", time.time() + 0.05)
+        assert "w" in scheduler
+
+        await asyncio.sleep(0.02)
+        assert released == []
+        await asyncio.sleep(0.08)
+        assert released == ["w"]
+        assert len(scheduler) == 0
+
+    asyncio.run(main())
+
+
+def test_extend_moves_deadline():
+    async def main():
+        released = []
+        scheduler = ReleaseScheduler(asyncio.get_running_loop(), released.append)
+        now = time.time()
+        scheduler.schedule("w", now + 0.05)
+        scheduler.schedule("w", now + 0.15)
+
+        await asyncio.sleep(0.1)
+        assert released == []
+        await asyncio.sleep(0.1)
+        # Старая запись в куче пропускается, клавиша отпускается один раз
+        assert released == ["w"]
+
+    asyncio.run(main())
+
+
+def test_earlier_key_released_first():
+    async def main():
+        released = []
+        scheduler = ReleaseScheduler(asyncio.get_running_loop(), released.append)
+        now = time.time()
+        scheduler.schedule("a", now + 0.15)
+        scheduler.schedule("b", now + 0.05)
+
+        await asyncio.sleep(0.1)
+        assert released == ["b"]
+        await asyncio.sleep(0.1)
+        assert released == ["b", "a"]
+
+    asyncio.run(main())
+
+
+def test_cancel_and_release_all():
+    async def main():
+        released = []
+        scheduler = ReleaseScheduler(asyncio.get_running_loop(), released.append)
+        now = time.time()
+        scheduler.schedule("a", now + 0.05)
+        scheduler.schedule("b", now + 10)
+        scheduler.cancel("a")
+        scheduler.release_all()
+        assert released == ["b"]
+
+        await asyncio.sleep(0.1)
+        assert released == ["b"]
+
+    asyncio.run(main())
+
+
+async def _press(max_hold: float | None, *durations: float):
+    loop = asyncio.get_running_loop()
+    backend = RecordingBackend(active_process="*")
+    controller = Controller(loop, asyncio.Event(), max_hold=max_hold, backend=backend)
+    controller.start()
+    for duration in durations:
+        controller.press_key("w", duration)
+    await asyncio.sleep(0.3)
+    await controller.shutdown()
+    return controller, [(kind, key) for _, kind, key in backend.records], backend
+
+
+def test_controller_hold_and_extend():
+    async def main():
+        controller, actions, backend = await _press(None, 0.05, 0.1)
+        assert actions == [(KEY_DOWN, "w"), (KEY_UP, "w")]
+        held = backend.records[1][0] - backend.records[0][0]
+        assert 0.13 <= held <= 0.25
+        assert controller.capped_holds == 0
+
+    asyncio.run(main())
+
+
+def test_controller_max_hold_caps_extend():
+    async def main():
+        controller, actions, backend = await _press(0.1, 0.05, 1)
+        assert actions == [(KEY_DOWN, "w"), (KEY_UP, "w")]
+        held = backend.records[1][0] - backend.records[0][0]
+        assert 0.08 <= held <= 0.2
+        assert controller.capped_holds == 1
+
+    asyncio.run(main())
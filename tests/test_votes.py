@@ -0,0 +1,48 @@
+from bot.votes import VoteCounter
+
+
+def test_votes_expire_with_their_bucket():
+    # Окно 10 с на 10 корзин по 1 с
+    counter = VoteCounter(10, buckets=10)
+    counter.add(now=0.5)
+    counter.add(now=4.5, votes=3)
+    assert counter.count(now=5) == 4
+    assert counter.count(now=10.5) == 3
+    assert counter.count(now=14.5) == 0
+
+
+def test_long_gap_clears_whole_ring():
+    counter = VoteCounter(10, buckets=10)
+    for second in range(10):
+        counter.add(now=second + 0.5)
+    assert counter.count(now=9.9) == 10
+    assert counter.count(now=1000) == 0
+    assert counter.add(now=1000) == 1
+    assert counter.count(now=1000) == 1
+
+
+def test_unique_users_count_once_per_window():
+    counter = VoteCounter(10, buckets=10, unique_users=True)
+    assert counter.add("alice", now=0.5) == 1
+    assert counter.add("alice", now=5, votes=3) == 0
+    assert counter.add("bob", now=5, votes=3) == 1
+    assert counter.count(now=5) == 2
+
+    # Голос alice выпал из окна, она может голосовать снова
+    assert counter.add("alice", now=10.5) == 1
+    assert counter.count(now=10.5) == 2
+
+
+def test_without_unique_users_every_vote_counts():
+    counter = VoteCounter(10, buckets=10)
+    assert counter.add("alice", now=0.5) == 1
+    assert counter.add("alice", now=0.6, votes=2) == 2
+    assert counter.count(now=1) == 3
+
+
+def test_clear():
+    counter = VoteCounter(10, buckets=10, unique_users=True)
+    counter.add("alice", now=0.5)
+    counter.clear()
+    assert counter.count(now=0.5) == 0
+    assert counter.add("alice", now=0.6) == 1